@@ -17,6 +17,9 @@ from pathlib import Path
 from urllib.parse import quote, urljoin
 from bs4 import BeautifulSoup
 
+import rate_limiter
+import resolve_cache
+
 logger = logging.getLogger("apk_sources")
 
 # ============================================================
@@ -181,15 +184,20 @@ class UptodownSource:
     def __init__(self, session: aiohttp.ClientSession):
         self.session = session
 
-    async def _get(self, url: str, **kw) -> str | None:
+    async def _get(self, url: str, missing: list | None = None, **kw) -> str | None:
+        """Page text, or None. A 404 is appended to `missing` (definitely not there)."""
         for attempt in range(3):
             try:
-                async with self.session.get(url, headers=_headers(),
-                                            timeout=aiohttp.ClientTimeout(total=20),
-                                            allow_redirects=True, **kw) as r:
+                async with rate_limiter.async_slot(url) as slot, \
+                        self.session.get(url, headers=_headers(),
+                                         timeout=aiohttp.ClientTimeout(total=20),
+                                         allow_redirects=True, **kw) as r:
+                    slot.report(r.status, r.headers.get('Retry-After'))
                     if r.status == 200:
                         return await r.text()
                     if r.status == 404:
+                        if missing is not None:
+                            missing.append(url)
                         return None
                     logger.debug(f"[uptodown] {url} -> {r.status}")
             except Exception as e:
@@ -223,13 +231,36 @@ class UptodownSource:
         """
         Tìm app trên Uptodown bằng direct slug URL.
         Thử nhiều slug variants cho đến khi tìm thấy.
+        Slug đã biết (resolve_cache) được thử trước, không cần dò lại.
         """
-        slugs = self._resolve_slug(app_name, app_slug)
+        key = (app_slug or app_name).strip().lower()
+        cached = resolve_cache.lookup(key, self.name)
+        if cached == resolve_cache.NOT_FOUND:
+            logger.debug(f"[uptodown] {key}: cached not found")
+            return None
+        if cached:
+            result, _ = await self._search_slugs(app_name, app_slug, [cached[1]])
+            if result:
+                return result
+            resolve_cache.forget(key, self.name)
 
+        slugs = self._resolve_slug(app_name, app_slug)
+        result, definite_miss = await self._search_slugs(app_name, app_slug, slugs)
+        if result:
+            resolve_cache.store(key, self.name, result["detail_url"], result["uptodown_slug"])
+        elif definite_miss:
+            resolve_cache.store(key, self.name)
+        return result
+
+    async def _search_slugs(self, app_name: str, app_slug: str, slugs: list[str]) -> tuple:
+        """(result or None, True if every slug was a 404 / non-app page)."""
+        definite = 0
         for slug in slugs:
             url = f"https://{slug}.en.uptodown.com/android"
-            html = await self._get(url)
+            missing = []
+            html = await self._get(url, missing=missing)
             if not html:
+                definite += bool(missing)
                 continue
 
             soup = BeautifulSoup(html, "html.parser")
@@ -237,6 +268,7 @@ class UptodownSource:
             # Verify it's a real app page (has version info)
             ver_el = soup.select_one("span.version")
             if not ver_el:
+                definite += 1
                 continue
 
             result = {
@@ -279,9 +311,9 @@ class UptodownSource:
             if dl_url:
                 result["download_url"] = dl_url
                 logger.info(f"[uptodown] Found: {app_name} v{result['version']} (slug={slug})")
-                return result
+                return result, False
 
-        return None
+        return None, bool(slugs) and definite == len(slugs)
 
     async def _get_download_url(self, slug: str) -> str | None:
         """Parse download page to extract token-based URL."""
@@ -5,8 +5,10 @@ Usage examples:
     python3 bots/backfill_apks.py                # process all missing apps
     python3 bots/backfill_apks.py --limit 25     # only process 25 apps
     python3 bots/backfill_apks.py --sleep 2.0    # wait 2 seconds between apps
+    python3 bots/backfill_apks.py --async --concurrency 64   # resolve URLs concurrently first
 """
 import argparse
+import asyncio
 import os
 import sys
 import time
@@ -30,7 +32,7 @@ for key, value in _DEFAULTS.items():
 MAX_APK_SIZE_MB = int(os.environ.get('MAX_APK_SIZE_MB', '2000'))
 
 
-def _backfill_single(app: dict) -> Tuple[bool, str]:
+def _backfill_single(app: dict, resolved: dict | None = None) -> Tuple[bool, str]:
     app_id = app.get('app_id')
     if not app_id:
         return False, 'missing app_id'
@@ -41,10 +43,11 @@ def _backfill_single(app: dict) -> Tuple[bool, str]:
     title = (app.get('title') or app_id).strip()
     description = app.get('description', '')
 
-    try:
-        resolved = resolve_apk_url(app_id, title=title, icon=icon)
-    except Exception as exc:  # pragma: no cover - network heavy
-        return False, f'resolve error: {exc}'
+    if resolved is None:
+        try:
+            resolved = resolve_apk_url(app_id, title=title, icon=icon)
+        except Exception as exc:  # pragma: no cover - network heavy
+            return False, f'resolve error: {exc}'
 
     apk_url = (resolved or {}).get('apk_url') if resolved else None
     uptodown_detail = (resolved or {}).get('uptodown_detail') if resolved else None
@@ -87,6 +90,10 @@ def main():
     parser.add_argument('--limit', type=int, default=0, help='Maximum number of apps to process (0 = all).')
     parser.add_argument('--sleep', type=float, default=float(os.environ.get('BACKFILL_SLEEP', '1.0')),
                         help='Seconds to sleep between apps to avoid rate limits.')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Resolve all APK URLs concurrently (one aiohttp session) before uploading.')
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('BACKFILL_CONCURRENCY', '32')),
+                        help='Apps resolved at once with --async.')
     args = parser.parse_args()
 
     apps = load_apps()
@@ -97,6 +104,19 @@ def main():
     limit = args.limit if args.limit and args.limit > 0 else total
     print(f'🔎 Found {total} apps without APK uploads. Processing up to {limit}.')
 
+    pre_resolved = {}
+    if args.use_async:
+        from bot_crawler_async import resolve_many_async  # type: ignore
+        batch = [a for a in missing[:limit] if a.get('app_id') and (a.get('icon') or '').strip()]
+        print(f'⚡ Resolving {len(batch)} APK URLs (async x{args.concurrency})...')
+        started = time.time()
+        results = asyncio.run(resolve_many_async(
+            [{'app_id': a['app_id'], 'title': (a.get('title') or a['app_id']).strip(), 'icon': a.get('icon')}
+             for a in batch], concurrency=args.concurrency))
+        pre_resolved = {r['app_id']: r for r in results}
+        found = sum(1 for r in results if r.get('apk_url'))
+        print(f'   {found}/{len(batch)} resolved in {time.time() - started:.1f}s')
+
     processed = 0
     success = 0
     failures = []
@@ -108,7 +128,7 @@ def main():
         app_id = app.get('app_id')
         title = app.get('title') or app_id
         print(f'[{processed}/{limit}] Processing {title} ({app_id})...')
-        ok, reason = _backfill_single(app)
+        ok, reason = _backfill_single(app, pre_resolved.get(app_id))
         if ok:
             success += 1
             print('   ✅ Done')
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Crawler throughput benchmark against a local fixture server (no live sites).
+
+A separate process serves Uptodown-like category / detail / versions pages
+with configurable latency and error injection. Each target crawls it and
+reports pages/s, client-side fetch latency (p50/p99), CPU time per page
+and peak RSS:
+
+    uptodown          UptodownCrawler.run() end to end (discovery → details
+                      → versions → store), via a resolver that points every
+                      *.uptodown.com host at the fixture server
+    bot_crawler       bot_crawler._get_soup over a thread pool
+    version_crawler   version_crawler._get_soup over a thread pool
+
+All stores (versions.db, crawl_state.db, http_cache.db, apps.json) go to a
+temp dir, never to data/.
+
+    python3 bots/bench_crawler.py
+    python3 bots/bench_crawler.py --apps 2000 --latency-ms 40 --error-rate 0.02
+    python3 bots/bench_crawler.py --fixtures recorded/ --output bench.json --baseline main.json
+
+--fixtures DIR may hold recorded detail.html / versions.html pages; they
+are served for every app (category listings are always generated so their
+links point at the fixture hosts). With --baseline, the run fails (exit 1)
+when pages/s drops or CPU per page grows by more than --threshold.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import resource
+import tempfile
+import multiprocessing
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep every store the crawlers touch out of the real data/ directory
+_TMP = tempfile.mkdtemp(prefix='vestool_bench_')
+os.environ['DATA_DIR'] = _TMP
+for _key in ('VERSIONS_DB', 'CRAWL_STATE_DB', 'HTTP_CACHE_DB', 'CATALOG_SNAPSHOT', 'SEEN_DB', 'RESOLVE_CACHE_DB', 'WORK_QUEUE_DB', 'VERSION_WATCH_DB', 'DOWNLOAD_URL_DB', 'CRAWL_METRICS_FILE'):
+    os.environ.pop(_key, None)
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = ('uptodown', 'bot_crawler', 'version_crawler')
+
+# ==================== FIXTURES ====================
+
+_PAD_BLOCK = ('<div class="item"><a href="#" class="link">Related app</a>'
+              '<p class="text">Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>'
+              '<span class="meta">4.5 ★</span></div>\n')
+
+DETAIL_TEMPLATE = '''<!DOCTYPE html><html><head><meta charset="utf-8">
+<title>{title} APK for Android Download</title>
+{meta}
+<meta property="og:image" content="https://img.utdstc.com/icon/{h1}/{h2}/{h3}:200">
+<script type="application/ld+json">{{"@type":"SoftwareApplication","name":"{title}","softwareVersion":"{version}"}}</script>
+</head><body><header><nav>{pad_small}</nav></header>
+<div id="detail-app-name"><h1 class="name">{title}</h1></div>
+<div class="version">{version}</div><div class="size">{size} MB</div>
+<table class="technical-data"><tr><th>Package Name</th><td class="package">com.bench.{pkg}</td></tr></table>
+<div class="description"><p>{title} is a benchmark fixture application used to measure crawler throughput without touching live sites.</p></div>
+<section class="related">{pad}</section></body></html>'''
+
+VERSIONS_TEMPLATE = '''<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title} old versions</title></head>
+<body><div id="versions-items-list">{items}</div><section>{pad}</section></body></html>'''
+
+VERSION_ITEM = ('<div data-url="{base}" data-version-id="{vid}"><span class="version">{major}.{minor}.{patch}</span>'
+                '<span class="size">{size} MB</span><span class="date">Jan {day}, 2024</span></div>')
+
+CATEGORY_TEMPLATE = '''<!DOCTYPE html><html><head><title>Category</title></head><body>
+<div class="list">{links}</div><footer>{pad}</footer></body></html>'''
+
+CATEGORY_LINK = ('<a href="http://{slug}.en.uptodown.com/android"><img src="https://img.utdstc.com/icon/a/b/c:100">'
+                 '{title}</a>')
+
+
+def _pad(kb):
+    return _PAD_BLOCK * max(0, int(kb * 1024 / len(_PAD_BLOCK)))
+
+
+class Fixtures:
+    def __init__(self, apps, per_page, page_kb, fast_path=True, recorded_dir=None):
+        self.apps = apps
+        self.per_page = per_page
+        self.page_kb = page_kb
+        self.fast_path = fast_path
+        self.recorded = {}
+        if recorded_dir:
+            for name in ('detail.html', 'versions.html'):
+                path = os.path.join(recorded_dir, name)
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        self.recorded[name] = f.read()
+        self._pad = _pad(page_kb)
+        self._pad_small = _pad(page_kb / 10)
+
+    @staticmethod
+    def slug(i):
+        return f'bench-app-{i}'
+
+    def category(self, cat_index, n_categories, page):
+        # Apps are split evenly across categories; a page past the end is empty
+        share = (self.apps + n_categories - 1) // n_categories
+        start = cat_index * share + (page - 1) * self.per_page
+        stop = min(cat_index * share + share, start + self.per_page, self.apps)
+        links = ''.join(CATEGORY_LINK.format(slug=self.slug(i), title=f'Bench App {i}')
+                        for i in range(start, max(start, stop)))
+        return CATEGORY_TEMPLATE.format(links=links, pad=self._pad_small).encode()
+
+    def detail(self, slug):
+        if 'detail.html' in self.recorded:
+            return self.recorded['detail.html']
+        n = int(slug.rsplit('-', 1)[-1]) if slug.rsplit('-', 1)[-1].isdigit() else 0
+        meta = ('<meta name="description" content="Bench App {0} lets you benchmark crawlers. '
+                'It has no other purpose.">').format(n) if self.fast_path else ''
+        return DETAIL_TEMPLATE.format(
+            title=f'Bench App {n}', meta=meta, version=f'{n % 9 + 1}.{n % 7}.{n % 5}',
+            size=f'{10 + n % 90}.{n % 10}', pkg=f'app{n}', h1=f'{n:x}', h2='ab', h3='cd',
+            pad=self._pad, pad_small=self._pad_small).encode()
+
+    def versions(self, slug):
+        if 'versions.html' in self.recorded:
+            return self.recorded['versions.html']
+        base = f'http://{slug}.en.uptodown.com/android'
+        items = ''.join(VERSION_ITEM.format(base=base, vid=1000 + k, major=5, minor=k // 10, patch=k % 10,
+                                            size=20 + k, day=k % 28 + 1) for k in range(30))
+        return VERSIONS_TEMPLATE.format(title=slug, items=items, pad=self._pad).encode()
+
+
+# ==================== FIXTURE SERVER (own process) ====================
+
+def _serve(conf, port_q):
+    from aiohttp import web
+
+    fixtures = Fixtures(conf['apps'], conf['per_page'], conf['page_kb'],
+                        conf['fast_path'], conf['fixtures'])
+    categories = conf['categories']
+    counters = {'requests': 0, 'errors': 0}
+    rnd = random.Random(conf['seed'])
+
+    async def handle(request):
+        path = request.path
+        if path == '/__stats':
+            return web.json_response(counters)
+        if path == '/__reset':
+            counters.update(requests=0, errors=0)
+            return web.json_response(counters)
+        counters['requests'] += 1
+        delay = conf['latency_ms'] + rnd.uniform(0, conf['jitter_ms'])
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if rnd.random() < conf['error_rate']:
+            counters['errors'] += 1
+            if rnd.random() < 0.5:
+                return web.Response(status=429, headers={'Retry-After': '1'})
+            return web.Response(status=503)
+
+        host = request.host.split(':', 1)[0]
+        html = None
+        if host.endswith('.en.uptodown.com'):
+            slug = host.split('.', 1)[0]
+            if path.rstrip('/') == '/android':
+                html = fixtures.detail(slug)
+            elif path.rstrip('/') == '/android/versions':
+                html = fixtures.versions(slug)
+        elif path.startswith('/page/'):
+            html = fixtures.detail(fixtures.slug(path.rsplit('/', 1)[-1]))
+        else:
+            parts = path.strip('/').split('/')
+            page = int(parts[-1]) if parts[-1].isdigit() else 1
+            cat_path = '/' + '/'.join(parts[:-1] if parts[-1].isdigit() else parts)
+            if cat_path in categories:
+                html = fixtures.category(categories.index(cat_path), len(categories), page)
+        if html is None:
+            return web.Response(status=404)
+        return web.Response(body=html, content_type='text/html', charset='utf-8')
+
+    async def main():
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0, backlog=1024)
+        await site.start()
+        port_q.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+class FixtureServer:
+    def __init__(self, conf):
+        self.conf = conf
+        self.proc = None
+        self.port = None
+
+    def __enter__(self):
+        q = multiprocessing.Queue()
+        self.proc = multiprocessing.Process(target=_serve, args=(self.conf, q), daemon=True)
+        self.proc.start()
+        self.port = q.get(timeout=30)
+        return self
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.join(5)
+
+    def _get(self, path):
+        with urllib.request.urlopen(f'http://127.0.0.1:{self.port}{path}', timeout=10) as r:
+            return json.loads(r.read())
+
+    def stats(self):
+        return self._get('/__stats')
+
+    def reset(self):
+        return self._get('/__reset')
+
+
+# ==================== MEASUREMENT ====================
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+class Measure:
+    """Wall time, CPU (self + reaped children) and peak RSS around one target run."""
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        self.r0 = resource.getrusage(resource.RUSAGE_SELF)
+        self.c0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.t0
+        r1 = resource.getrusage(resource.RUSAGE_SELF)
+        c1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.cpu = ((r1.ru_utime - self.r0.ru_utime) + (r1.ru_stime - self.r0.ru_stime)
+                    + (c1.ru_utime - self.c0.ru_utime) + (c1.ru_stime - self.c0.ru_stime))
+        # ru_maxrss is KB on Linux, bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        self.peak_rss_mb = r1.ru_maxrss / scale
+        self.children_rss_mb = c1.ru_maxrss / scale
+
+
+def _report(name, measure, pages, latencies, server):
+    return {
+        'target': name,
+        'pages': pages,
+        'seconds': round(measure.seconds, 3),
+        'pages_per_s': round(pages / measure.seconds, 1) if measure.seconds else 0.0,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 1),
+        'cpu_ms_per_page': round(measure.cpu * 1000 / pages, 2) if pages else 0.0,
+        'peak_rss_mb': round(measure.peak_rss_mb, 1),
+        'children_peak_rss_mb': round(measure.children_rss_mb, 1),
+        'server_errors_injected': server['errors'],
+    }
+
+
+# ==================== TARGETS ====================
+
+def bench_uptodown(server, args):
+    import aiohttp
+    from aiohttp.abc import AbstractResolver
+    import uptodown_crawler as uc
+
+    port = server.port
+
+    class FixtureResolver(AbstractResolver):
+        """Every hostname → the fixture server (URLs keep their real hostnames)."""
+
+        async def resolve(self, host, port_=0, family=socket.AF_INET):
+            return [{'hostname': host, 'host': '127.0.0.1', 'port': port, 'family': socket.AF_INET,
+                     'proto': 0, 'flags': socket.AI_NUMERICHOST}]
+
+        async def close(self):
+            pass
+
+    latencies = []
+
+    class BenchCrawler(uc.UptodownCrawler):
+        async def init_session(self):
+            connector = aiohttp.TCPConnector(
+                limit=max(uc.CONCURRENT_WORKERS, uc.DETAIL_WORKERS + uc.VERSION_WORKERS + 1),
+                resolver=FixtureResolver())
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=uc.TIMEOUT), headers=uc.HEADERS)
+            if self.seen is None:
+                self.seen = uc.SeenSet()  # in the temp DATA_DIR, like the other stores
+
+        async def fetch(self, url, retries=uc.MAX_RETRIES):
+            t = time.perf_counter()
+            try:
+                return await super().fetch(url, retries)
+            finally:
+                latencies.append(time.perf_counter() - t)
+
+    uc.UPTODOWN_BASE = 'http://en.uptodown.com'
+    uc.CATEGORIES = args.category_paths
+    uc.MAX_APPS = args.apps
+    uc.CRAWL_VERSIONS = not args.no_versions
+    uc.DATA_DIR = _TMP
+    uc.APPS_FILE = os.path.join(_TMP, 'apps.json')
+    uc.AUTO_UPLOAD_TELEGRAM = False
+    uc.TELEGRAM_UPLOAD_AVAILABLE = False
+    if args.parse_workers is not None:
+        uc.PARSE_WORKERS = args.parse_workers
+
+    server.reset()
+    with Measure() as m:
+        asyncio.run(BenchCrawler().run())
+    stats = server.stats()
+    return _report('uptodown', m, stats['requests'], latencies, stats)
+
+
+def _bench_sync(name, get_soup, server, args):
+    urls = [f'http://127.0.0.1:{server.port}/page/{i}' for i in range(args.apps)]
+    latencies = []
+
+    def one(url):
+        t = time.perf_counter()
+        get_soup(url)
+        latencies.append(time.perf_counter() - t)
+
+    server.reset()
+    with Measure() as m:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(one, urls))
+    stats = server.stats()
+    return _report(name, m, stats['requests'], latencies, stats)
+
+
+def bench_bot_crawler(server, args):
+    import bot_crawler
+    return _bench_sync('bot_crawler', bot_crawler._get_soup, server, args)
+
+
+def bench_version_crawler(server, args):
+    import version_crawler
+    return _bench_sync('version_crawler', version_crawler._get_soup, server, args)
+
+
+_BENCHES = {
+    'uptodown': bench_uptodown,
+    'bot_crawler': bench_bot_crawler,
+    'version_crawler': bench_version_crawler,
+}
+
+
+# ==================== BASELINE ====================
+
+def compare(results, baseline, threshold):
+    """List of regression messages (empty = OK)."""
+    base = {r['target']: r for r in baseline.get('results', [])}
+    problems = []
+    for r in results:
+        b = base.get(r['target'])
+        if not b:
+            continue
+        if b['pages_per_s'] and r['pages_per_s'] < b['pages_per_s'] * (1 - threshold):
+            problems.append(f"{r['target']}: pages/s {r['pages_per_s']} < baseline {b['pages_per_s']}")
+        if b['cpu_ms_per_page'] and r['cpu_ms_per_page'] > b['cpu_ms_per_page'] * (1 + threshold):
+            problems.append(f"{r['target']}: CPU/page {r['cpu_ms_per_page']}ms > baseline {b['cpu_ms_per_page']}ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark crawlers against a local fixture server')
+    parser.add_argument('--targets', default=','.join(TARGETS), help=f'Comma list of {", ".join(TARGETS)}')
+    parser.add_argument('--apps', type=int, default=300, help='Apps (detail pages) per target')
+    parser.add_argument('--per-page', type=int, default=40, help='App links per category page')
+    parser.add_argument('--categories', type=int, default=4, help='Number of category listings')
+    parser.add_argument('--page-kb', type=float, default=60, help='Padding per detail/versions page (KB)')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Server latency per request')
+    parser.add_argument('--jitter-ms', type=float, default=10, help='Extra random latency (0..N ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 429/503 answers')
+    parser.add_argument('--no-fast-path', action='store_true', help='Detail pages without meta description (forces DOM parse)')
+    parser.add_argument('--no-versions', action='store_true', help='Skip /versions pages in the uptodown target')
+    parser.add_argument('--parse-workers', type=int, default=None, help='Override PARSE_WORKERS for the uptodown target')
+    parser.add_argument('--threads', type=int, default=16, help='Threads for the sync targets')
+    parser.add_argument('--fixtures', help='Directory with recorded detail.html / versions.html')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results JSON here')
+    parser.add_argument('--baseline', help='Results JSON to compare against (missing file = no comparison)')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed regression fraction (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    import uptodown_crawler
+    args.category_paths = uptodown_crawler.CATEGORIES[:args.categories]
+    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    unknown = [t for t in targets if t not in _BENCHES]
+    if unknown:
+        parser.error(f'unknown target(s): {", ".join(unknown)}')
+
+    conf = {
+        'apps': args.apps, 'per_page': args.per_page, 'page_kb': args.page_kb,
+        'fast_path': not args.no_fast_path, 'fixtures': args.fixtures,
+        'categories': args.category_paths, 'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate, 'seed': args.seed,
+    }
+    results = []
+    with FixtureServer(conf) as server:
+        print(f'🧪 Fixture server on 127.0.0.1:{server.port} — {args.apps} apps, '
+              f'{args.latency_ms:g}+{args.jitter_ms:g}ms, {args.error_rate:.0%} errors, data → {_TMP}')
+        for name in targets:
+            print(f'\n▶️ {name}')
+            try:
+                results.append(_BENCHES[name](server, args))
+            except ImportError as e:
+                print(f'⏭️ {name} skipped: {e}')
+
+    print('\n' + '=' * 96)
+    print(f'{"target":<16}{"pages":>7}{"sec":>8}{"pages/s":>9}{"p50 ms":>9}{"p99 ms":>9}'
+          f'{"CPU ms/pg":>11}{"RSS MB":>9}{"child MB":>10}')
+    for r in results:
+        print(f'{r["target"]:<16}{r["pages"]:>7}{r["seconds"]:>8}{r["pages_per_s"]:>9}{r["p50_ms"]:>9}'
+              f'{r["p99_ms"]:>9}{r["cpu_ms_per_page"]:>11}{r["peak_rss_mb"]:>9}{r["children_peak_rss_mb"]:>10}')
+    print('=' * 96)
+
+    out = {'created': time.time(), 'config': {k: v for k, v in conf.items() if k != 'categories'},
+           'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(out, f, indent=2)
+        print(f'💾 {args.output}')
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f'ℹ️ No baseline at {args.baseline}, skipping comparison')
+            return 0
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.threshold)
+        if problems:
+            for p in problems:
+                print(f'❌ Regression: {p}')
+            return 1
+        print(f'✅ Within {args.threshold:.0%} of baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
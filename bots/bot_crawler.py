@@ -1,5 +1,4 @@
 import os
-import re
 import time
 import json
 import urllib.parse
@@ -7,7 +6,15 @@ import requests
 from bs4 import BeautifulSoup
 import traceback
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import crawl_metrics
+import http_cache
+import rate_limiter
+import resolve_cache
+import session_pool
+import uptodown_slugs
 
 logger = logging.getLogger(__name__)
 
@@ -44,40 +51,36 @@ HEADERS = {
 def _abs(base, href):
     return urllib.parse.urljoin(base, href)
 
+def _parse_html(text):
+    return BeautifulSoup(text, 'html.parser')
+
 def _get_soup(url):
-    # Tạo phiên cloudscraper nếu có, fallback về requests.Session
-    session = None
-    try:
-        import cloudscraper
-        session = cloudscraper.create_scraper(browser={'browser': 'chrome', 'platform': 'windows', 'mobile': False})
-    except Exception:
-        session = requests.Session()
-    try:
-        session.headers.update(HEADERS)
-    except Exception:
-        pass
+    # Phiên cloudscraper lấy từ pool theo host: giữ cookie/clearance và kết nối keep-alive
     tries = int(os.environ.get('VESTOOL_TRIES', '3'))
     backoff = float(os.environ.get('VESTOOL_BACKOFF', '1.5'))
     err = None
     for i in range(tries):
         try:
-            r = session.get(url, headers=HEADERS, timeout=30)
-            if r.status_code == 404:
-                logger.debug(f'_get_soup 404: {url}')
-                return None
-            if r.status_code == 403 and 'apkpure.com' in url:
-                alt_url = url.replace('apkpure.com/', 'apkpure.com/vn/')
-                r = session.get(alt_url, headers=HEADERS, timeout=30)
-            if r.status_code == 403 and 'apkcombo.com' in url:
-                # thử lại với referer khác để giảm chặn
-                h2 = dict(HEADERS)
-                h2['Referer'] = 'https://apkcombo.com/'
-                r = session.get(url, headers=h2, timeout=30)
+            with session_pool.lease(url, HEADERS) as lease:
+                session = lease.session
+                r = http_cache.cached_get(session, url, headers=HEADERS, slot=rate_limiter.slot, timeout=30)
+                lease.check(r)
+                if r.status_code == 404:
+                    logger.debug(f'_get_soup 404: {url}')
+                    return None
+                if r.status_code == 403 and 'apkpure.com' in url:
+                    alt_url = url.replace('apkpure.com/', 'apkpure.com/vn/')
+                    r = lease.check(session.get(alt_url, headers=HEADERS, timeout=30))
+                if r.status_code == 403 and 'apkcombo.com' in url:
+                    # thử lại với referer khác để giảm chặn
+                    h2 = dict(HEADERS)
+                    h2['Referer'] = 'https://apkcombo.com/'
+                    r = lease.check(session.get(url, headers=h2, timeout=30))
             if os.environ.get('VESTOOL_DEBUG') == '1':
                 logger.debug(f'[DEBUG] Fetched URL={url} status={r.status_code} length={len(r.text)}')
                 logger.debug(r.text[:2000])
             r.raise_for_status()
-            return BeautifulSoup(r.text, 'html.parser')
+            return http_cache.parsed(r, _parse_html)
         except requests.RequestException as e:
             err = e
             time.sleep(backoff * (i + 1))
@@ -124,7 +127,7 @@ def _apkpure_direct(detail_url):
         if not a: 
             return None
         dl_url = _abs(detail_url, a.get('href'))
-        r = requests.get(dl_url, headers=HEADERS, timeout=30)
+        r = session_pool.get(dl_url, headers=HEADERS, timeout=30)
         s2 = BeautifulSoup(r.text, 'html.parser')
         cand = s2.select_one('a#download_link') or s2.select_one('a[href$=".apk"]')
         return _abs(dl_url, cand.get('href')) if cand else None
@@ -165,7 +168,7 @@ def _apkcombo_direct(detail_url):
         if not a: 
             return None
         dl_page = _abs(detail_url, a.get('href'))
-        r = requests.get(dl_page, headers=HEADERS, timeout=30)
+        r = session_pool.get(dl_page, headers=HEADERS, timeout=30)
         s2 = BeautifulSoup(r.text, 'html.parser')
         cand = s2.select_one('a[href$=".apk"]')
         return _abs(dl_page, cand.get('href')) if cand else None
@@ -210,7 +213,7 @@ def _apkmirror_direct(detail_url):
             return None
         dl_page = _abs(detail_url, a.get('href'))
         logger.debug(f'APKMirror direct: dl_page={dl_page}')
-        r = requests.get(dl_page, headers=HEADERS, timeout=30)
+        r = session_pool.get(dl_page, headers=HEADERS, timeout=30)
         s2 = BeautifulSoup(r.text, 'html.parser')
         cand = s2.select_one('a[href$=\".apk\"]') or s2.select_one('a#downloadButton[href]')
         if cand:
@@ -224,76 +227,30 @@ def _apkmirror_direct(detail_url):
         logger.debug(traceback.format_exc())
         return None
 
-# Mapping app_id -> Uptodown slug for popular apps
-_UPTODOWN_SLUG_MAP = {
-    'com.facebook.katana': 'facebook',
-    'com.facebook.lite': 'facebook-lite',
-    'com.facebook.orca': 'facebook-messenger',
-    'com.instagram.android': 'instagram',
-    'com.instagram.lite': 'instagram-lite',
-    'com.ss.android.ugc.trill': 'tiktok',
-    'com.zhiliaoapp.musically': 'tiktok',
-    'com.whatsapp': 'whatsapp-messenger',
-    'org.telegram.messenger': 'telegram',
-    'com.google.android.youtube': 'youtube',
-    'com.google.android.gm': 'gmail',
-    'com.google.android.apps.maps': 'google-maps',
-    'com.google.android.googlequicksearchbox': 'google-search',
-    'com.zing.zalo': 'zalo',
-    'com.shopee.vn': 'shopee',
-    'com.lazada.android': 'lazada',
-    'com.spotify.music': 'spotify-music',
-    'com.twitter.android': 'x-twitter',
-    'com.snapchat.android': 'snapchat',
-    'com.pinterest': 'pinterest',
-    'com.tencent.ig': 'pubg-mobile',
-    'com.garena.game.kgvn': 'garena-lien-quan-mobile',
-    'com.facebook.pages.app': 'facebook-pages-manager',
-    'com.facebook.work': 'workplace-from-facebook',
-    'com.facebook.appmanager': 'facebook-app-manager',
-}
-
-def _app_id_to_slugs(app_id, title=None):
-    """Convert app_id or title to list of possible Uptodown slugs"""
-    slugs = []
-    # Check hardcoded map first
-    if app_id and app_id in _UPTODOWN_SLUG_MAP:
-        slugs.append(_UPTODOWN_SLUG_MAP[app_id])
-    # Try to extract app name from app_id
-    if app_id:
-        parts = app_id.lower().split('.')
-        for part in parts:
-            if part not in ('com', 'org', 'net', 'app', 'android', 'mobile', 'lite', 'pro', 'google', 'facebook', 'ss'):
-                slug = part.replace('_', '-')
-                if slug and slug not in slugs:
-                    slugs.append(slug)
-    # Try from title
-    if title:
-        # First word
-        first_word = re.sub(r'[^a-z0-9]', '', title.lower().split()[0]) if title.strip() else ''
-        if first_word and first_word not in slugs:
-            slugs.append(first_word)
-        # Full title as slug
-        full_slug = re.sub(r'[^a-z0-9\s-]', '', title.lower().strip())
-        full_slug = re.sub(r'\s+', '-', full_slug)
-        if full_slug and full_slug not in slugs:
-            slugs.append(full_slug)
-    return slugs
-
 def _uptodown_search_get_detail(app_id=None, title=None):
-    slugs = _app_id_to_slugs(app_id, title)
+    key = app_id or title
+    cached = resolve_cache.lookup(key, 'uptodown')
+    if cached is not None:
+        return cached[0] or None
+    slugs = uptodown_slugs.candidate_slugs(app_id, title)
     
     # Try each slug as direct URL
+    errors = 0
     for slug in slugs:
         direct_url = f'https://{slug}.en.uptodown.com/android'
         try:
-            r = requests.get(direct_url, headers=HEADERS, timeout=15, allow_redirects=True)
+            r = session_pool.get(direct_url, headers=HEADERS, timeout=15, allow_redirects=True)
             if r.status_code == 200:
                 logger.debug(f'Uptodown direct hit: {direct_url}')
+                resolve_cache.store(key, 'uptodown', direct_url, slug)
                 return direct_url
+            if r.status_code != 404:
+                errors += 1
         except Exception:
-            pass
+            errors += 1
     
+    if not errors and uptodown_slugs.has_real_title(app_id, title):
+        resolve_cache.store(key, 'uptodown')  # every slug 404: not on Uptodown
     logger.debug(f'Uptodown: no URL found for app_id={app_id} title={title} (tried: {slugs})')
     return None
 
@@ -303,10 +260,8 @@ def _uptodown_direct(detail_url):
         logger.debug(f'Uptodown direct: detail_url={detail_url}')
         # Go to download page
         download_page = detail_url.rstrip('/') + '/download'
-        session = requests.Session()
-        session.headers.update(HEADERS)
         try:
-            r = session.get(download_page, timeout=30)
+            r = session_pool.get(download_page, headers=HEADERS, timeout=30)
             if r.status_code != 200:
                 logger.error(f'Uptodown direct: status {r.status_code} for {download_page}')
                 return None
@@ -314,35 +269,47 @@ def _uptodown_direct(detail_url):
         except Exception as e:
             logger.error(f'Uptodown direct: request failed: {e}')
             return None
-        
-        # Find the download button with data-url attribute
-        btn = soup.select_one('button#detail-download-button[data-url]')
-        if btn:
-            data_url = btn.get('data-url')
-            if data_url and not data_url.startswith(('http', '/')):
-                apk_url = f'https://dw.uptodown.com/dwn/{data_url}'
-                logger.debug(f'Uptodown direct: apk_url={apk_url[:60]}...')
-                # Return the detail URL so we can get fresh links later
-                return apk_url
-        
-        logger.error('Uptodown direct: no download button found')
-        return None
+        return _uptodown_apk_from_soup(soup)
     except Exception as e:
         logger.error(f'Crawler _uptodown_direct error: {e}')
         logger.debug(traceback.format_exc())
         return None
 
+def _uptodown_apk_from_soup(soup):
+    """dw.uptodown.com token URL from a /download page (shared with bot_crawler_async)."""
+    # Find the download button with data-url attribute
+    btn = soup.select_one('button#detail-download-button[data-url]')
+    if btn:
+        data_url = btn.get('data-url')
+        if data_url and not data_url.startswith(('http', '/')):
+            apk_url = f'https://dw.uptodown.com/dwn/{data_url}'
+            logger.debug(f'Uptodown direct: apk_url={apk_url[:60]}...')
+            return apk_url
+    logger.error('Uptodown direct: no download button found')
+    return None
+
 def _aptoide_search_get_detail(app_id=None, title=None):
     base = 'https://en.aptoide.com'
     q = urllib.parse.quote((app_id or title or '').strip())
     if not q:
         return None
+    key = app_id or title
+    cached = resolve_cache.lookup(key, 'aptoide')
+    if cached is not None:
+        return cached[0] or None
     url = f'{base}/search?query={q}'
     logger.debug(f'Aptoide search URL: {url}')
     soup = _get_soup(url)
     if not soup:
         logger.error('Aptoide search: soup is None')
         return None
+    detail = _aptoide_detail_from_soup(soup, title)
+    resolve_cache.store(key, 'aptoide', detail)  # search page answered: a miss is definite
+    return detail
+
+def _aptoide_detail_from_soup(soup, title=None):
+    """Best app page link on an Aptoide search result page."""
+    base = 'https://en.aptoide.com'
     candidates = soup.select('a[href*="/app"]')
     logger.debug(f'Aptoide search: candidates={len(candidates)}')
     target = None
@@ -370,13 +337,11 @@ def _aptoide_direct(detail_url):
         if not soup:
             logger.error('Aptoide direct: soup is None')
             return None
-        a = soup.select_one('a[href*=\"/download\"]')
-        if not a:
-            logger.error('Aptoide direct: download anchor not found')
+        link = _aptoide_link_from_soup(soup, detail_url)
+        if not link:
             return None
-        link = _abs(detail_url, a.get('href'))
         try:
-            resp = requests.get(link, timeout=15, allow_redirects=True)
+            resp = session_pool.get(link, headers=HEADERS, timeout=15, allow_redirects=True)
             logger.debug(f'Aptoide direct: probe status={resp.status_code} url={link}')
         except Exception:
             pass
@@ -386,6 +351,128 @@ def _aptoide_direct(detail_url):
         logger.debug(traceback.format_exc())
         return None
 
+# ==================== SOURCE RACE ====================
+# Các nguồn được hỏi song song; APK URL hợp lệ đầu tiên theo thứ tự ưu tiên thắng.
+# Nguồn ưu tiên thấp trả lời trước thì chờ thêm RACE_PRIORITY_GRACE giây cho nguồn ưu tiên cao hơn.
+RACE_ORDER = ('uptodown', 'aptoide')  # APKMirror disabled - returns 403 Forbidden
+RACE_TIMEOUT = float(os.environ.get('VESTOOL_RACE_TIMEOUT', '60'))  # seconds, per source
+RACE_PRIORITY_GRACE = float(os.environ.get('VESTOOL_RACE_GRACE', '2'))
+_race_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='resolve')
+
+
+def _source_uptodown(it, cancelled):
+    with crawl_metrics.timer('uptodown', 'search') as t:
+        det = _uptodown_search_get_detail(app_id=it['detail'], title=it['title'])
+        if not det:
+            t.miss()
+    if not det:
+        logger.warning(f'Uptodown: no detail found for app_id={it["detail"]} title={it["title"]}')
+        return None, None
+    if cancelled.is_set():
+        crawl_metrics.count('uptodown', 'detail', 'cancelled')
+        return None, det
+    with crawl_metrics.timer('uptodown', 'detail') as t:
+        apk_url = _uptodown_direct(det)
+        if not apk_url:
+            t.miss()
+    if not apk_url:
+        resolve_cache.forget(it['detail'] or it['title'], 'uptodown')
+    return apk_url, det
+
+
+def _source_aptoide(it, cancelled):
+    with crawl_metrics.timer('aptoide', 'search') as t:
+        det = _aptoide_search_get_detail(app_id=it['detail'], title=it['title'])
+        if not det:
+            t.miss()
+    if not det:
+        logger.warning(f'Aptoide: no detail found for app_id={it["detail"]} title={it["title"]}')
+        return None, None
+    if cancelled.is_set():
+        crawl_metrics.count('aptoide', 'detail', 'cancelled')
+        return None, None
+    with crawl_metrics.timer('aptoide', 'detail') as t:
+        apk_url = _aptoide_direct(det)
+        if not apk_url:
+            t.miss()
+    if not apk_url:
+        resolve_cache.forget(it['detail'] or it['title'], 'aptoide')
+    return apk_url, None
+
+
+_SOURCES = {'uptodown': _source_uptodown, 'aptoide': _source_aptoide}
+
+
+def _run_source(name, it, cancelled):
+    """(apk_url, uptodown_detail) from one source; one retry on unexpected errors."""
+    for attempt in range(2):
+        try:
+            return _SOURCES[name](it, cancelled)
+        except Exception as e:
+            logger.warning(f'{name} error for {it["detail"]} attempt {attempt + 1}: {e}')
+            if attempt == 0 and not cancelled.is_set():
+                time.sleep(float(os.environ.get('VESTOOL_BACKOFF', '1.5')))
+    return None, None
+
+
+def _race_sources(it, order=RACE_ORDER):
+    """Query all sources at once. Returns (apk_url, uptodown_detail).
+
+    Losers are cancelled: queued ones never start, running ones stop before
+    their download-page request.
+    """
+    cancelled = threading.Event()
+    rank_of = {_race_pool.submit(_run_source, name, it, cancelled): rank
+               for rank, name in enumerate(order)}
+    pending = set(rank_of)
+    results = {}
+    deadline = time.monotonic() + RACE_TIMEOUT
+    grace_until = None
+    try:
+        while pending:
+            until = deadline if grace_until is None else min(deadline, grace_until)
+            left = until - time.monotonic()
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for f in done:
+                results[rank_of[f]] = f.result()
+            valid = [rank for rank in sorted(results) if results[rank][0]]
+            if valid:
+                if all(rank_of[f] > valid[0] for f in pending):
+                    break  # nothing better is still running
+                if grace_until is None:
+                    grace_until = time.monotonic() + RACE_PRIORITY_GRACE
+    finally:
+        cancelled.set()
+        for f in pending:
+            f.cancel()
+    if pending and not results:
+        logger.warning(f'Resolve timeout after {RACE_TIMEOUT:.0f}s for {it["detail"]}')
+    apk_url = next((results[r][0] for r in sorted(results) if results[r][0]), None)
+    uptodown_detail = next((results[r][1] for r in sorted(results) if results[r][1]), None)
+    return apk_url, uptodown_detail
+
+
+def _resolved_item(it, order=RACE_ORDER):
+    apk_url, uptodown_detail = _race_sources(it, order)
+    return {
+        'app_id': it['detail'],
+        'title': it['title'],
+        'icon': it.get('icon', ''),
+        'description': '',
+        'apk_url': apk_url,
+        'uptodown_detail': uptodown_detail
+    }
+
+
+def _aptoide_link_from_soup(soup, detail_url):
+    a = soup.select_one('a[href*=\"/download\"]')
+    if not a:
+        logger.error('Aptoide direct: download anchor not found')
+        return None
+    return _abs(detail_url, a.get('href'))
+
 def _gplay_list(limit=10):
     items = []
     ids_raw = os.environ.get('APP_IDS', '')
@@ -438,9 +525,8 @@ def _gplay_list(limit=10):
                 logger.error(f'GPlay search fallback error for "{q}": {e}')
     return items
 
-def fetch_trending(limit=20, source='gplay', blacklist_file=None):
-    logger.info(f'Fetching trending apps: limit={limit}, source={source}')
-    
+def _trending_items(limit, source, blacklist_file):
+    """Listing + icon/blacklist filters shared by fetch_trending and its async variant."""
     # Load blacklist to skip apps that can't find APK
     blacklist = {}
     if blacklist_file is None:
@@ -454,7 +540,6 @@ def fetch_trending(limit=20, source='gplay', blacklist_file=None):
     except:
         pass
     
-    out = []
     items = []
     try:
         if source in ('gplay', 'aptoide'):
@@ -478,64 +563,16 @@ def fetch_trending(limit=20, source='gplay', blacklist_file=None):
     if len(items) < before:
         logger.info(f'⏭️ Skipped {before - len(items)} blacklisted apps')
     
+    return items
+
+def fetch_trending(limit=20, source='gplay', blacklist_file=None):
+    logger.info(f'Fetching trending apps: limit={limit}, source={source}')
+    items = _trending_items(limit, source, blacklist_file)
+    
     def process_item(it, source):
-        for attempt in range(3):
-            try:
-                apk_url = None
-                uptodown_detail = None
-                if source == 'aptoide':
-                    det = _aptoide_search_get_detail(app_id=it['detail'], title=it['title'])
-                    if det:
-                        apk_url = _aptoide_direct(det)
-                    else:
-                        logger.warning(f'Aptoide: no detail found for app_id={it["detail"]} title={it["title"]}')
-                    if not apk_url:
-                        det_u = _uptodown_search_get_detail(app_id=it['detail'], title=it['title'])
-                        if det_u:
-                            uptodown_detail = det_u
-                            apk_url = _uptodown_direct(det_u)
-                else:
-                    det = _uptodown_search_get_detail(app_id=it['detail'], title=it['title'])
-                    if det:
-                        uptodown_detail = det
-                        apk_url = _uptodown_direct(det)
-                    else:
-                        logger.warning(f'Uptodown: no detail found for app_id={it["detail"]} title={it["title"]}')
-                    if not apk_url:
-                        det_a = _aptoide_search_get_detail(app_id=it['detail'], title=it['title'])
-                        if det_a:
-                            apk_url = _aptoide_direct(det_a)
-                    # APKMirror disabled - returns 403 Forbidden
-                    # if not apk_url:
-                    #     det2 = _apkmirror_search_get_detail(it['title'])
-                    #     if det2:
-                    #         logger.debug(f'APKMirror fallback: detail={det2}')
-                    #         apk_url = _apkmirror_direct(det2)
-                    #     else:
-                    #         logger.warning(f'APKMirror: no detail for title={it["title"]}')
-                logger.debug(f'app_detail: {it["detail"]}')
-                return {
-                    'app_id': it['detail'],
-                    'title': it['title'],
-                    'icon': it['icon'],
-                    'description': '',
-                    'apk_url': apk_url,
-                    'uptodown_detail': uptodown_detail
-                }
-            except Exception as e:
-                logger.warning(f'Error processing item {it["detail"]} on attempt {attempt + 1}: {e}')
-                if attempt < 2:
-                    time.sleep(5)
-                else:
-                    logger.error(f'Skipping item {it["detail"]} after 3 attempts')
-                    return {
-                        'app_id': it['detail'],
-                        'title': it['title'],
-                        'icon': it['icon'],
-                        'description': '',
-                        'apk_url': None,
-                        'uptodown_detail': None
-                    }
+        order = ('aptoide', 'uptodown') if source == 'aptoide' else RACE_ORDER
+        logger.debug(f'app_detail: {it["detail"]}')
+        return _resolved_item(it, order)
     
     with ThreadPoolExecutor(max_workers=5) as executor:
         out = list(executor.map(lambda it: process_item(it, source), items))
@@ -550,44 +587,7 @@ def get_apps(limit=10, source='gplay'):
 def resolve_apk_url(app_id, title=None, icon=None):
     """Resolve APK download URL for a single app_id. Returns dict with app info."""
     it = {'detail': app_id, 'title': title or app_id, 'icon': icon or ''}
-    for attempt in range(3):
-        try:
-            apk_url = None
-            uptodown_detail = None
-            det = _uptodown_search_get_detail(app_id=it['detail'], title=it['title'])
-            if det:
-                uptodown_detail = det
-                apk_url = _uptodown_direct(det)
-            if not apk_url:
-                det_a = _aptoide_search_get_detail(app_id=it['detail'], title=it['title'])
-                if det_a:
-                    apk_url = _aptoide_direct(det_a)
-            # APKMirror disabled - returns 403 Forbidden
-            # if not apk_url:
-            #     det2 = _apkmirror_search_get_detail(it['title'])
-            #     if det2:
-            #         apk_url = _apkmirror_direct(det2)
-            return {
-                'app_id': app_id,
-                'title': it['title'],
-                'icon': it.get('icon', ''),
-                'description': '',
-                'apk_url': apk_url,
-                'uptodown_detail': uptodown_detail
-            }
-        except Exception as e:
-            logger.warning(f'resolve_apk_url error {app_id} attempt {attempt+1}: {e}')
-            if attempt < 2:
-                time.sleep(5)
-            else:
-                return {
-                    'app_id': app_id,
-                    'title': title or app_id,
-                    'icon': icon or '',
-                    'description': '',
-                    'apk_url': None,
-                    'uptodown_detail': None
-                }
+    return _resolved_item(it, RACE_ORDER)
 
 
 def discover_apps(query, limit=10, exclude_ids=None):
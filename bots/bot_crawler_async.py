@@ -0,0 +1,276 @@
+"""
+asyncio variant of bot_crawler's resolve path on one pooled aiohttp session.
+
+fetch_trending() in bot_crawler resolves on a 5-thread pool of blocking
+requests. Here every app is a coroutine: CONCURRENCY apps resolve at once,
+the per-source race cancels the losing coroutines for real, and backoffs
+are asyncio.sleep, so waiting costs no thread. Page parsing and the
+resolve cache are shared with bot_crawler; Google Play calls
+(google_play_scraper is blocking) run in worker threads.
+
+    async with AsyncResolver(concurrency=32) as r:
+        items = await r.fetch_trending(limit=30)
+        infos = await r.resolve_many([{'app_id': ..., 'title': ..., 'icon': ...}, ...])
+
+    asyncio.run(resolve_many_async(apps, concurrency=32))   # one-shot helper
+"""
+import os
+import time
+import asyncio
+import logging
+import urllib.parse
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+import bot_crawler
+import crawl_metrics
+import http_cache
+import rate_limiter
+import resolve_cache
+import uptodown_slugs
+from bot_crawler import HEADERS, RACE_ORDER, RACE_PRIORITY_GRACE, RACE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = int(os.environ.get('VESTOOL_ASYNC_CONCURRENCY', '32'))  # apps resolved at once
+TIMEOUT = 30
+TRIES = int(os.environ.get('VESTOOL_TRIES', '3'))
+BACKOFF = float(os.environ.get('VESTOOL_BACKOFF', '1.5'))
+
+# aiohttp decodes gzip/deflate only
+_HEADERS = dict(HEADERS, **{'Accept-Encoding': 'gzip, deflate'})
+
+
+class AsyncResolver:
+    def __init__(self, concurrency=CONCURRENCY, session=None):
+        self.concurrency = max(1, concurrency)
+        self.session = session
+        self._own_session = session is None
+        self._sem = None
+
+    async def __aenter__(self):
+        self._sem = asyncio.Semaphore(self.concurrency)
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency * 2, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector, headers=_HEADERS, timeout=aiohttp.ClientTimeout(total=TIMEOUT))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    # ---------- HTTP ----------
+
+    async def _get(self, url, timeout=TIMEOUT):
+        """(status, text) with revalidation and per-host slots; status None after repeated errors.
+
+        http_cache is SQLite: its calls run in a thread, and writes happen
+        after the host slot is released.
+        """
+        entry = await asyncio.to_thread(http_cache.lookup, url)
+        if entry is not None and entry.is_fresh():
+            return 200, entry.text
+        cond_headers = http_cache.conditional_headers(entry)
+        for attempt in range(TRIES):
+            status = None
+            try:
+                async with rate_limiter.async_slot(url) as slot:
+                    async with self.session.get(url, headers=cond_headers, allow_redirects=True,
+                                                timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                        slot.report(resp.status, resp.headers.get('Retry-After'))
+                        if resp.status == 200:
+                            text = await resp.text()
+                            validators = {'ETag': resp.headers.get('ETag'),
+                                          'Last-Modified': resp.headers.get('Last-Modified')}
+                        status = resp.status  # set last: a body read error leaves it None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f'async _get error {url}: {e}')
+            if status == 304 and entry is not None:
+                await asyncio.to_thread(http_cache.touch, url)
+                return 200, entry.text
+            if status == 200:
+                await asyncio.to_thread(http_cache.store, url, validators, text)
+                return 200, text
+            if status == 404:
+                return 404, None
+            if status is not None:
+                logger.debug(f'async _get {status}: {url}')
+            if attempt < TRIES - 1:
+                await asyncio.sleep(BACKOFF * (attempt + 1))
+        return None, None
+
+    async def _soup(self, url, timeout=TIMEOUT):
+        status, text = await self._get(url, timeout)
+        return BeautifulSoup(text, 'html.parser') if text else None
+
+    # ---------- sources (same steps as bot_crawler's) ----------
+
+    async def _uptodown_detail(self, app_id, title):
+        key = app_id or title
+        cached = resolve_cache.lookup(key, 'uptodown')
+        if cached is not None:
+            return cached[0] or None
+        errors = 0
+        for slug in uptodown_slugs.candidate_slugs(app_id, title):
+            url = f'https://{slug}.en.uptodown.com/android'
+            status, _ = await self._get(url, timeout=15)
+            if status == 200:
+                resolve_cache.store(key, 'uptodown', url, slug)
+                return url
+            if status != 404:
+                errors += 1
+        if not errors and uptodown_slugs.has_real_title(app_id, title):
+            resolve_cache.store(key, 'uptodown')
+        return None
+
+    async def _source_uptodown(self, it):
+        with crawl_metrics.timer('uptodown', 'search') as t:
+            det = await self._uptodown_detail(it['detail'], it['title'])
+            if not det:
+                t.miss()
+        if not det:
+            logger.warning(f'Uptodown: no detail found for app_id={it["detail"]} title={it["title"]}')
+            return None, None
+        with crawl_metrics.timer('uptodown', 'detail') as t:
+            soup = await self._soup(det.rstrip('/') + '/download')
+            apk_url = bot_crawler._uptodown_apk_from_soup(soup) if soup else None
+            if not apk_url:
+                t.miss()
+        if not apk_url:
+            resolve_cache.forget(it['detail'] or it['title'], 'uptodown')
+        return apk_url, det
+
+    async def _source_aptoide(self, it):
+        app_id, title = it['detail'], it['title']
+        q = urllib.parse.quote((app_id or title or '').strip())
+        if not q:
+            return None, None
+        key = app_id or title
+        cached = resolve_cache.lookup(key, 'aptoide')
+        if cached is not None:
+            det = cached[0] or None
+        else:
+            with crawl_metrics.timer('aptoide', 'search') as t:
+                soup = await self._soup(f'https://en.aptoide.com/search?query={q}')
+                det = bot_crawler._aptoide_detail_from_soup(soup, title) if soup else None
+                if not det:
+                    t.miss()
+            if not soup:
+                return None, None
+            resolve_cache.store(key, 'aptoide', det)
+        if not det:
+            logger.warning(f'Aptoide: no detail found for app_id={app_id} title={title}')
+            return None, None
+        with crawl_metrics.timer('aptoide', 'detail') as t:
+            soup = await self._soup(det)
+            link = bot_crawler._aptoide_link_from_soup(soup, det) if soup else None
+            if not link:
+                t.miss()
+        if not link:
+            resolve_cache.forget(key, 'aptoide')
+        return link, None
+
+    async def _run_source(self, name, it):
+        try:
+            return await asyncio.wait_for(getattr(self, f'_source_{name}')(it), RACE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f'{name} timeout after {RACE_TIMEOUT:.0f}s for {it["detail"]}')
+        except Exception as e:
+            logger.warning(f'{name} error for {it["detail"]}: {e}')
+        return None, None
+
+    async def race(self, it, order=RACE_ORDER):
+        """Same policy as bot_crawler._race_sources; losers are cancelled."""
+        rank_of = {asyncio.ensure_future(self._run_source(name, it)): rank
+                   for rank, name in enumerate(order)}
+        pending = set(rank_of)
+        results = {}
+        grace_until = None
+        try:
+            while pending:
+                timeout = None if grace_until is None else max(0.0, grace_until - time.monotonic())
+                done, pending = await asyncio.wait(pending, timeout=timeout,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break  # grace period over
+                for t in done:
+                    results[rank_of[t]] = t.result()
+                valid = [rank for rank in sorted(results) if results[rank][0]]
+                if valid:
+                    if all(rank_of[t] > valid[0] for t in pending):
+                        break
+                    if grace_until is None:
+                        grace_until = time.monotonic() + RACE_PRIORITY_GRACE
+        finally:
+            for t in pending:
+                t.cancel()
+        apk_url = next((results[r][0] for r in sorted(results) if results[r][0]), None)
+        uptodown_detail = next((results[r][1] for r in sorted(results) if results[r][1]), None)
+        return apk_url, uptodown_detail
+
+    # ---------- bot_crawler API ----------
+
+    async def _resolved_item(self, it, order=RACE_ORDER):
+        async with self._sem:
+            apk_url, uptodown_detail = await self.race(it, order)
+        return {
+            'app_id': it['detail'],
+            'title': it['title'],
+            'icon': it.get('icon', ''),
+            'description': '',
+            'apk_url': apk_url,
+            'uptodown_detail': uptodown_detail
+        }
+
+    async def resolve_apk_url(self, app_id, title=None, icon=None):
+        it = {'detail': app_id, 'title': title or app_id, 'icon': icon or ''}
+        return await self._resolved_item(it)
+
+    async def resolve_many(self, apps):
+        """resolve_apk_url for many {'app_id', 'title', 'icon'} dicts at once, in input order."""
+        return await asyncio.gather(*(
+            self.resolve_apk_url(a['app_id'], title=a.get('title'), icon=a.get('icon')) for a in apps))
+
+    async def fetch_trending(self, limit=20, source='gplay', blacklist_file=None):
+        logger.info(f'Fetching trending apps (async x{self.concurrency}): limit={limit}, source={source}')
+        items = await asyncio.to_thread(bot_crawler._trending_items, limit, source, blacklist_file)
+        order = ('aptoide', 'uptodown') if source == 'aptoide' else RACE_ORDER
+        out = await asyncio.gather(*(self._resolved_item(it, order) for it in items))
+        logger.info(f'Fetched {len(out)} apps with APK URLs: {len([x for x in out if x["apk_url"]])}')
+        return out
+
+    async def discover_apps(self, query, limit=10, exclude_ids=None):
+        async with self._sem:
+            return await asyncio.to_thread(bot_crawler.discover_apps, query, limit, exclude_ids)
+
+    async def discover_many(self, queries, limit=10, exclude_ids=None):
+        """discover_apps for several queries at once; results merged without duplicates."""
+        lists = await asyncio.gather(*(self.discover_apps(q, limit, exclude_ids) for q in queries))
+        seen = set()
+        out = []
+        for results in lists:
+            for r in results:
+                if r['app_id'] not in seen:
+                    seen.add(r['app_id'])
+                    out.append(r)
+        return out
+
+
+# ---------- one-shot helpers for sync callers (asyncio.run) ----------
+
+async def fetch_trending_async(limit=20, source='gplay', blacklist_file=None, concurrency=CONCURRENCY):
+    async with AsyncResolver(concurrency) as r:
+        return await r.fetch_trending(limit, source, blacklist_file)
+
+
+async def resolve_many_async(apps, concurrency=CONCURRENCY):
+    async with AsyncResolver(concurrency) as r:
+        return await r.resolve_many(apps)
+
+
+async def discover_many_async(queries, limit=10, exclude_ids=None, concurrency=CONCURRENCY):
+    async with AsyncResolver(concurrency) as r:
+        return await r.discover_many(queries, limit, exclude_ids)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Read-only binary snapshot of apps.json, shared between processes via mmap.
+
+Every web worker used to keep its own parsed copy of the whole catalog. The
+snapshot (data/apps.snapshot) is built once per apps.json change and mapped
+read-only by every process, so the OS keeps a single physical copy and a
+lookup decodes only the one record it needs.
+
+Layout (little endian):
+  header   8s magic | u32 count | u32 reserved | i64 src_mtime_ns | i64 src_size
+  index    count x (u64 key_off | u32 key_len | u64 rec_off | u32 rec_len), sorted by key
+  order    count x u32  — index slot of each record in apps.json order
+  keys     app_id bytes, concatenated
+  records  one compact JSON object per app, concatenated
+
+Usage:
+    from catalog_snapshot import lookup_app
+    app = lookup_app('com.whatsapp')     # dict or None
+
+    python3 bots/catalog_snapshot.py      # (re)build now
+"""
+import os
+import sys
+import mmap
+import time
+import struct
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_store import APPS_FILE, DATA_DIR, decode_json, encode_json, read_json_file
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: no cross-process build lock
+    fcntl = None
+
+SNAPSHOT_FILE = os.environ.get('CATALOG_SNAPSHOT', os.path.join(DATA_DIR, 'apps.snapshot'))
+CHECK_INTERVAL = float(os.environ.get('CATALOG_SNAPSHOT_CHECK', '2'))  # seconds between apps.json stat() calls
+
+MAGIC = b'VTCAT001'
+_HEADER = struct.Struct('<8sIIqq')
+_ENTRY = struct.Struct('<QIQI')
+_ORDER = struct.Struct('<I')
+
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_app_list(path):
+    data = read_json_file(path, default=[])
+    # bot1.py writes {"apps": [...], "last_updated": ...}
+    if isinstance(data, dict):
+        data = data.get('apps') or []
+    return [a for a in data if isinstance(a, dict) and a.get('app_id')]
+
+
+def build_snapshot(apps_path=APPS_FILE, snap_path=SNAPSHOT_FILE):
+    """Build the snapshot file from apps.json. Returns number of records."""
+    mtime_ns, size = _source_stamp(apps_path)
+    apps = _load_app_list(apps_path)
+
+    # Later duplicates of an app_id win, like dict(app_id -> app) did
+    by_id = {}
+    for pos, app in enumerate(apps):
+        by_id[str(app['app_id'])] = pos
+    keys = sorted(by_id, key=lambda k: k.encode('utf-8'))
+    count = len(keys)
+
+    index_size = count * _ENTRY.size
+    order_size = count * _ORDER.size
+    keys_blob = bytearray()
+    recs_blob = bytearray()
+    entries = []
+    for k in keys:
+        kb = k.encode('utf-8')
+        rb = encode_json(apps[by_id[k]])
+        entries.append((len(keys_blob), len(kb), len(recs_blob), len(rb)))
+        keys_blob += kb
+        recs_blob += rb
+
+    keys_base = _HEADER.size + index_size + order_size
+    recs_base = keys_base + len(keys_blob)
+    slot_of = {k: i for i, k in enumerate(keys)}
+    order = sorted(by_id, key=lambda k: by_id[k])
+
+    tmp = f'{snap_path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, count, 0, mtime_ns, size))
+        for ko, kl, ro, rl in entries:
+            f.write(_ENTRY.pack(keys_base + ko, kl, recs_base + ro, rl))
+        for k in order:
+            f.write(_ORDER.pack(slot_of[k]))
+        f.write(keys_blob)
+        f.write(recs_blob)
+    os.replace(tmp, snap_path)
+    return count
+
+
+class CatalogSnapshot:
+    """A memory-mapped snapshot file. Cheap to open; safe to share between threads."""
+
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.inode = (st.st_dev, st.st_ino)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, _, self.src_mtime_ns, self.src_size = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f'not a catalog snapshot: {path}')
+        self._index_base = _HEADER.size
+        self._order_base = self._index_base + self.count * _ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._mm.close()
+
+    def _entry(self, slot):
+        return _ENTRY.unpack_from(self._mm, self._index_base + slot * _ENTRY.size)
+
+    def _find(self, app_id):
+        target = app_id.encode('utf-8')
+        mm = self._mm
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            ko, kl, ro, rl = self._entry(mid)
+            key = mm[ko:ko + kl]
+            if key < target:
+                lo = mid + 1
+            elif key > target:
+                hi = mid
+            else:
+                return ro, rl
+        return None
+
+    def get(self, app_id, default=None):
+        """Decode and return one app record, or default."""
+        if not app_id:
+            return default
+        hit = self._find(app_id)
+        if not hit:
+            return default
+        ro, rl = hit
+        return decode_json(self._mm[ro:ro + rl])
+
+    def __contains__(self, app_id):
+        return bool(app_id) and self._find(app_id) is not None
+
+    def app_ids(self):
+        """All app_ids in apps.json order (decodes keys only)."""
+        mm = self._mm
+        for i in range(self.count):
+            slot, = _ORDER.unpack_from(mm, self._order_base + i * _ORDER.size)
+            ko, kl, _, _ = self._entry(slot)
+            yield mm[ko:ko + kl].decode('utf-8')
+
+    def iter_apps(self):
+        """Decode every record lazily, in apps.json order."""
+        mm = self._mm
+        for i in range(self.count):
+            slot, = _ORDER.unpack_from(mm, self._order_base + i * _ORDER.size)
+            _, _, ro, rl = self._entry(slot)
+            yield decode_json(mm[ro:ro + rl])
+
+
+# ==================== PROCESS-WIDE HANDLE ====================
+
+_current = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _is_fresh(snap, apps_path):
+    try:
+        return (snap.src_mtime_ns, snap.src_size) == _source_stamp(apps_path)
+    except OSError:
+        return True  # apps.json missing: keep serving the last snapshot
+
+
+def _rebuild_locked(apps_path, snap_path):
+    """Rebuild under an flock so N workers noticing the change build it once."""
+    lock_path = snap_path + '.lock'
+    with open(lock_path, 'a') as lf:
+        if fcntl:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            try:
+                snap = CatalogSnapshot(snap_path)
+                fresh = _is_fresh(snap, apps_path)
+                snap.close()
+                if fresh:
+                    return  # another process just built it
+            except (OSError, ValueError):
+                pass
+            n = build_snapshot(apps_path, snap_path)
+            print(f'🗂️ Catalog snapshot rebuilt: {n} apps')
+        finally:
+            if fcntl:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def get_snapshot(apps_path=APPS_FILE, snap_path=SNAPSHOT_FILE):
+    """Return the current snapshot, rebuilding/reopening it when apps.json changed.
+
+    Returns None if there is no apps.json and no snapshot yet.
+    """
+    global _current, _checked_at
+    now = time.monotonic()
+    snap = _current
+    if snap is not None and now - _checked_at < CHECK_INTERVAL:
+        return snap
+    with _lock:
+        snap = _current
+        if snap is not None and time.monotonic() - _checked_at < CHECK_INTERVAL:
+            return snap
+        try:
+            if snap is None or not _is_fresh(snap, apps_path):
+                if os.path.exists(apps_path):
+                    try:
+                        disk = CatalogSnapshot(snap_path)
+                        stale = not _is_fresh(disk, apps_path)
+                        disk.close()
+                    except (OSError, ValueError):
+                        stale = True
+                    if stale:
+                        _rebuild_locked(apps_path, snap_path)
+                st = os.stat(snap_path)
+                if snap is None or snap.inode != (st.st_dev, st.st_ino):
+                    # Old map is left to the GC: other threads may still be reading it
+                    _current = CatalogSnapshot(snap_path)
+        except (OSError, ValueError) as e:
+            print(f'⚠️ Catalog snapshot unavailable: {e}')
+        _checked_at = time.monotonic()
+        return _current
+
+
+def open_snapshot(apps_path, snap_path=None):
+    """A private, up-to-date CatalogSnapshot of any apps.json (caller closes it).
+
+    For processes whose apps.json is not json_store.APPS_FILE. Returns None
+    when apps_path does not exist.
+    """
+    if not os.path.exists(apps_path):
+        return None
+    snap_path = snap_path or os.path.splitext(apps_path)[0] + '.snapshot'
+    try:
+        snap = CatalogSnapshot(snap_path)
+        if _is_fresh(snap, apps_path):
+            return snap
+        snap.close()
+    except (OSError, ValueError):
+        pass
+    _rebuild_locked(apps_path, snap_path)
+    return CatalogSnapshot(snap_path)
+
+
+def invalidate():
+    """Force the next get_snapshot() to re-check apps.json (call after writing it)."""
+    global _checked_at
+    _checked_at = 0.0
+
+
+def lookup_app(app_id):
+    """Single app from the shared snapshot, or None."""
+    snap = get_snapshot()
+    return snap.get(app_id) if snap is not None else None
+
+
+if __name__ == '__main__':
+    t = time.time()
+    n = build_snapshot()
+    print(f'✅ {n} apps → {SNAPSHOT_FILE} ({os.path.getsize(SNAPSHOT_FILE)/1024:.0f} KB, {time.time()-t:.2f}s)')
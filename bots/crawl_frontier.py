@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Persistent crawl frontier for the Uptodown crawler (data/crawl_state.db).
+
+Every page the crawler touches (category listing, app detail, versions list)
+gets one row: state, run it was last processed in, last fetch time, a hash of
+the HTML and the parsed result. Rows are buffered and flushed every
+CHECKPOINT_EVERY pages / CHECKPOINT_SECS seconds, so a crash loses at most one
+checkpoint of work.
+
+The spool table holds finished app records of the current run (streaming
+mode), so apps.json can be written at the end without keeping 30k records
+in memory; it survives a crash and is reused by --resume.
+
+Modes:
+    full     new run, everything is fetched again (content hash still lets
+             unchanged pages skip parsing; detail pages fetched within
+             SEEN_FRESHNESS_HOURS by any run or tool are reused, see seen_set.py)
+    resume   continue the last unfinished run: pages already done in it are
+             served from their stored result
+    refresh  new run, only pages older than max_age are fetched again
+             (category listings are always re-fetched so new apps are found)
+
+    python3 bots/crawl_frontier.py     # print frontier stats
+"""
+import os
+import sys
+import time
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_db import connect
+from json_store import DATA_DIR, decode_json, encode_json
+
+CRAWL_STATE_DB = os.environ.get('CRAWL_STATE_DB', os.path.join(DATA_DIR, 'crawl_state.db'))
+CHECKPOINT_EVERY = int(os.environ.get('CRAWL_CHECKPOINT_EVERY', '200'))  # pages between flushes
+CHECKPOINT_SECS = float(os.environ.get('CRAWL_CHECKPOINT_SECS', '30'))
+REFRESH_MAX_AGE_HOURS = float(os.environ.get('REFRESH_MAX_AGE_HOURS', '24'))
+
+# Kinds that refresh mode always re-fetches (discovery pages)
+ALWAYS_REFRESH = ('category',)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS frontier (
+    url          TEXT PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    state        TEXT NOT NULL DEFAULT 'pending',
+    run_id       INTEGER NOT NULL DEFAULT 0,
+    fetched_at   REAL NOT NULL DEFAULT 0,
+    content_hash TEXT NOT NULL DEFAULT '',
+    app_id       TEXT NOT NULL DEFAULT '',
+    result       BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_frontier_kind ON frontier (kind, state, fetched_at);
+CREATE TABLE IF NOT EXISTS spool (
+    app_id TEXT PRIMARY KEY,
+    date   TEXT NOT NULL DEFAULT '',
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_spool_date ON spool (date DESC);
+CREATE TABLE IF NOT EXISTS crawl_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+'''
+
+
+def content_hash(html):
+    """Short stable hash of a page body."""
+    if isinstance(html, str):
+        html = html.encode('utf-8', 'replace')
+    return hashlib.blake2b(html, digest_size=16).hexdigest()
+
+
+class CrawlFrontier:
+    """URL state for one crawler process. Not thread-safe; use from one event loop."""
+
+    def __init__(self, path=CRAWL_STATE_DB, mode='full', max_age_hours=REFRESH_MAX_AGE_HOURS):
+        if mode not in ('full', 'resume', 'refresh'):
+            raise ValueError(f'unknown frontier mode: {mode}')
+        self.path = path
+        self.mode = mode
+        self.max_age = max_age_hours * 3600
+        self.conn = connect(path, _SCHEMA)
+        self.run_id = 0
+        self._pending = []   # (url, kind)
+        self._done = []      # full rows for upsert
+        self._failed = []    # (url, kind, run_id)
+        self._spool = []     # (app_id, date, record)
+        self._last_flush = time.monotonic()
+        self.stats = {'reused': 0, 'unchanged': 0, 'recorded': 0, 'checkpoints': 0}
+
+    # ---------- run bookkeeping ----------
+
+    def _meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM crawl_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, **values):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO crawl_meta (key, value) VALUES (?, ?)',
+                [(k, str(v)) for k, v in values.items()])
+
+    def begin(self):
+        """Start (or, in resume mode, re-enter) a run. Returns run_id."""
+        last = int(self._meta('run_id', 0))
+        if self.mode == 'resume' and last and self._meta('run_status') == 'running':
+            self.run_id = last
+            done = self.conn.execute(
+                'SELECT COUNT(*) FROM frontier WHERE run_id = ? AND state = ?',
+                (last, 'done')).fetchone()[0]
+            print(f'♻️ Resume run {last}: {done} pages already done')
+        else:
+            if self.mode == 'resume':
+                print('ℹ️ No unfinished run to resume, starting a new one')
+            self.run_id = max(last + 1, int(time.time()))
+            with self.conn:
+                self.conn.execute('DELETE FROM spool')
+        self._set_meta(run_id=self.run_id, run_status='running', run_mode=self.mode,
+                       run_started=time.time())
+        return self.run_id
+
+    def finish(self):
+        self.flush()
+        self._set_meta(run_status='finished', run_finished=time.time())
+
+    # ---------- lookups ----------
+
+    def cached(self, url, kind):
+        """Stored result for `url` if this mode allows skipping the fetch, else None."""
+        if self.mode == 'full':
+            return None
+        if self.mode == 'refresh' and kind in ALWAYS_REFRESH:
+            return None
+        row = self.conn.execute(
+            'SELECT state, run_id, fetched_at, result FROM frontier WHERE url = ?',
+            (url,)).fetchone()
+        if not row or row['state'] != 'done' or row['result'] is None:
+            return None
+        if self.mode == 'resume' and row['run_id'] != self.run_id:
+            return None
+        if self.mode == 'refresh' and time.time() - row['fetched_at'] > self.max_age:
+            return None
+        self.stats['reused'] += 1
+        return decode_json(row['result'])
+
+    def unchanged(self, url, page_hash):
+        """Stored result if the page body hashes the same as last time, else None."""
+        row = self.conn.execute(
+            'SELECT content_hash, result FROM frontier WHERE url = ? AND state = ?',
+            (url, 'done')).fetchone()
+        if not row or row['result'] is None or row['content_hash'] != page_hash:
+            return None
+        self.stats['unchanged'] += 1
+        return decode_json(row['result'])
+
+    def last_fetch(self, url):
+        """(fetched_at, result) of the last successful fetch of `url`, or (0, None)."""
+        row = self.conn.execute(
+            'SELECT fetched_at, result FROM frontier WHERE url = ? AND state = ?',
+            (url, 'done')).fetchone()
+        if not row or row['result'] is None:
+            return 0, None
+        return row['fetched_at'], decode_json(row['result'])
+
+    # ---------- writes (buffered) ----------
+
+    def add(self, url, kind):
+        """Queue a discovered URL (no-op if already known)."""
+        self._pending.append((url, kind))
+
+    def record(self, url, kind, page_hash, result, app_id=''):
+        """Mark `url` done in this run with its parsed result."""
+        self._done.append((url, kind, 'done', self.run_id, time.time(), page_hash or '',
+                           app_id or '', encode_json(result)))
+        self.stats['recorded'] += 1
+        self.maybe_checkpoint()
+
+    def fail(self, url, kind):
+        self._failed.append((url, kind, self.run_id))
+        self.maybe_checkpoint()
+
+    def spool_put(self, record):
+        """Add/replace one finished app record (dict) for this run's apps.json."""
+        if not record.get('app_id'):
+            return
+        self._spool.append((record['app_id'], record.get('date') or '', encode_json(record)))
+        self.maybe_checkpoint()
+
+    def maybe_checkpoint(self):
+        n = len(self._done) + len(self._failed) + len(self._spool)
+        if n >= CHECKPOINT_EVERY or (n and time.monotonic() - self._last_flush >= CHECKPOINT_SECS):
+            self.flush()
+
+    def flush(self):
+        """Write buffered state in one transaction."""
+        if self._pending or self._done or self._failed or self._spool:
+            with self.conn:
+                if self._pending:
+                    self.conn.executemany(
+                        'INSERT OR IGNORE INTO frontier (url, kind) VALUES (?, ?)', self._pending)
+                if self._done:
+                    self.conn.executemany('''
+                        INSERT INTO frontier (url, kind, state, run_id, fetched_at,
+                                              content_hash, app_id, result)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (url) DO UPDATE SET
+                            kind = excluded.kind, state = excluded.state,
+                            run_id = excluded.run_id, fetched_at = excluded.fetched_at,
+                            content_hash = excluded.content_hash,
+                            app_id = excluded.app_id, result = excluded.result
+                    ''', self._done)
+                if self._spool:
+                    self.conn.executemany(
+                        'INSERT OR REPLACE INTO spool (app_id, date, record) VALUES (?, ?, ?)', self._spool)
+                if self._failed:
+                    # Keep the last good result; the page is retried next run
+                    self.conn.executemany('''
+                        INSERT INTO frontier (url, kind, state, run_id) VALUES (?, ?, 'failed', ?)
+                        ON CONFLICT (url) DO UPDATE SET state = 'failed', run_id = excluded.run_id
+                    ''', self._failed)
+            self.stats['checkpoints'] += 1
+        self._pending, self._done, self._failed, self._spool = [], [], [], []
+        self._last_flush = time.monotonic()
+
+    # ---------- spool (streaming mode) ----------
+
+    def spool_add_missing(self, records):
+        """Insert records whose app_id is not spooled yet (crawl results win). Returns count added."""
+        self.flush()
+        added = 0
+        batch = []
+        for rec in records:
+            batch.append((rec['app_id'], rec.get('date') or '', encode_json(rec)))
+            if len(batch) >= 1000:
+                added += self._insert_missing(batch)
+                batch = []
+        if batch:
+            added += self._insert_missing(batch)
+        return added
+
+    def _insert_missing(self, batch):
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO spool (app_id, date, record) VALUES (?, ?, ?)', batch)
+            return self.conn.total_changes - before
+
+    def spool_count(self):
+        self.flush()
+        return self.conn.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+
+    def iter_spool(self, decode=False):
+        """Spooled records, newest date first (encoded JSON bytes, or dicts with decode=True)."""
+        self.flush()
+        for (raw,) in self.conn.execute('SELECT record FROM spool ORDER BY date DESC'):
+            yield decode_json(raw) if decode else raw
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # ---------- reporting ----------
+
+    def summary(self):
+        """{kind: {state: count}} for the whole frontier."""
+        out = {}
+        for kind, state, n in self.conn.execute(
+                'SELECT kind, state, COUNT(*) FROM frontier GROUP BY kind, state'):
+            out.setdefault(kind, {})[state] = n
+        return out
+
+
+if __name__ == '__main__':
+    f = CrawlFrontier()
+    print(f"📊 {CRAWL_STATE_DB} — run {f._meta('run_id', '-')} ({f._meta('run_status', '-')})")
+    for kind, states in sorted(f.summary().items()):
+        print(f"  {kind:<10} " + '  '.join(f'{s}={n}' for s, n in sorted(states.items())))
+    f.close()
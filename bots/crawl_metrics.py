@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Per-source, per-stage crawl timings and counters.
+
+    with crawl_metrics.timer('uptodown', 'search') as t:
+        url = find_page(...)
+        if not url:
+            t.miss()                         # ran fine, found nothing
+    crawl_metrics.count('uptodown', 'version_list', 'unique', 12)
+
+Stages used by the bots: search, detail, probe, version_list, resolve,
+download, upload. Each (source, stage) keeps calls, hits, misses, errors,
+total and max seconds. Jobs call flush(job) at the end of a cycle: one JSON
+line is appended to CRAWL_METRICS_FILE (data/crawl_metrics.jsonl, rolled
+over at CRAWL_METRICS_MAX_MB, CRAWL_METRICS_KEEP old files) and the
+counters start again. summary() is the same table as printed text.
+
+    python3 bots/crawl_metrics.py              # last 24h from the metrics file
+    python3 bots/crawl_metrics.py --hours 168 --job daily_hunt
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from json_store import DATA_DIR
+
+METRICS_FILE = os.environ.get('CRAWL_METRICS_FILE', os.path.join(DATA_DIR, 'crawl_metrics.jsonl'))
+METRICS_ENABLED = os.environ.get('CRAWL_METRICS', '1') == '1'
+METRICS_MAX_MB = float(os.environ.get('CRAWL_METRICS_MAX_MB', '5'))
+METRICS_KEEP = int(os.environ.get('CRAWL_METRICS_KEEP', '3'))
+
+_FIELDS = ('calls', 'hits', 'misses', 'errors', 'seconds', 'max_seconds')
+
+_stats = {}  # (source, stage) -> {field: value, 'counters': {name: n}}
+_lock = threading.Lock()
+_started = time.time()
+
+
+def _entry(source, stage):
+    key = (source or '?', stage)
+    e = _stats.get(key)
+    if e is None:
+        e = _stats[key] = dict.fromkeys(_FIELDS, 0)
+        e['counters'] = {}
+    return e
+
+
+class _Timer:
+    __slots__ = ('source', 'stage', '_t0', '_missed')
+
+    def __init__(self, source, stage):
+        self.source = source
+        self.stage = stage
+        self._missed = False
+
+    def miss(self):
+        """The stage ran but produced nothing (no page, no link, empty list)."""
+        self._missed = True
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._t0
+        if not METRICS_ENABLED:
+            return False
+        with _lock:
+            e = _entry(self.source, self.stage)
+            e['calls'] += 1
+            e['seconds'] += elapsed
+            e['max_seconds'] = max(e['max_seconds'], elapsed)
+            if exc_type is not None:
+                e['errors'] += 1
+            elif self._missed:
+                e['misses'] += 1
+            else:
+                e['hits'] += 1
+        return False
+
+
+def timer(source, stage):
+    return _Timer(source, stage)
+
+
+def count(source, stage, name, n=1):
+    if not METRICS_ENABLED or not n:
+        return
+    with _lock:
+        counters = _entry(source, stage)['counters']
+        counters[name] = counters.get(name, 0) + n
+
+
+def snapshot():
+    """[{source, stage, calls, ...}] for the counters since the last flush."""
+    with _lock:
+        return [dict(e, source=src, stage=stage, counters=dict(e['counters']))
+                for (src, stage), e in sorted(_stats.items())]
+
+
+def _rollover():
+    try:
+        if os.path.getsize(METRICS_FILE) < METRICS_MAX_MB * 1024 * 1024:
+            return
+    except OSError:
+        return
+    for i in range(METRICS_KEEP - 1, 0, -1):
+        if os.path.exists(f'{METRICS_FILE}.{i}'):
+            os.replace(f'{METRICS_FILE}.{i}', f'{METRICS_FILE}.{i + 1}')
+    if METRICS_KEEP > 0:
+        os.replace(METRICS_FILE, f'{METRICS_FILE}.1')
+    else:
+        os.remove(METRICS_FILE)
+
+
+def flush(job):
+    """Append the current counters as one line of METRICS_FILE and reset them."""
+    global _started
+    rows = snapshot()
+    now = time.time()
+    with _lock:
+        _stats.clear()
+        started, _started = _started, now
+    if not METRICS_ENABLED or not rows:
+        return
+    line = {'ts': round(now, 3), 'job': job, 'wall_seconds': round(now - started, 3), 'stats': rows}
+    os.makedirs(os.path.dirname(METRICS_FILE) or '.', exist_ok=True)
+    _rollover()
+    with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+
+def _merge(rows):
+    merged = {}
+    for r in rows:
+        key = (r['source'], r['stage'])
+        m = merged.setdefault(key, dict(dict.fromkeys(_FIELDS, 0), counters={}))
+        for f in _FIELDS:
+            m[f] = max(m[f], r[f]) if f == 'max_seconds' else m[f] + r[f]
+        for name, n in r.get('counters', {}).items():
+            m['counters'][name] = m['counters'].get(name, 0) + n
+    return merged
+
+
+def summary(rows=None, title='Crawl metrics'):
+    """Text table: where the time went per source and stage, and how often it paid off.
+
+    Stages may nest (Uptodown's version_list includes its search), so the
+    share column is of summed stage time, not of wall-clock time.
+    """
+    merged = _merge(snapshot() if rows is None else rows)
+    if not merged:
+        return f'📊 {title}: no data'
+    total = sum(m['seconds'] for m in merged.values()) or 1
+    lines = [f'📊 {title}',
+             f'  {"source":<10} {"stage":<13} {"calls":>6} {"hit%":>5} {"err":>4} '
+             f'{"avg ms":>7} {"max s":>6} {"total s":>8} {"share":>6}']
+    for (source, stage), m in sorted(merged.items(), key=lambda kv: -kv[1]['seconds']):
+        calls = m['calls'] or 1
+        counters = ' '.join(f'{k}={v}' for k, v in sorted(m['counters'].items()))
+        lines.append(f'  {source:<10} {stage:<13} {m["calls"]:>6} {100 * m["hits"] / calls:>4.0f}% '
+                     f'{m["errors"]:>4} {1000 * m["seconds"] / calls:>7.0f} {m["max_seconds"]:>6.1f} '
+                     f'{m["seconds"]:>8.1f} {100 * m["seconds"] / total:>5.1f}%  {counters}'.rstrip())
+    return '\n'.join(lines)
+
+
+def read_file(hours=24, job=None):
+    """Stat rows from METRICS_FILE (and rolled files) of the last `hours`."""
+    cutoff = time.time() - hours * 3600
+    rows = []
+    paths = [METRICS_FILE] + [f'{METRICS_FILE}.{i}' for i in range(1, METRICS_KEEP + 1)]
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                for raw in f:
+                    try:
+                        line = json.loads(raw)
+                    except ValueError:
+                        continue
+                    if line.get('ts', 0) >= cutoff and (job is None or line.get('job') == job):
+                        rows.extend(line.get('stats', ()))
+        except OSError:
+            continue
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize crawl metrics')
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--job', default=None, help='daily_hunt, crawl_versions, ...')
+    args = parser.parse_args()
+    label = f'{METRICS_FILE}, last {args.hours:g}h' + (f', job={args.job}' if args.job else '')
+    print(summary(read_file(args.hours, args.job), title=label))
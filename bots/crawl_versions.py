@@ -3,8 +3,20 @@
 Bot 2: Crawl old versions continuously.
 Re-reads apps.json each cycle so new apps from Bot 1 are picked up automatically.
 Just run: python3 bots/crawl_versions.py
+
+Worker-pool mode (CRAWL_WORKERS > 0): apps are leased from a persistent work
+queue (data/work_queue.db, survives restarts) by CRAWL_WORKERS page-crawling
+threads; APKs download in a separate DOWNLOAD_WORKERS pool with at most
+DOWNLOAD_PER_SOURCE downloads per source, then upload in the PIPE_UPLOADS pool. A cycle is one sweep of the
+catalog; an interrupted sweep continues where it stopped.
+
+Change detection (version_watch): only apps due for a revisit are processed,
+and a full multi-source crawl runs only when a cheap probe says the app
+changed. VERSION_WATCH=0 crawls every app every cycle as before.
 """
-import os, sys, time, hashlib, logging, requests, traceback
+import os, sys, time, hashlib, logging, requests, threading, traceback
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # ---- Default config (set env vars to override) ----
@@ -16,36 +28,63 @@ for k, v in _DEFAULTS.items():
     if not os.environ.get(k):
         os.environ[k] = v
 
-from version_crawler import crawl_old_versions, parse_size_mb, resolve_version_download
+from version_crawler import (crawl_old_versions, parse_size_mb, probe_latest_version,
+                             report_download_result, resolve_version_download, versions_fingerprint)
 from json_store import get_all_apps, save_versions, load_versions
+from version_order import version_key
 from telegram_storage import download_file, upload_apk_to_telegram, HEADERS
+import crawl_metrics
+from work_queue import WorkQueue
+from transfer_pipeline import PIPE_UPLOADS, TMP_BUDGET_MB, TransferPipeline
+import version_watch
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
 
 CYCLE_INTERVAL = int(os.environ.get('CYCLE_INTERVAL', '30'))  # 30s between cycles
 APP_DELAY = int(os.environ.get('APP_DELAY', '1'))  # 1 sec between apps
+# Worker-pool mode (0 = one app at a time, as before)
+CRAWL_WORKERS = int(os.environ.get('CRAWL_WORKERS', '0'))  # apps whose pages are crawled at once
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', '3'))  # concurrent APK downloads (uploads: PIPE_UPLOADS)
+DOWNLOAD_PER_SOURCE = int(os.environ.get('DOWNLOAD_PER_SOURCE', '2'))  # per version source (uptodown, apkcombo, ...)
+DOWNLOAD_BACKLOG = int(os.environ.get('DOWNLOAD_BACKLOG', '20'))  # queued downloads before crawlers wait
 
 
-def dl_and_upload(vdict, app_id, app_title='', tmp_dir='tmp', icon_url=''):
-    """Download APK for a version, upload to Telegram version channel, return (link, size_mb).
-    If icon_url provided, sends icon first then replies with APK (lấy từ apps.json của Bot 1).
-    """
+def _download_version(vdict, app_id, tmp_dir='tmp'):
+    """Download the APK of one version into tmp_dir. Returns (path or None, size_mb)."""
     vn = vdict.get('version_name', '')
     if not vdict.get('apk_url') or not vn:
         return None, 0
-    direct_url, sess = resolve_version_download(vdict)
-    if not direct_url:
-        print(f'    Cannot resolve download for v{vn} ({vdict.get("source")})')
-        return None, 0
-    os.makedirs(tmp_dir, exist_ok=True)
-    sid = app_id.replace('.', '_')
-    h = hashlib.md5(direct_url.encode()).hexdigest()[:6]
-    fname = f'{sid}_v{vn}_{h}.apk'
-    lp = os.path.join(tmp_dir, fname)
-    ds = sess or requests.Session()
-    ds.headers.update(HEADERS)
-    got = download_file(direct_url, lp, session=ds)
+    with crawl_metrics.timer(vdict.get('source'), 'download') as t:
+        lp, mb = _fetch_version_file(vdict, app_id, vn, tmp_dir)
+        if not lp:
+            t.miss()
+    if lp:
+        crawl_metrics.count(vdict.get('source'), 'download', 'mb', round(mb, 1))
+    return lp, mb
+
+
+def _fetch_version_file(vdict, app_id, vn, tmp_dir):
+    # Resolved here, when the download actually runs: a link cached from an
+    # earlier attempt is reused; a cached one that fails is re-resolved once
+    for fresh in (False, True):
+        direct_url, sess, cached_age = resolve_version_download(vdict, fresh=fresh)
+        if not direct_url:
+            print(f'    Cannot resolve download for v{vn} ({vdict.get("source")})')
+            return None, 0
+        os.makedirs(tmp_dir, exist_ok=True)
+        sid = app_id.replace('.', '_')
+        h = hashlib.md5(direct_url.encode()).hexdigest()[:6]
+        fname = f'{sid}_v{vn}_{h}.apk'
+        lp = os.path.join(tmp_dir, fname)
+        ds = sess or requests.Session()
+        ds.headers.update(HEADERS)
+        got = download_file(direct_url, lp, session=ds)
+        # Age at download start, so a long download is not counted as link lifetime
+        report_download_result(vdict, direct_url, bool(got), cached_age or 0.0)
+        if got or cached_age is None:
+            break
+        print(f'    Cached link for v{vn} expired, resolving again')
     if not got:
         print(f'    Download failed v{vn}')
         return None, 0
@@ -61,75 +100,309 @@ def dl_and_upload(vdict, app_id, app_title='', tmp_dir='tmp', icon_url=''):
         except Exception:
             pass
         return None, mb
+    return lp, mb
+
 
+def _upload_version(lp, vdict, app_id, app_title='', icon_url=''):
+    """Upload a downloaded APK to the version channel. Returns (link, size_mb) or (None, 0)."""
     # Upload to version channel (TELEGRAM_VER_CHANNEL_ID)
     ver_channel = os.environ.get('TELEGRAM_VER_CHANNEL_ID')
-    tg_link, _ = upload_apk_to_telegram(
-        lp, app_title=app_title or app_id,
-        app_id=app_id, version=vn,
-        channel_id=ver_channel,
-        icon_url=icon_url  # Lấy icon từ apps.json của Bot 1
-    )
-    try:
-        os.remove(lp)
-    except Exception:
-        pass
+    with crawl_metrics.timer('telegram', 'upload') as t:
+        tg_link, _ = upload_apk_to_telegram(
+            lp, app_title=app_title or app_id,
+            app_id=app_id, version=vdict.get('version_name', ''),
+            channel_id=ver_channel,
+            icon_url=icon_url  # Lấy icon từ apps.json của Bot 1
+        )
+        if not tg_link:
+            t.miss()
     if tg_link:
-        return tg_link, mb
+        return tg_link, os.path.getsize(lp) / 1024 / 1024
     return None, 0
 
 
+def dl_and_upload(vdict, app_id, app_title='', tmp_dir='tmp', icon_url=''):
+    """Download APK for a version, upload to Telegram version channel, return (link, size_mb).
+    If icon_url provided, sends icon first then replies with APK (lấy từ apps.json của Bot 1).
+    """
+    lp, mb = _download_version(vdict, app_id, tmp_dir)
+    if not lp:
+        return None, mb
+    try:
+        return _upload_version(lp, vdict, app_id, app_title, icon_url)
+    finally:
+        try:
+            os.remove(lp)
+        except Exception:
+            pass
+
+
+# ---- Pipelined transfers: version N+1 downloads while version N uploads ----
+# Jobs are {'v': version dict, 'aid', 'title', 'icon'}.
+
+def _pipe_download(job):
+    return _download_version(job['v'], job['aid'])
+
+
+def _pipe_upload(lp, job):
+    return _upload_version(lp, job['v'], job['aid'], app_title=job['title'], icon_url=job['icon'])
+
+
+def _new_pipeline(**kw):
+    return TransferPipeline(_pipe_download, _pipe_upload, **kw)
+
+
+_pipeline = None
+
+
+def _shared_pipeline():
+    """Pipeline for the sequential mode, kept across apps so its pools are not rebuilt per app.
+    Transfers overlap within one app only: process_one_app waits for its last upload
+    (cross-app overlap is what CRAWL_WORKERS > 0 is for)."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = _new_pipeline()
+    return _pipeline
+
+
+def _submit_transfer(pipe, v, aid, title, icon_url):
+    job = {'v': v, 'aid': aid, 'title': title, 'icon': icon_url}
+    return pipe.submit(job, expected_mb=parse_size_mb(v.get('size_str', '')))
+
+
+def _crawl_app(aid, title, limit):
+    """(versions, version keys already on Telegram, crawled) for one app.
+
+    When version_watch sees no change, the stored versions come back with
+    crawled=False (only missing uploads are left to do).
+    """
+    # Check existing versions to skip already-downloaded ones
+    existing = load_versions(aid)
+    existing_with_tg = {version_key(v['version_name']) for v in existing if v.get('telegram_link', '').startswith('https://t.me/') or v.get('apk_url', '').startswith('https://t.me/')}
+    probe = probe_latest_version(aid, title) if version_watch.WATCH_ENABLED else None
+    if existing and not version_watch.needs_full_crawl(aid, probe):
+        version_watch.record(aid, probe[1], probe[0], full=False)
+        return existing, existing_with_tg, False
+    versions = crawl_old_versions(aid, title=title, limit=limit)
+    if probe and version_key(probe[0]) not in {version_key(v['version_name']) for v in versions}:
+        # The crawl missed the release the probe saw (sources failed or timed out):
+        # recording the probe now would skip that release until WATCH_FULL_DAYS
+        version_watch.retry_soon(aid)
+    else:
+        fingerprint = probe[1] if probe else versions_fingerprint(versions)
+        version_watch.record(aid, fingerprint, versions[0]['version_name'] if versions else '')
+    return versions, existing_with_tg, True
+
+
+def _apply_upload(v, pub, mb):
+    if pub:
+        v['telegram_link'] = pub
+        if mb > 0:
+            v['apk_size_mb'] = round(mb, 1)
+
+
+def _save_app(aid, versions):
+    for v in versions:
+        if v.get('size_str') and not v.get('apk_size_mb'):
+            v['apk_size_mb'] = parse_size_mb(v['size_str'])
+    save_versions(aid, versions)
+
+
 def process_one_app(aid, title, limit, dl_limit, skip_dl, icon_url=''):
     """Process a single app: crawl versions, download APKs, save.
     icon_url: lấy từ apps.json để gửi kèm icon khi upload APK.
     """
     print(f'\n  📱 {title} ({aid})')
     try:
-        # Check existing versions to skip already-downloaded ones
-        existing = load_versions(aid)
-        existing_with_tg = {v['version_name'] for v in existing if v.get('telegram_link', '').startswith('https://t.me/') or v.get('apk_url', '').startswith('https://t.me/')}
-
-        versions = crawl_old_versions(aid, title=title, limit=limit)
+        versions, existing_with_tg, crawled = _crawl_app(aid, title, limit)
         if not versions:
             print('    No versions found')
             return 0, 0
 
-        print(f'    Found {len(versions)} versions ({len(existing_with_tg)} already on Telegram)')
+        if crawled:
+            print(f'    Found {len(versions)} versions ({len(existing_with_tg)} already on Telegram)')
+        else:
+            print(f'    Unchanged since last crawl ({len(versions)} versions stored)')
 
         uploaded = 0
         if not skip_dl:
-            for vi, v in enumerate(versions):
-                if uploaded >= dl_limit:
+            pipe = _shared_pipeline()
+            # Skip versions already uploaded to Telegram
+            candidates = iter([(vi, v) for vi, v in enumerate(versions)
+                               if version_key(v.get('version_name', '')) not in existing_with_tg])
+            inflight = {}
+            while True:
+                # Keep up to dl_limit transfers in flight; a failed one is replaced by the next candidate
+                while len(inflight) + uploaded < dl_limit:
+                    nxt = next(candidates, None)
+                    if nxt is None:
+                        break
+                    vi, v = nxt
+                    print(f'    [{vi+1}] Resolving v{v.get("version_name", "")} ({v.get("source")})...')
+                    inflight[_submit_transfer(pipe, v, aid, title, icon_url)] = v
+                if not inflight:
                     break
-                vn = v.get('version_name', '')
-                # Skip if already uploaded to Telegram
-                if vn in existing_with_tg:
-                    continue
-                print(f'    [{vi+1}] Resolving v{vn} ({v.get("source")})...')
-                pub, mb = dl_and_upload(v, aid, app_title=title, icon_url=icon_url)
-                if pub:
-                    v['telegram_link'] = pub
-                    if mb > 0:
-                        v['apk_size_mb'] = round(mb, 1)
-                    uploaded += 1
-                time.sleep(2)
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for f in done:
+                    pub, mb = f.result()
+                    _apply_upload(inflight.pop(f), pub, mb)
+                    if pub:
+                        uploaded += 1
             if uploaded > 0:
                 print(f'    ✅ Uploaded {uploaded} APKs to Telegram')
 
-        for v in versions:
-            if v.get('size_str') and not v.get('apk_size_mb'):
-                v['apk_size_mb'] = parse_size_mb(v['size_str'])
-        save_versions(aid, versions)
-        return len(versions), uploaded
+        if crawled or uploaded:
+            _save_app(aid, versions)
+        return len(versions) if crawled else 0, uploaded
     except Exception as e:
         print(f'    ❌ Error: {e}')
         traceback.print_exc()
         return 0, 0
 
 
+class _PooledSweep:
+    """One catalog sweep with separate crawl and download pools over a WorkQueue."""
+
+    def __init__(self, apps, limit, dl_limit, skip_dl, catalog_ids=None, requeue=False):
+        """apps: the ones to crawl this cycle; catalog_ids: every app still in the
+        catalog (queue items outside it are dropped); requeue: apps already done
+        in the current sweep are crawled again (they are due once more)."""
+        self.by_id = {a['app_id']: a for a in apps}
+        self.catalog_ids = set(self.by_id if catalog_ids is None else catalog_ids)
+        self.requeue = requeue
+        self.limit = limit
+        self.dl_limit = dl_limit
+        self.skip_dl = skip_dl
+        self.queue = WorkQueue('versions')
+        self.pipe = _new_pipeline(download_workers=DOWNLOAD_WORKERS,
+                                  download_slot=lambda job: self._source_slot(job['v'].get('source')))
+        self.backlog = threading.BoundedSemaphore(max(1, DOWNLOAD_BACKLOG))
+        self._source_slots = defaultdict(lambda: threading.BoundedSemaphore(max(1, DOWNLOAD_PER_SOURCE)))
+        self._lock = threading.Lock()
+        self._active = set()  # leased apps still crawling or transferring: leases renewed by _heartbeat
+        self.totals = {'apps': 0, 'versions': 0, 'uploaded': 0, 'failed': 0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, n in deltas.items():
+                self.totals[k] += n
+
+    def _source_slot(self, source):
+        with self._lock:
+            return self._source_slots[source or '?']
+
+    def _done(self, aid):
+        self.queue.done(aid)
+        with self._lock:
+            self._active.discard(aid)
+
+    def _heartbeat(self, stop):
+        """Renew leases of busy apps, so slow transfers are not handed to another worker."""
+        every = max(1.0, min(60.0, self.queue.lease_secs / 3))
+        while not stop.wait(every):
+            with self._lock:
+                active = list(self._active)
+            for aid in active:
+                self.queue.extend(aid)
+
+    def _finish(self, aid, versions, uploaded, crawled=True):
+        if crawled or uploaded:
+            _save_app(aid, versions)
+        self._done(aid)
+        self._count(apps=1, versions=len(versions) if crawled else 0, uploaded=uploaded)
+        done = self.totals['apps']
+        if uploaded:
+            print(f'  ✅ {aid}: {len(versions)} versions, {uploaded} APKs uploaded')
+        if done % 50 == 0:
+            print(f'  📊 {done} apps | {self.totals["versions"]} versions | {self.totals["uploaded"]} APKs')
+
+    def _transferred(self, job, v, future):
+        self.backlog.release()
+        pub, mb = future.result()
+        _apply_upload(v, pub, mb)
+        ok = bool(pub)
+        with self._lock:
+            job['uploaded'] += ok
+            job['remaining'] -= 1
+            last = job['remaining'] == 0
+        if last:
+            self._finish(job['aid'], job['versions'], job['uploaded'], job['crawled'])
+
+    def _crawl_one(self, aid):
+        app = self.by_id[aid]
+        versions, existing_with_tg, crawled = _crawl_app(aid, app.get('title', aid), self.limit)
+        if not versions:
+            self._done(aid)
+            self._count(apps=1)
+            return
+        todo = [] if self.skip_dl else [
+            v for v in versions
+            if v.get('apk_url') and version_key(v.get('version_name', '')) not in existing_with_tg
+        ][:self.dl_limit]
+        if not todo:
+            if crawled:
+                self._finish(aid, versions, 0)
+            else:
+                self._done(aid)
+                self._count(apps=1)
+            return
+        job = {'aid': aid, 'versions': versions, 'remaining': len(todo), 'uploaded': 0, 'crawled': crawled}
+        for v in todo:
+            self.backlog.acquire()  # crawlers wait while downloads are backed up
+            f = _submit_transfer(self.pipe, v, aid, app.get('title', aid), app.get('icon', ''))
+            f.add_done_callback(lambda f, v=v: self._transferred(job, v, f))
+
+    def _crawl_worker(self):
+        while True:
+            leased = self.queue.lease(1)
+            if not leased:
+                return
+            aid = leased[0][0]
+            if aid not in self.by_id:
+                self.queue.done(aid)
+                continue
+            with self._lock:
+                self._active.add(aid)
+            try:
+                self._crawl_one(aid)
+            except Exception as e:
+                print(f'  ❌ {aid}: {e}')
+                traceback.print_exc()
+                self.queue.fail(aid)
+                with self._lock:
+                    self._active.discard(aid)
+                self._count(failed=1)
+
+    def run(self):
+        self.queue.remove_missing(self.catalog_ids)
+        added = self.queue.put_many(list(self.by_id))
+        if self.requeue:
+            added += self.queue.requeue(self.by_id)
+        counts = self.queue.counts()
+        if not counts.get('pending') and not counts.get('leased'):
+            self.queue.reset()  # previous sweep finished: start a new one
+            counts = self.queue.counts()
+        print(f'  🧵 Workers: {CRAWL_WORKERS} crawl / {DOWNLOAD_WORKERS} download '
+              f'({DOWNLOAD_PER_SOURCE}/source) / {PIPE_UPLOADS} upload | queue: {counts} (+{added} new)')
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(stop,), name='lease-renew', daemon=True)
+        heartbeat.start()
+        try:
+            with ThreadPoolExecutor(max_workers=CRAWL_WORKERS, thread_name_prefix='ver-crawl') as crawl_pool:
+                for _ in range(CRAWL_WORKERS):
+                    crawl_pool.submit(self._crawl_worker)
+        finally:
+            self.pipe.close()
+            stop.set()
+        if self.pipe.budget.peak:
+            print(f'  💾 Temp disk peak: {self.pipe.budget.peak / 1024 / 1024:.0f} MB (budget {TMP_BUDGET_MB:.0f} MB)')
+        return self.totals['versions'], self.totals['uploaded']
+
+
 def run_once(limit, dl_limit, app_filter, skip_dl):
     """Run one cycle. Re-reads apps.json to pick up new apps from Bot 1."""
     all_apps = get_all_apps()  # Always fresh read
+    catalog_ids = {a['app_id'] for a in all_apps if a.get('app_id')}
     if app_filter:
         all_apps = [a for a in all_apps if a.get('app_id') == app_filter]
     apps = [a for a in all_apps if a.get('app_id')]
@@ -138,11 +411,24 @@ def run_once(limit, dl_limit, app_filter, skip_dl):
         print('  No apps in database yet. Waiting for Bot 1...')
         return 0, 0
 
+    n_catalog = len(apps)
+    if not app_filter:
+        apps = version_watch.due_apps(apps)
+        if not apps:
+            return 0, 0
+
     print(f'\n{"="*60}')
-    print(f'  Bot 2 cycle: {len(apps)} apps, ver_limit={limit}, dl_limit={dl_limit}')
+    print(f'  Bot 2 cycle: {len(apps)}/{n_catalog} apps due, ver_limit={limit}, dl_limit={dl_limit}')
     print(f'  Upload: {"SKIP" if skip_dl else "Telegram channel"}')
     print(f'{"="*60}')
 
+    if CRAWL_WORKERS > 0:
+        total_ver, total_dl = _PooledSweep(apps, limit, dl_limit, skip_dl, catalog_ids,
+                                          requeue=bool(app_filter) or version_watch.WATCH_ENABLED).run()
+        print(f'\n📊 Cycle done: {total_ver} versions, {total_dl} APKs uploaded')
+        _report_metrics()
+        return total_ver, total_dl
+
     total_ver, total_dl = 0, 0
     for i, app in enumerate(apps):
         aid = app.get('app_id', '')
@@ -157,9 +443,15 @@ def run_once(limit, dl_limit, app_filter, skip_dl):
             time.sleep(APP_DELAY)
 
     print(f'\n📊 Cycle done: {total_ver} versions, {total_dl} APKs uploaded')
+    _report_metrics()
     return total_ver, total_dl
 
 
+def _report_metrics():
+    print(crawl_metrics.summary(title='Time per source/stage this cycle'))
+    crawl_metrics.flush('crawl_versions')
+
+
 def main():
     if not os.environ.get('TELEGRAM_BOT_TOKEN') or not os.environ.get('TELEGRAM_VER_CHANNEL_ID'):
         print("Error: Set TELEGRAM_BOT_TOKEN and TELEGRAM_VER_CHANNEL_ID")
@@ -177,6 +469,8 @@ def main():
     print(f'  TELEGRAM_VER_CHANNEL_ID: {os.environ.get("TELEGRAM_VER_CHANNEL_ID")}')
     print(f'  Cycle interval: {CYCLE_INTERVAL}s ({CYCLE_INTERVAL//60} min)')
     print(f'  App delay: {APP_DELAY}s')
+    if CRAWL_WORKERS > 0:
+        print(f'  Workers: {CRAWL_WORKERS} crawl / {DOWNLOAD_WORKERS} download (queue: data/work_queue.db)')
     print(f'  Version limit: {limit} | Download limit: {dl_limit}')
     if app_filter:
         print(f'  Filter: {app_filter}')
@@ -2,6 +2,8 @@ import os
 import sys
 import json
 import time
+import asyncio
+import argparse
 import traceback
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
@@ -15,6 +17,7 @@ for k, v in _DEFAULTS.items():
     if not os.environ.get(k):
         os.environ[k] = v
 
+import crawl_metrics
 from bot_crawler import fetch_trending, get_apps, resolve_apk_url
 from telegram_storage import download_and_upload, send_text, send_app_info_to_channel2, check_secrets
 from json_store import save_items, check_connection, get_all_apps
@@ -108,6 +111,9 @@ SEARCH_QUERY_GROUPS = [
 # Tăng tốc: 15s between cycles, 1s delay between apps
 CYCLE_INTERVAL = int(os.environ.get('CYCLE_INTERVAL', '15'))  # 15s between cycles
 APP_DELAY = int(os.environ.get('APP_DELAY', '1'))  # 1 sec between apps
+# --async: resolve APK URLs of the whole cycle at once on one aiohttp session (bot_crawler_async)
+USE_ASYNC = os.environ.get('HUNT_ASYNC', '0') == '1'
+ASYNC_CONCURRENCY = int(os.environ.get('HUNT_CONCURRENCY', '32'))
 # Với streaming server, có thể upload file lớn mà không lo OOM
 MAX_APK_SIZE_MB = int(os.environ.get('MAX_APK_SIZE_MB', '2000'))  # 2GB max (telegram limit)
 
@@ -145,7 +151,7 @@ def fetch_from_gplay_search(queries, limit=30):
     return items
 
 
-def run_once():
+def run_once(use_async=USE_ASYNC, concurrency=ASYNC_CONCURRENCY):
     """Run one crawl cycle. Returns number of apps processed."""
     global _cycle_count
     _cycle_count += 1
@@ -173,7 +179,11 @@ def run_once():
     
     # Fallback hoặc cycle đầu: dùng trending
     if not items:
-        items = fetch_trending(limit=30, source='gplay')
+        if use_async:
+            from bot_crawler_async import fetch_trending_async
+            items = asyncio.run(fetch_trending_async(limit=30, source='gplay', concurrency=concurrency))
+        else:
+            items = fetch_trending(limit=30, source='gplay')
         source_name = 'trending'
         print(f'  📂 Nguồn: {source_name}')
     
@@ -240,6 +250,24 @@ def run_once():
                 pass  # Skip apps that can't get icon
     items = has_icon_items
 
+    # Async: resolve every missing APK URL of this cycle up front, concurrently
+    pre_resolved = {}
+    if use_async:
+        to_resolve = [i for i in items
+                      if not i.get('apk_url') and not mapping.get(i.get('app_id', ''))
+                      and not existing_data.get(i.get('app_id', ''), {}).get('local_apk_url')]
+        if to_resolve:
+            from bot_crawler_async import resolve_many_async
+            print(f'  🔎 Resolving {len(to_resolve)} APK URLs (async x{concurrency})...')
+            t0 = time.time()
+            try:
+                results = asyncio.run(resolve_many_async(to_resolve, concurrency=concurrency))
+                pre_resolved = {r['app_id']: r for r in results}
+            except Exception as e:
+                print(f'  ❌ Async resolve error: {e}')
+            found_urls = sum(1 for r in pre_resolved.values() if r.get('apk_url'))
+            print(f'  ✅ {found_urls}/{len(to_resolve)} APK URLs in {time.time() - t0:.1f}s')
+
     new_count = 0
     for idx, i in enumerate(items):
         app_id = i.get('app_id', '')
@@ -286,7 +314,7 @@ def run_once():
             if not apk_url:
                 print(f'  🔎 Resolving APK URL for {app_id}...')
                 try:
-                    resolved = resolve_apk_url(app_id, title=i.get('title'), icon=i.get('icon'))
+                    resolved = pre_resolved.get(app_id) or resolve_apk_url(app_id, title=i.get('title'), icon=i.get('icon'))
                     if resolved:
                         apk_url = resolved.get('apk_url')
                         uptodown_detail = resolved.get('uptodown_detail') or uptodown_detail
@@ -302,12 +330,15 @@ def run_once():
             url_resolved = apk_url is not None  # Track if we even found a URL
             if apk_url:
                 try:
-                    pub_url, size_mb, local_path = download_and_upload(
-                        apk_url, app_id=app_id,
-                        title=i.get('title', ''), version='latest',
-                        max_size_mb=MAX_APK_SIZE_MB,
-                        uptodown_detail=uptodown_detail
-                    )
+                    with crawl_metrics.timer('uptodown' if 'uptodown' in apk_url else 'aptoide', 'download') as t:
+                        pub_url, size_mb, local_path = download_and_upload(
+                            apk_url, app_id=app_id,
+                            title=i.get('title', ''), version='latest',
+                            max_size_mb=MAX_APK_SIZE_MB,
+                            uptodown_detail=uptodown_detail
+                        )
+                        if not (pub_url or local_path):
+                            t.miss()
                     if pub_url:
                         i['apk_public_url'] = pub_url
                         i['apk_size_mb'] = size_mb
@@ -362,11 +393,20 @@ def run_once():
     found = len(items)
     success = len([x for x in items if x.get('telegram_link') or x.get('local_apk_url')])
     print(f'\n📊 Chu kỳ xong: {found} app, {success} upload OK, {new_count} app mới')
+    print(crawl_metrics.summary(title='Thời gian theo nguồn/giai đoạn chu kỳ này'))
+    crawl_metrics.flush('daily_hunt')
     send_text(f'🤖 Bot 1 done: {found} app, {success} uploaded, {new_count} new')
     return found
 
 
 def main():
+    parser = argparse.ArgumentParser(description='VesTool Bot 1 — continuous app crawler')
+    parser.add_argument('--async', dest='use_async', action='store_true', default=USE_ASYNC,
+                        help='Resolve APK URLs concurrently on one aiohttp session')
+    parser.add_argument('--concurrency', type=int, default=ASYNC_CONCURRENCY,
+                        help=f'Apps resolved at once with --async (default {ASYNC_CONCURRENCY})')
+    args = parser.parse_args()
+
     print('='*60)
     print('  VesTool Bot 1 — Continuous App Crawler')
     print('='*60)
@@ -375,6 +415,7 @@ def main():
     print(f'  TELEGRAM_INFO_CHANNEL_ID: {"✅" if os.environ.get("TELEGRAM_INFO_CHANNEL_ID") else "❌"}')
     print(f'  Cycle interval: {CYCLE_INTERVAL}s ({CYCLE_INTERVAL//60} min)')
     print(f'  App delay: {APP_DELAY}s')
+    print(f'  Resolve: {"async x" + str(args.concurrency) if args.use_async else "threads"}')
     check_secrets()
     check_connection()
 
@@ -383,7 +424,7 @@ def main():
         cycle += 1
         print(f'\n🔄 === CYCLE {cycle} === {time.strftime("%Y-%m-%d %H:%M:%S")}')
         try:
-            run_once()
+            run_once(use_async=args.use_async, concurrency=args.concurrency)
         except Exception as e:
             print(f'❌ Cycle {cycle} error: {e}')
             traceback.print_exc()
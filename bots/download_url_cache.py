@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Resolved direct APK URLs with per-source link lifetimes (data/download_urls.db).
+
+Turning a version page into a direct download link costs one page fetch, and
+the links expire (signed tokens). Each resolution is kept with the time it
+was made, and each source has a learned lifetime:
+
+  - a cached link is reused while younger than LIFETIME_SAFETY x lifetime,
+    or until its own expiry query parameter (expires=, exp=, ...) if any
+  - past that margin, up to LIFETIME_PROBE_SPAN x lifetime, it is still
+    reused on a LIFETIME_PROBE_RATE share of lookups: without these probes
+    no download would see an age above the margin, and the estimate could
+    only fall
+  - a download that works with a link of age A: lifetime >= A, so the
+    estimate grows to at least A x 1.25
+  - a download that fails with a link of age A: the link died before A.
+    Inside the margin the estimate shrinks to half of min(lifetime, A); a
+    failed probe only brings it down to A
+
+    python3 bots/download_url_cache.py     # learned lifetimes
+"""
+import os
+import sys
+import time
+import random
+import threading
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_db import connect
+from json_store import DATA_DIR
+
+DOWNLOAD_URL_DB = os.environ.get('DOWNLOAD_URL_DB', os.path.join(DATA_DIR, 'download_urls.db'))
+DOWNLOAD_URL_CACHE_ENABLED = os.environ.get('DOWNLOAD_URL_CACHE', '1') == '1'
+DEFAULT_LIFETIME = float(os.environ.get('DOWNLOAD_URL_LIFETIME', '600'))  # seconds, before anything is learned
+MIN_LIFETIME = 60
+MAX_LIFETIME = 86400
+LIFETIME_SAFETY = 0.8
+LIFETIME_PROBE_RATE = float(os.environ.get('DOWNLOAD_URL_PROBE_RATE', '0.1'))
+LIFETIME_PROBE_SPAN = 2.0
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS download_urls (
+    page_url    TEXT PRIMARY KEY,
+    source      TEXT NOT NULL,
+    direct_url  TEXT NOT NULL,
+    resolved_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS link_lifetime (
+    source     TEXT PRIMARY KEY,
+    lifetime   REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+'''
+
+_EXPIRY_PARAMS = ('expires', 'expire', 'exp', 'x-amz-expires')
+
+stats = {'hits': 0, 'probes': 0, 'misses': 0, 'stored': 0, 'ok': 0, 'expired': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+def _conn():
+    return connect(DOWNLOAD_URL_DB, _SCHEMA)
+
+
+def _url_expiry(url, resolved_at):
+    """Epoch seconds from an expiry query parameter, or None."""
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+    for name in _EXPIRY_PARAMS:
+        for value in query.get(name, ()):
+            if not value.isdigit():
+                continue
+            n = int(value)
+            if name == 'x-amz-expires':
+                return resolved_at + n  # relative seconds
+            return n / 1000 if n > 10 ** 11 else n  # ms or s since epoch
+    return None
+
+
+def lifetime(source, conn=None):
+    own = conn is None
+    conn = conn or _conn()
+    try:
+        row = conn.execute('SELECT lifetime FROM link_lifetime WHERE source = ?', (source,)).fetchone()
+    finally:
+        if own:
+            conn.close()
+    return row[0] if row else DEFAULT_LIFETIME
+
+
+def lookup(page_url):
+    """(direct_url, age_seconds) for a still-valid cached link, else None."""
+    if not DOWNLOAD_URL_CACHE_ENABLED or not page_url:
+        return None
+    conn = _conn()
+    try:
+        row = conn.execute('SELECT source, direct_url, resolved_at FROM download_urls WHERE page_url = ?',
+                           (page_url,)).fetchone()
+        ttl = lifetime(row['source'], conn) if row else 0
+    finally:
+        conn.close()
+    now = time.time()
+    if row:
+        age = now - row['resolved_at']
+        expiry = _url_expiry(row['direct_url'], row['resolved_at'])
+        if expiry:
+            if now < expiry - 30:
+                _count('hits')
+                return row['direct_url'], age
+        elif age < ttl * LIFETIME_SAFETY:
+            _count('hits')
+            return row['direct_url'], age
+        elif age < ttl * LIFETIME_PROBE_SPAN and random.random() < LIFETIME_PROBE_RATE:
+            _count('probes')
+            return row['direct_url'], age
+    _count('misses')
+    return None
+
+
+def store(page_url, source, direct_url):
+    if not DOWNLOAD_URL_CACHE_ENABLED or not page_url or not direct_url:
+        return
+    conn = _conn()
+    try:
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO download_urls (page_url, source, direct_url, resolved_at) '
+                         'VALUES (?, ?, ?, ?)', (page_url, source, direct_url, time.time()))
+    finally:
+        conn.close()
+    _count('stored')
+
+
+def report(page_url, direct_url, ok, age=None):
+    """Learn from one download attempt. age: the link's age when the download
+    started (default: now - resolved_at). Returns the age used, or None if
+    direct_url was not the cached link for page_url."""
+    if not DOWNLOAD_URL_CACHE_ENABLED or not page_url:
+        return None
+    now = time.time()
+    conn = _conn()
+    try:
+        with conn:
+            row = conn.execute('SELECT source, direct_url, resolved_at FROM download_urls WHERE page_url = ?',
+                               (page_url,)).fetchone()
+            if not row or row['direct_url'] != direct_url:
+                return None
+            if age is None:
+                age = now - row['resolved_at']
+            current = lifetime(row['source'], conn)
+            if ok:
+                new = max(current, age * 1.25)
+            else:
+                conn.execute('DELETE FROM download_urls WHERE page_url = ?', (page_url,))
+                if age <= MIN_LIFETIME / 2:
+                    new = current  # a link that fails right after resolving is broken, not expired
+                elif age >= current * LIFETIME_SAFETY:
+                    new = min(current, age)  # a probe past the margin: the lifetime is just below age
+                else:
+                    new = min(current, age) / 2
+            new = min(max(new, MIN_LIFETIME), MAX_LIFETIME)
+            if new != current:
+                conn.execute('INSERT OR REPLACE INTO link_lifetime (source, lifetime, updated_at) VALUES (?, ?, ?)',
+                             (row['source'], new, now))
+    finally:
+        conn.close()
+    _count('ok' if ok else 'expired')
+    return age
+
+
+def prune():
+    """Drop links older than the longest lifetime. Returns rows removed."""
+    conn = _conn()
+    try:
+        with conn:
+            return conn.execute('DELETE FROM download_urls WHERE resolved_at < ?',
+                                (time.time() - MAX_LIFETIME,)).rowcount
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    removed = prune()
+    conn = _conn()
+    rows = conn.execute('SELECT source, lifetime FROM link_lifetime ORDER BY source').fetchall()
+    n = conn.execute('SELECT COUNT(*) FROM download_urls').fetchone()[0]
+    conn.close()
+    print(f'📦 {DOWNLOAD_URL_DB}: {n} cached links ({removed} expired removed)')
+    for source, secs in rows:
+        print(f'  {source:<10} lifetime ≈ {secs / 60:.0f} min')
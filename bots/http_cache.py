@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Shared on-disk HTTP revalidation cache for crawler page fetches (data/http_cache.db).
+
+Pages that come back with an ETag or Last-Modified header are stored
+(zlib-compressed) with their validators. The next fetch of the same URL sends
+If-None-Match / If-Modified-Since; a 304 answer is served from the stored
+body, so an unchanged page costs a header round-trip instead of a download.
+
+Async (aiohttp) callers use lookup() / conditional_headers() / store() /
+touch() directly (through asyncio.to_thread: they hit SQLite); requests-style
+callers use cached_get(), and parsed() to reuse the previous parse of a page
+that came back unchanged.
+
+    python3 bots/http_cache.py          # cache stats
+    python3 bots/http_cache.py --prune  # drop entries older than HTTP_CACHE_MAX_DAYS
+"""
+import os
+import sys
+import time
+import zlib
+import threading
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_db import connect
+
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data'))
+HTTP_CACHE_DB = os.environ.get('HTTP_CACHE_DB', os.path.join(DATA_DIR, 'http_cache.db'))
+HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE', '1') == '1'
+HTTP_CACHE_FRESH_SECS = float(os.environ.get('HTTP_CACHE_FRESH_SECS', '0'))  # serve without asking within this window
+HTTP_CACHE_MAX_DAYS = float(os.environ.get('HTTP_CACHE_MAX_DAYS', '30'))
+PARSE_MEMO_SIZE = int(os.environ.get('HTTP_CACHE_PARSE_MEMO', '8'))  # parsed pages kept in memory (0 = off)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS http_cache (
+    url           TEXT PRIMARY KEY,
+    etag          TEXT NOT NULL DEFAULT '',
+    last_modified TEXT NOT NULL DEFAULT '',
+    body          BLOB NOT NULL,
+    fetched_at    REAL NOT NULL,
+    validated_at  REAL NOT NULL
+);
+'''
+
+# Process-wide counters (module crawlers have no stats dict of their own)
+stats = {'hits': 0, 'not_modified': 0, 'stored': 0, 'parse_skipped': 0}
+_stats_lock = threading.Lock()
+
+_parsed = OrderedDict()  # url -> (validators, parsed page)
+_parsed_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+class CacheEntry:
+    __slots__ = ('url', 'etag', 'last_modified', '_body', 'fetched_at', 'validated_at')
+
+    def __init__(self, url, etag, last_modified, body, fetched_at, validated_at):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self._body = body
+        self.fetched_at = fetched_at
+        self.validated_at = validated_at
+
+    @property
+    def content(self):
+        return zlib.decompress(self._body)
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def is_fresh(self):
+        return HTTP_CACHE_FRESH_SECS > 0 and time.time() - self.validated_at < HTTP_CACHE_FRESH_SECS
+
+
+def _conn():
+    return connect(HTTP_CACHE_DB, _SCHEMA)
+
+
+def lookup(url):
+    """Cached entry for `url`, or None."""
+    if not HTTP_CACHE_ENABLED:
+        return None
+    conn = _conn()
+    try:
+        row = conn.execute(
+            'SELECT etag, last_modified, body, fetched_at, validated_at FROM http_cache WHERE url = ?',
+            (url,)).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    return CacheEntry(url, row['etag'], row['last_modified'], row['body'],
+                      row['fetched_at'], row['validated_at'])
+
+
+def conditional_headers(entry):
+    """Extra request headers that let the server answer 304."""
+    h = {}
+    if entry is not None:
+        if entry.etag:
+            h['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            h['If-Modified-Since'] = entry.last_modified
+    return h
+
+
+def store(url, headers, body):
+    """Save a 200 response if it carries a validator. `body` is str or bytes."""
+    if not HTTP_CACHE_ENABLED:
+        return
+    etag = headers.get('ETag') or ''
+    last_modified = headers.get('Last-Modified') or ''
+    if not etag and not last_modified:
+        return  # nothing to revalidate with
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    now = time.time()
+    conn = _conn()
+    try:
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO http_cache (url, etag, last_modified, body, fetched_at, validated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (url, etag, last_modified, zlib.compress(body, 6), now, now))
+    finally:
+        conn.close()
+    _count('stored')
+
+
+def touch(url):
+    """Record a successful 304 revalidation."""
+    _count('not_modified')
+    _count('hits')
+    conn = _conn()
+    try:
+        with conn:
+            conn.execute('UPDATE http_cache SET validated_at = ? WHERE url = ?', (time.time(), url))
+    finally:
+        conn.close()
+
+
+def cached_get(session, url, headers=None, slot=None, **kwargs):
+    """session.get() with revalidation for requests/cloudscraper sessions.
+
+    Returns the response. On a 304 (or a fresh cache entry) it is rewritten
+    to a 200 carrying the cached body, with r.from_cache = True.
+    slot: e.g. rate_limiter.slot, held around the network request only (not
+    for a fresh entry) and given the real status, 304 included.
+    """
+    entry = lookup(url)
+    if entry is not None and entry.is_fresh():
+        import requests
+        _count('hits')
+        r = requests.Response()
+        r.status_code = 200
+        r.url = url
+        r._content = entry.content
+        r.encoding = 'utf-8'
+        r.from_cache = True
+        r.cache_url = url
+        r.validators = (entry.etag, entry.last_modified)
+        return r
+    h = dict(headers or {})
+    h.update(conditional_headers(entry))
+    if slot is None:
+        r = session.get(url, headers=h or None, **kwargs)
+    else:
+        with slot(url) as s:
+            r = session.get(url, headers=h or None, **kwargs)
+            s.report(r.status_code, r.headers.get('Retry-After'))
+    r.from_cache = False
+    r.cache_url = url
+    r.validators = None
+    if r.status_code == 304 and entry is not None:
+        touch(url)
+        r.status_code = 200
+        r._content = entry.content
+        r.encoding = 'utf-8'
+        r.from_cache = True
+        r.validators = (entry.etag, entry.last_modified)
+    elif r.status_code == 200:
+        store(url, r.headers, r.content)
+    return r
+
+
+def parsed(r, parse):
+    """parse(r.text) for a cached_get() response, reusing the last result for
+    the same URL when the body is the cached, unchanged one (304 / fresh).
+
+    Only pages served from the cache are memoized (a page seen unchanged once
+    is likely to be again), at most PARSE_MEMO_SIZE of them. The returned
+    object may be shared between threads: callers must not modify it.
+    """
+    validators = getattr(r, 'validators', None)
+    url = getattr(r, 'cache_url', None)
+    if not validators or not url or not r.from_cache or PARSE_MEMO_SIZE <= 0:
+        return parse(r.text)
+    with _parsed_lock:
+        hit = _parsed.get(url)
+        if hit is not None and hit[0] == validators:
+            _parsed.move_to_end(url)
+        else:
+            hit = None
+    if hit is not None:
+        _count('parse_skipped')
+        return hit[1]
+    page = parse(r.text)
+    with _parsed_lock:
+        _parsed[url] = (validators, page)
+        _parsed.move_to_end(url)
+        while len(_parsed) > PARSE_MEMO_SIZE:
+            _parsed.popitem(last=False)
+    return page
+
+
+def prune(max_days=HTTP_CACHE_MAX_DAYS):
+    """Drop entries not validated within max_days. Returns rows removed."""
+    conn = _conn()
+    try:
+        with conn:
+            cur = conn.execute('DELETE FROM http_cache WHERE validated_at < ?',
+                               (time.time() - max_days * 86400,))
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if '--prune' in sys.argv:
+        print(f'🧹 Removed {prune()} stale entries')
+    conn = _conn()
+    n, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM http_cache').fetchone()
+    conn.close()
+    print(f'📦 {HTTP_CACHE_DB}: {n} pages, {size/1024/1024:.1f} MB compressed')
@@ -2,20 +2,153 @@
 JSON-based data store — replaces Supabase.
 Data lives in /root/VesTool/data/:
   apps.json                          ← all apps
-  versions/{app_id}.json             ← versions per app
+  versions.db                        ← versions of all apps (see version_store.py)
+  versions/{app_id}.json             ← legacy per-app versions, imported on first read
+
+On-disk form is compact UTF-8 JSON. Set JSON_PRETTY=1 to also write an
+indented copy next to each file ({name}.pretty.json) for manual inspection.
 """
 import os
 import json
 import threading
 from datetime import datetime
 
+import version_store
+from version_order import sort_versions, version_key
+from records import AppRecord, VersionRecord, apps_from_dicts
+
 DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data'))
 APPS_FILE = os.path.join(DATA_DIR, 'apps.json')
 VERSIONS_DIR = os.path.join(DATA_DIR, 'versions')
 
+# Write an extra indented copy of every file (debug only, costs a second write)
+JSON_PRETTY = os.environ.get('JSON_PRETTY', '').strip() == '1'
+# Re-decode the encoded output before replacing the file (slow, off by default)
+JSON_VERIFY = os.environ.get('JSON_VERIFY', '').strip() == '1'
+
 _lock = threading.Lock()
 
 
+# ==================== CODEC ====================
+# orjson > msgspec > stdlib json. All three read bytes and write UTF-8 bytes.
+
+try:
+    import orjson
+
+    CODEC = 'orjson'
+
+    def _loads(raw):
+        return orjson.loads(raw)
+
+    def _dumps(data, pretty=False):
+        opts = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            opts |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=opts)
+except ImportError:
+    try:
+        import msgspec
+
+        CODEC = 'msgspec'
+        _encoder = msgspec.json.Encoder()
+        _decoder = msgspec.json.Decoder()
+
+        def _loads(raw):
+            return _decoder.decode(raw)
+
+        def _dumps(data, pretty=False):
+            out = _encoder.encode(data)
+            return msgspec.json.format(out, indent=2) if pretty else out
+    except ImportError:
+        CODEC = 'json'
+
+        def _loads(raw):
+            return json.loads(raw)
+
+        def _dumps(data, pretty=False):
+            if pretty:
+                return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+            return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def decode_json(raw):
+    """Decode JSON from bytes (or str) with the fastest available codec."""
+    try:
+        return _loads(raw)
+    except Exception:
+        if CODEC == 'json':
+            raise
+        # Fast codecs are stricter (e.g. lone surrogates) — let stdlib decide
+        return json.loads(raw)
+
+
+def encode_json(data, pretty=False):
+    """Encode data to UTF-8 JSON bytes. Compact unless pretty=True."""
+    try:
+        return _dumps(data, pretty)
+    except Exception:
+        if CODEC == 'json':
+            raise
+        if pretty:
+            return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8', 'replace')
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8', 'replace')
+
+
+def read_json_file(path, default=None):
+    """Read and decode a JSON file. Returns default if missing or unreadable."""
+    try:
+        with open(path, 'rb') as f:
+            return decode_json(f.read())
+    except FileNotFoundError:
+        return default
+    except (IOError, OSError, ValueError) as e:
+        print(f'⚠️ read_json_file error {path}: {e}')
+        return default
+
+
+def write_json_file(path, data, pretty=None, verify=None):
+    """Atomically write data as compact UTF-8 JSON (tmp file + os.replace)."""
+    pretty = JSON_PRETTY if pretty is None else pretty
+    verify = JSON_VERIFY if verify is None else verify
+    raw = encode_json(data)
+    if verify:
+        decode_json(raw)
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(raw)
+    os.replace(tmp, path)
+    if pretty:
+        root, ext = os.path.splitext(path)
+        with open(f'{root}.pretty{ext or ".json"}', 'wb') as f:
+            f.write(encode_json(data, pretty=True))
+
+
+def write_json_array(path, encoded_items):
+    """Atomically write a JSON array from already-encoded items (bytes), streaming.
+
+    Memory stays flat however many items there are. No .pretty copy is written.
+    Returns the number of items.
+    """
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + '.tmp'
+    n = 0
+    with open(tmp, 'wb') as f:
+        f.write(b'[')
+        for raw in encoded_items:
+            if n:
+                f.write(b',')
+            f.write(raw)
+            n += 1
+        f.write(b']')
+    os.replace(tmp, path)
+    return n
+
+
 def _ensure_dirs():
     os.makedirs(DATA_DIR, exist_ok=True)
     os.makedirs(VERSIONS_DIR, exist_ok=True)
@@ -25,19 +158,20 @@ def _read_json(path):
     if not os.path.exists(path):
         return []
     try:
-        # Read as bytes first to handle encoding issues
+        # Read as bytes and hand them straight to the codec (no str round-trip)
         with open(path, 'rb') as f:
             raw = f.read()
-        # Try strict UTF-8 first
         try:
-            text = raw.decode('utf-8')
-        except UnicodeDecodeError:
+            return decode_json(raw)
+        except (UnicodeDecodeError, ValueError):
             # Fallback: replace bad bytes and re-write clean file
-            print(f'⚠️ Fixing encoding in {path}')
-            text = raw.decode('utf-8', errors='replace')
-            text = text.replace('\ufffd', '')
-        data = json.loads(text)
-        return data
+            try:
+                text = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                print(f'⚠️ Fixing encoding in {path}')
+                text = raw.decode('utf-8', errors='replace')
+                text = text.replace('\ufffd', '')
+            return json.loads(text)
     except json.JSONDecodeError as e:
         print(f'⚠️ _read_json JSON error {path}: {e}')
         # Try to recover by reading as bytes with lenient encoding
@@ -58,7 +192,7 @@ def _read_json(path):
         return []
 
 
-def _write_json(path, data):
+def _write_json(path, data, pretty=None, verify=None):
     _ensure_dirs()
     # Clean all string values before writing
     if isinstance(data, list):
@@ -68,14 +202,7 @@ def _write_json(path, data):
                     if isinstance(v, str):
                         # Remove any non-UTF8 replacement chars
                         item[k] = v.replace('\ufffd', '')
-    tmp = path + '.tmp'
-    # ensure_ascii=True prevents any encoding issues
-    json_str = json.dumps(data, ensure_ascii=True, indent=2)
-    # Verify roundtrip
-    json.loads(json_str)
-    with open(tmp, 'w', encoding='utf-8') as f:
-        f.write(json_str)
-    os.replace(tmp, path)
+    write_json_file(path, data, pretty=pretty, verify=verify)
 
 
 # ==================== APPS ====================
@@ -85,6 +212,9 @@ def load_apps():
     return _read_json(APPS_FILE)
 
 
+_APP_KEEP_FIELDS = ('local_apk_url', 'channel2_link', 'telegram_link', 'apk_url', 'apk_size_mb')
+
+
 def save_items(items):
     """Save/upsert app items to apps.json. Skips apps without icons."""
     if not items:
@@ -102,18 +232,18 @@ def save_items(items):
             print(f'⏭️ Skip (no icon): {title or app_id}')
             continue
         if app_id and title:
-            valid.append({
-                'app_id': app_id,
-                'title': title,
-                'icon': icon,
-                'description': it.get('description') or '',
-                'apk_url': it.get('apk_public_url') or it.get('apk_url') or '',
-                'apk_size_mb': it.get('apk_size_mb') or 0,
-                'telegram_link': it.get('telegram_link') or '',
-                'local_apk_url': it.get('local_apk_url') or '',  # Direct download URL
-                'channel2_link': it.get('channel2_link') or '',  # Info channel post link
-                'date': it.get('date') or datetime.utcnow().isoformat(),
-            })
+            valid.append(AppRecord(
+                app_id=app_id,
+                title=title,
+                icon=icon,
+                description=it.get('description') or '',
+                apk_url=it.get('apk_public_url') or it.get('apk_url') or '',
+                apk_size_mb=it.get('apk_size_mb') or 0,
+                telegram_link=it.get('telegram_link') or '',
+                local_apk_url=it.get('local_apk_url') or '',  # Direct download URL
+                channel2_link=it.get('channel2_link') or '',  # Info channel post link
+                date=it.get('date') or datetime.utcnow().isoformat(),
+            ))
 
     if skipped > 0:
         print(f'⚠️ Bỏ qua {skipped} app không có icon')
@@ -122,23 +252,18 @@ def save_items(items):
         return
 
     with _lock:
-        existing = load_apps()
-        by_id = {a['app_id']: a for a in existing}
+        by_id = apps_from_dicts(load_apps() or [])
         for item in valid:
-            app_id = item['app_id']
-            if app_id in by_id:
-                # Merge: preserve existing non-empty values for key fields
-                old = by_id[app_id]
-                # Keep existing values if new value is empty
-                for key in ['local_apk_url', 'channel2_link', 'telegram_link', 'apk_url']:
-                    if not item.get(key) and old.get(key):
-                        item[key] = old[key]
-                # Keep existing apk_size_mb if new is 0
-                if not item.get('apk_size_mb') and old.get('apk_size_mb'):
-                    item['apk_size_mb'] = old['apk_size_mb']
+            app_id = item.app_id
+            old = by_id.get(app_id)
+            if old is not None:
+                # Merge: keep existing non-empty values where the new item has none
+                item.fill_missing(old, _APP_KEEP_FIELDS)
             by_id[app_id] = item
         all_apps = sorted(by_id.values(), key=lambda x: x.get('date', ''), reverse=True)
-        _write_json(APPS_FILE, all_apps)
+        _write_json(APPS_FILE, [a.to_dict() for a in all_apps])
+        import catalog_snapshot
+        catalog_snapshot.invalidate()
 
     print(f'✅ Lưu {len(valid)} app ({len(all_apps)} tổng)')
 
@@ -149,11 +274,9 @@ def get_all_apps():
 
 
 def get_app(app_id):
-    """Get a single app by app_id."""
-    for a in load_apps():
-        if a.get('app_id') == app_id:
-            return a
-    return None
+    """Get a single app by app_id (via the mmap catalog snapshot)."""
+    import catalog_snapshot
+    return catalog_snapshot.lookup_app(app_id)
 
 
 # ==================== VERSIONS ====================
@@ -163,9 +286,38 @@ def _versions_path(app_id):
     return os.path.join(VERSIONS_DIR, f'{safe}.json')
 
 
+def _load_legacy_versions(app_id):
+    """Read a pre-SQLite versions/{app_id}.json file (list or {'versions': [...]})."""
+    data = _read_json(_versions_path(app_id))
+    if isinstance(data, dict):
+        data = data.get('versions') or []
+    return [v for v in data if isinstance(v, dict) and v.get('version_name')]
+
+
+def _stored_versions(app_id):
+    """Versions from the store, falling back to the legacy file (read-only)."""
+    versions = version_store.get_versions(app_id)
+    if versions or version_store.has_app(app_id):
+        return versions
+    return _load_legacy_versions(app_id)
+
+
 def load_versions(app_id):
     """Load versions for an app."""
-    return _read_json(_versions_path(app_id))
+    versions = version_store.get_versions(app_id)
+    if versions or version_store.has_app(app_id):
+        return versions
+    legacy = _load_legacy_versions(app_id)
+    if legacy:
+        # One-time import so the next read hits the version store
+        save_versions(app_id, legacy)
+        return version_store.get_versions(app_id)
+    return []
+
+
+def latest_versions(limit=50, source=None):
+    """Newest versions across all apps, most recently discovered first."""
+    return version_store.latest_versions(limit=limit, source=source)
 
 
 def save_versions(app_id, versions):
@@ -191,32 +343,27 @@ def save_versions(app_id, versions):
                     size_mb = val / 1024
                 else:
                     size_mb = val
-        data.append({
-            'version_name': ver_name,
-            'apk_url': v.get('apk_url', ''),
-            'telegram_link': v.get('telegram_link', ''),
-            'apk_size_mb': round(size_mb, 1) if size_mb else 0,
-            'release_date': v.get('release_date', ''),
-            'source': v.get('source', ''),
-        })
+        data.append(VersionRecord(
+            version_name=ver_name,
+            apk_url=v.get('apk_url', ''),
+            telegram_link=v.get('telegram_link', ''),
+            apk_size_mb=round(size_mb, 1) if size_mb else 0,
+            release_date=v.get('release_date', ''),
+            source=v.get('source', ''),
+        ))
 
     with _lock:
-        existing = load_versions(app_id)
-        by_ver = {v['version_name']: v for v in existing}
+        existing = _stored_versions(app_id)
+        # Keyed by parsed version so '1.2' / '1.2.0' / 'v1.2' collapse into one entry
+        by_ver = {version_key(v['version_name']): v for v in existing}
         for d in data:
-            vn = d['version_name']
-            # Merge: preserve existing telegram_link if new data lacks it
+            vn = version_key(d.version_name)
+            # Merge: preserve existing telegram_link / size if new data lacks it
             if vn in by_ver:
-                old = by_ver[vn]
-                if not d.get('telegram_link') and old.get('telegram_link'):
-                    d['telegram_link'] = old['telegram_link']
-                if not d.get('apk_size_mb') and old.get('apk_size_mb'):
-                    d['apk_size_mb'] = old['apk_size_mb']
+                d.fill_missing(by_ver[vn], ('telegram_link', 'apk_size_mb'))
             by_ver[vn] = d
-        all_ver = sorted(by_ver.values(),
-                         key=lambda x: [int(p) for p in x['version_name'].split('.') if p.isdigit()],
-                         reverse=True)
-        _write_json(_versions_path(app_id), all_ver)
+        all_ver = sort_versions(by_ver.values())
+        version_store.put_versions(app_id, all_ver)
 
     print(f'💾 Lưu {len(data)} versions cho {app_id} ({len(all_ver)} tổng)')
 
@@ -13,7 +13,6 @@ Tất cả đều qua VPS, user không bao giờ thấy Telegram link trực ti
 
 import os
 import json
-import time
 import hashlib
 import tempfile
 import requests
@@ -22,6 +21,9 @@ from datetime import datetime
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
+from json_store import read_json_file, write_json_file
+import catalog_snapshot
+
 # Load .env file
 load_dotenv('/root/VesTool/.env')
 
@@ -43,46 +45,21 @@ HEADERS = {
 # Lock for updating apps.json
 _apps_lock = threading.Lock()
 
-# In-memory cache của apps
-_apps_cache = None
-_apps_cache_time = 0
-CACHE_TTL = 60  # Refresh cache mỗi 60s
-
-
-def get_apps_data():
-    """Load apps data with caching."""
-    global _apps_cache, _apps_cache_time
-    
-    now = time.time()
-    if _apps_cache and (now - _apps_cache_time) < CACHE_TTL:
-        return _apps_cache
-    
-    if not os.path.exists(APPS_FILE):
-        return {}
-    
+def get_app_data(app_id):
+    """Look up one app in the shared mmap catalog snapshot (no per-process copy)."""
     try:
-        with open(APPS_FILE, 'r', encoding='utf-8') as f:
-            apps_list = json.load(f)
-        
-        _apps_cache = {app['app_id']: app for app in apps_list}
-        _apps_cache_time = now
-        return _apps_cache
+        return catalog_snapshot.lookup_app(app_id)
     except Exception as e:
         print(f'Error loading apps: {e}')
-        return {}
+        return None
 
 
 def update_app_data(app_id, updates):
     """Update app data in apps.json."""
-    global _apps_cache, _apps_cache_time
-    
     with _apps_lock:
         try:
             # Load current data
-            apps_list = []
-            if os.path.exists(APPS_FILE):
-                with open(APPS_FILE, 'r', encoding='utf-8') as f:
-                    apps_list = json.load(f)
+            apps_list = read_json_file(APPS_FILE, default=[])
             
             # Find and update app
             found = False
@@ -99,12 +76,10 @@ def update_app_data(app_id, updates):
                 apps_list.insert(0, new_app)
             
             # Save
-            with open(APPS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(apps_list, f, ensure_ascii=False, indent=2)
+            write_json_file(APPS_FILE, apps_list)
             
-            # Invalidate cache
-            _apps_cache = None
-            _apps_cache_time = 0
+            # Snapshot is rebuilt from the new apps.json on next lookup
+            catalog_snapshot.invalidate()
             
             return True
         except Exception as e:
@@ -292,8 +267,7 @@ def get_apk_for_download(app_id):
     If APK is already in Telegram, returns link immediately.
     If not, downloads from source, uploads to Telegram, then returns link.
     """
-    apps = get_apps_data()
-    app = apps.get(app_id)
+    app = get_app_data(app_id)
     
     if not app:
         return {
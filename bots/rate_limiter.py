@@ -0,0 +1,219 @@
+"""
+Adaptive per-host rate limiter shared by every crawler (asyncio and threads).
+
+Each site (uptodown.com, apkpure.com, apkcombo.com, aptoide.com, ...) gets
+its own concurrency limit, adjusted AIMD-style:
+  - additive increase: +1 slot after `limit` healthy responses in a row
+    (2xx/3xx/404; a 200 must also be under SLOW_LATENCY and 3x the host's
+    typical latency, a moving average of its 200 responses)
+  - multiplicative decrease: limit * DECREASE_FACTOR on 429/403/5xx,
+    timeouts and connection errors (at most once per DECREASE_COOLDOWN)
+  - 429/503 with Retry-After (seconds or HTTP date) pauses the whole host;
+    without it the pause grows with consecutive throttles.
+
+Usage:
+    async with rate_limiter.async_slot(url) as slot:
+        async with session.get(url) as resp:
+            slot.report(resp.status, resp.headers.get('Retry-After'))
+
+    with rate_limiter.slot(url) as slot:
+        r = session.get(url)
+        slot.report(r.status_code, r.headers.get('Retry-After'))
+
+A slot left without report() counts as success; an exception escaping the
+block counts as an error. Hold a slot only around real network requests:
+a cache-served page would drag the latency average down.
+"""
+import os
+import time
+import asyncio
+import threading
+import urllib.parse
+from email.utils import parsedate_to_datetime
+
+START_CONCURRENCY = int(os.environ.get('HOST_START_CONCURRENCY', '4'))
+MIN_CONCURRENCY = int(os.environ.get('HOST_MIN_CONCURRENCY', '1'))
+MAX_CONCURRENCY = int(os.environ.get('HOST_MAX_CONCURRENCY', '48'))
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 2.0  # seconds: one burst of 429s halves the limit once
+SLOW_LATENCY = float(os.environ.get('HOST_SLOW_LATENCY', '8'))  # seconds
+THROTTLE_PAUSE = 5.0  # base pause when a 429 has no Retry-After
+MAX_PAUSE = 120.0
+POLL_INTERVAL = 0.02
+LATENCY_EWMA = 0.1  # weight of each new 200 response in the typical latency
+
+_THROTTLE_STATUS = (429, 403)
+_PAUSE_STATUS = (429, 503)
+
+
+def host_key(url):
+    """Group subdomains per site: 'whatsapp.en.uptodown.com' -> 'uptodown.com'."""
+    netloc = urllib.parse.urlsplit(url).netloc if '/' in url else url
+    host = netloc.rsplit('@', 1)[-1].split(':', 1)[0].lower()
+    parts = host.split('.')
+    if len(parts) <= 2 or parts[-1].isdigit():  # bare domain or IPv4 address
+        return host
+    return '.'.join(parts[-2:])
+
+
+def parse_retry_after(value):
+    """Retry-After header -> seconds (None if absent/invalid)."""
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    def __init__(self, host):
+        self.host = host
+        self.limit = float(START_CONCURRENCY)
+        self.inflight = 0
+        self.paused_until = 0.0
+        self.typical_latency = None  # EWMA over 200 responses
+        self._healthy_run = 0
+        self._throttle_run = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'max_limit': self.limit}
+
+    # ---------- acquire / release ----------
+
+    def _try_acquire(self):
+        """(acquired, seconds to wait before trying again)."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self.paused_until:
+                return False, self.paused_until - now
+            if self.inflight < int(self.limit):
+                self.inflight += 1
+                self.stats['requests'] += 1
+                return True, 0
+        return False, POLL_INTERVAL
+
+    def acquire(self):
+        while True:
+            ok, wait = self._try_acquire()
+            if ok:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while True:
+            ok, wait = self._try_acquire()
+            if ok:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, status, latency, retry_after=None):
+        """status: HTTP status, or None for a timeout / connection error."""
+        now = time.monotonic()
+        with self._lock:
+            self.inflight -= 1
+            throttled = status in _THROTTLE_STATUS
+            failed = status is None or status >= 500 or throttled
+            if failed:
+                self._healthy_run = 0
+                self.stats['throttled' if throttled else 'errors'] += 1
+                if now - self._last_decrease >= DECREASE_COOLDOWN:
+                    self.limit = max(float(MIN_CONCURRENCY), self.limit * DECREASE_FACTOR)
+                    self._last_decrease = now
+                if status in _PAUSE_STATUS:
+                    self._throttle_run += 1
+                    wait = parse_retry_after(retry_after)
+                    if wait is None:
+                        wait = THROTTLE_PAUSE * self._throttle_run
+                    self.paused_until = max(self.paused_until, now + min(wait, MAX_PAUSE))
+                return
+            self._throttle_run = 0
+            if status == 200:
+                # 304/404 carry no body: they say nothing about page latency
+                typical = self.typical_latency
+                self.typical_latency = latency if typical is None else typical + LATENCY_EWMA * (latency - typical)
+                if latency > SLOW_LATENCY or (typical is not None and latency > 3 * max(typical, 0.05)):
+                    self._healthy_run = 0
+                    return
+            self._healthy_run += 1
+            if self._healthy_run >= int(self.limit) and self.limit < MAX_CONCURRENCY:
+                self.limit += 1
+                self._healthy_run = 0
+                self.stats['max_limit'] = max(self.stats['max_limit'], self.limit)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, host=self.host, limit=int(self.limit), inflight=self.inflight)
+
+
+class _Slot:
+    __slots__ = ('limiter', 'started', 'status', 'retry_after', 'reported')
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.started = 0.0
+        self.status = 200
+        self.retry_after = None
+        self.reported = False
+
+    def report(self, status, retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+        self.reported = True
+
+    def _finish(self, exc):
+        status = self.status
+        if exc is not None and not self.reported:
+            status = None
+        self.limiter.release(status, time.monotonic() - self.started, self.retry_after)
+
+    def __enter__(self):
+        self.limiter.acquire()
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish(exc)
+        return False
+
+    async def __aenter__(self):
+        await self.limiter.acquire_async()
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._finish(exc)
+        return False
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url):
+    key = host_key(url)
+    lim = _limiters.get(key)
+    if lim is None:
+        with _limiters_lock:
+            lim = _limiters.setdefault(key, HostLimiter(key))
+    return lim
+
+
+def slot(url):
+    """Context manager holding one request slot for url's host (threads)."""
+    return _Slot(get_limiter(url))
+
+
+def async_slot(url):
+    """Async context manager holding one request slot for url's host."""
+    return _Slot(get_limiter(url))
+
+
+def snapshot():
+    """Per-host limiter state, for progress logs."""
+    with _limiters_lock:
+        lims = list(_limiters.values())
+    return [l.snapshot() for l in lims]
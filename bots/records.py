@@ -0,0 +1,135 @@
+"""
+Compact in-process records for apps and versions.
+
+Apps travel through the bots as dicts with 15+ string keys; with 30k apps
+that is 30k hash tables plus their key tables. AppRecord / VersionRecord use
+__slots__ (one pointer per field, no per-instance dict) and are converted
+to/from plain dicts only at the edges (JSON files, Telegram, HTTP).
+
+An unset slot means "key absent", so from_dict(d).to_dict() == d, including
+key order for the known fields. Unknown keys are kept in `extra`.
+Records also answer .get() / [] like the dicts they replace, so read-only
+call sites keep working unchanged.
+"""
+import sys
+
+_MISSING = object()
+
+APP_FIELDS = tuple(sys.intern(f) for f in (
+    'app_id', 'title', 'icon', 'description', 'version',
+    'apk_url', 'apk_public_url', 'apk_size_mb', 'telegram_link', 'local_apk_url',
+    'channel2_link', 'uptodown_url', 'uptodown_download', 'source', 'date',
+))
+
+VERSION_FIELDS = tuple(sys.intern(f) for f in (
+    'version_name', 'apk_url', 'telegram_link', 'apk_size_mb',
+    'release_date', 'source', 'size_str',
+))
+
+# Low-cardinality values shared by thousands of records
+_INTERN_VALUES = frozenset(('source',))
+
+
+class _Record:
+    __slots__ = ('extra',)
+    FIELDS = ()
+
+    def __init__(self, **kw):
+        self.extra = None
+        for k, v in kw.items():
+            self.set(k, v)
+
+    @classmethod
+    def from_dict(cls, d):
+        rec = cls.__new__(cls)
+        rec.extra = None
+        fields = cls._field_set
+        for k, v in d.items():
+            if k in fields:
+                if k in _INTERN_VALUES and type(v) is str:
+                    v = sys.intern(v)
+                object.__setattr__(rec, k, v)
+            else:
+                if rec.extra is None:
+                    rec.extra = {}
+                rec.extra[k] = v
+        return rec
+
+    def to_dict(self):
+        out = {}
+        for f in self.FIELDS:
+            v = getattr(self, f, _MISSING)
+            if v is not _MISSING:
+                out[f] = v
+        if self.extra:
+            out.update(self.extra)
+        return out
+
+    def set(self, key, value):
+        if key in self._field_set:
+            if key in _INTERN_VALUES and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key, default)
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        v = self.get(key, _MISSING)
+        if v is _MISSING:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def copy(self):
+        rec = self.__class__.__new__(self.__class__)
+        for f in self.FIELDS:
+            v = getattr(self, f, _MISSING)
+            if v is not _MISSING:
+                object.__setattr__(rec, f, v)
+        rec.extra = dict(self.extra) if self.extra else None
+        return rec
+
+    def fill_missing(self, old, keys):
+        """Copy each of `keys` from `old` where self has an empty value and old does not."""
+        for k in keys:
+            if not self.get(k):
+                v = old.get(k)
+                if v:
+                    self.set(k, v)
+        return self
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.to_dict()!r})'
+
+
+class AppRecord(_Record):
+    __slots__ = APP_FIELDS
+    FIELDS = APP_FIELDS
+    _field_set = frozenset(APP_FIELDS)
+
+
+class VersionRecord(_Record):
+    __slots__ = VERSION_FIELDS
+    FIELDS = VERSION_FIELDS
+    _field_set = frozenset(VERSION_FIELDS)
+
+
+def apps_from_dicts(items):
+    """{app_id: AppRecord} from an iterable of app dicts (entries without app_id are skipped)."""
+    out = {}
+    for d in items:
+        app_id = d.get('app_id') if isinstance(d, dict) else None
+        if app_id:
+            out[app_id] = AppRecord.from_dict(d)
+    return out
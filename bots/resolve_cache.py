@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Persistent app -> source page resolution cache (data/resolve_cache.db).
+
+Finding an app's page on Uptodown/Aptoide means deriving slugs and probing
+or searching until one answers. The answer rarely changes, so it is stored
+per (app_id, source) with the time it was last verified:
+
+  - hit:  detail URL + slug, reused for RESOLVE_TTL_DAYS
+  - miss: "not on this source", reused for RESOLVE_NEGATIVE_TTL_HOURS so
+          apps missing from a source are not searched every cycle
+
+Callers that find a cached URL broken (404) call forget() and search again.
+`app_id` is any stable key: a package name, or an app slug for apk_sources.
+
+    python3 bots/resolve_cache.py          # stats
+    python3 bots/resolve_cache.py --prune  # drop expired entries
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_db import connect
+
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data'))
+RESOLVE_CACHE_DB = os.environ.get('RESOLVE_CACHE_DB', os.path.join(DATA_DIR, 'resolve_cache.db'))
+RESOLVE_CACHE_ENABLED = os.environ.get('RESOLVE_CACHE', '1') == '1'
+RESOLVE_TTL_DAYS = float(os.environ.get('RESOLVE_TTL_DAYS', '30'))
+RESOLVE_NEGATIVE_TTL_HOURS = float(os.environ.get('RESOLVE_NEGATIVE_TTL_HOURS', '24'))
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS resolve_cache (
+    app_id      TEXT NOT NULL,
+    source      TEXT NOT NULL,
+    detail_url  TEXT NOT NULL DEFAULT '',
+    slug        TEXT NOT NULL DEFAULT '',
+    verified_at REAL NOT NULL,
+    PRIMARY KEY (app_id, source)
+) WITHOUT ROWID;
+'''
+
+# Process-wide counters
+stats = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'stored': 0, 'forgotten': 0}
+_stats_lock = threading.Lock()
+
+# Returned by lookup() for a cached "not found on this source"
+NOT_FOUND = ('', '')
+
+
+def _count(key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+def _conn():
+    return connect(RESOLVE_CACHE_DB, _SCHEMA)
+
+
+def _ttl(detail_url):
+    return RESOLVE_TTL_DAYS * 86400 if detail_url else RESOLVE_NEGATIVE_TTL_HOURS * 3600
+
+
+def lookup(app_id, source):
+    """(detail_url, slug) if resolved recently, NOT_FOUND for a cached miss, None to search."""
+    if not RESOLVE_CACHE_ENABLED or not app_id:
+        return None
+    conn = _conn()
+    try:
+        row = conn.execute(
+            'SELECT detail_url, slug, verified_at FROM resolve_cache WHERE app_id = ? AND source = ?',
+            (app_id, source)).fetchone()
+    finally:
+        conn.close()
+    if not row or time.time() - row['verified_at'] > _ttl(row['detail_url']):
+        _count('misses')
+        return None
+    if not row['detail_url']:
+        _count('negative_hits')
+        return NOT_FOUND
+    _count('hits')
+    return row['detail_url'], row['slug']
+
+
+def store(app_id, source, detail_url=None, slug=None):
+    """Record a search result; detail_url=None records "not on this source"."""
+    if not RESOLVE_CACHE_ENABLED or not app_id:
+        return
+    conn = _conn()
+    try:
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO resolve_cache (app_id, source, detail_url, slug, verified_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (app_id, source, detail_url or '', slug or '', time.time()))
+    finally:
+        conn.close()
+    _count('stored')
+
+
+def forget(app_id, source):
+    """Drop a cached answer that turned out wrong (page gone, slug moved)."""
+    if not RESOLVE_CACHE_ENABLED or not app_id:
+        return
+    conn = _conn()
+    try:
+        with conn:
+            conn.execute('DELETE FROM resolve_cache WHERE app_id = ? AND source = ?', (app_id, source))
+    finally:
+        conn.close()
+    _count('forgotten')
+
+
+def prune():
+    """Drop expired entries. Returns rows removed."""
+    now = time.time()
+    conn = _conn()
+    try:
+        with conn:
+            cur = conn.execute(
+                "DELETE FROM resolve_cache WHERE (detail_url != '' AND verified_at < ?) "
+                "OR (detail_url = '' AND verified_at < ?)",
+                (now - RESOLVE_TTL_DAYS * 86400, now - RESOLVE_NEGATIVE_TTL_HOURS * 3600))
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if '--prune' in sys.argv:
+        print(f'🧹 Removed {prune()} expired entries')
+    conn = _conn()
+    rows = conn.execute(
+        "SELECT source, SUM(detail_url != ''), SUM(detail_url = '') FROM resolve_cache GROUP BY source").fetchall()
+    conn.close()
+    print(f'📦 {RESOLVE_CACHE_DB}')
+    for source, found, missing in rows:
+        print(f'  {source:<10} found={found} not_found={missing}')
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Persistent seen-set of app detail pages (data/seen_urls.db + data/seen_urls.bloom).
+
+The same app is listed under several categories (/android/games and
+/android/games/action, ...) and is re-scraped by update_icons.py and
+update_descriptions.py. This set remembers every canonical detail URL with
+the time its page was last fetched, across runs and tools, so a page is not
+fetched twice within SEEN_FRESHNESS_HOURS.
+
+  - exact set: SQLite table seen(url, fetched_at)
+  - Bloom filter in front of it: most never-seen URLs are answered without
+    touching SQLite; saved next to the database and rebuilt from it when
+    missing or over capacity
+
+Usage:
+    seen = SeenSet()
+    if not seen.fresh(url):
+        ... fetch ...
+        seen.mark(url)
+    seen.close()
+
+    python3 bots/seen_set.py        # stats
+"""
+import os
+import sys
+import math
+import time
+import struct
+import hashlib
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_db import connect
+from json_store import DATA_DIR
+
+SEEN_DB = os.environ.get('SEEN_DB', os.path.join(DATA_DIR, 'seen_urls.db'))
+SEEN_FRESHNESS_HOURS = float(os.environ.get('SEEN_FRESHNESS_HOURS', '24'))  # 0 = never skip
+BLOOM_CAPACITY = int(os.environ.get('SEEN_BLOOM_CAPACITY', '200000'))
+BLOOM_ERROR_RATE = 0.01
+FLUSH_EVERY = 200  # buffered marks per SQLite transaction
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS seen (
+    url        TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL
+) WITHOUT ROWID;
+'''
+
+_BLOOM_MAGIC = b'VTBLOOM1'
+_BLOOM_HEADER = struct.Struct('<8sQII')  # magic | n_bits | n_hashes | count
+
+# Sub-pages that all describe the same app
+_APP_SUFFIXES = ('/download', '/versions', '/descargar')
+
+
+def canonical_url(url):
+    """Normalize a detail URL: https, lowercase host, no query/fragment/trailing slash.
+
+    'http://WhatsApp.en.uptodown.com/android/versions?x=1' ->
+    'https://whatsapp.en.uptodown.com/android'
+    """
+    if not url:
+        return ''
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'https'
+    if scheme == 'http':
+        scheme = 'https'
+    host = parts.netloc.lower()
+    path = parts.path.rstrip('/') or '/'
+    if host.endswith('uptodown.com'):
+        for suffix in _APP_SUFFIXES:
+            if path.endswith(suffix):
+                path = path[:-len(suffix)]
+                break
+    return f'{scheme}://{host}{path}'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over str keys (double hashing on one blake2b digest)."""
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self.bits = bytearray((self.n_bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        for i in range(self.n_hashes):
+            yield (h1 + i * h2) % self.n_bits
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, self.n_bits, self.n_hashes, self.count))
+            f.write(self.bits)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, capacity=BLOOM_CAPACITY):
+        """Filter saved at `path`, or None if missing/corrupt/sized for another capacity."""
+        try:
+            with open(path, 'rb') as f:
+                magic, n_bits, n_hashes, count = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+                bits = bytearray(f.read())
+        except (OSError, struct.error):
+            return None
+        bloom = cls(capacity)
+        if magic != _BLOOM_MAGIC or (n_bits, n_hashes) != (bloom.n_bits, bloom.n_hashes) \
+                or len(bits) != len(bloom.bits):
+            return None
+        bloom.bits = bits
+        bloom.count = count
+        return bloom
+
+
+class SeenSet:
+    """Canonical detail URLs and their last fetch time. Use from one thread / event loop."""
+
+    def __init__(self, path=SEEN_DB, freshness_hours=SEEN_FRESHNESS_HOURS):
+        self.path = path
+        self.bloom_path = os.path.splitext(path)[0] + '.bloom'
+        self.freshness = freshness_hours * 3600
+        self.conn = connect(path, _SCHEMA)
+        self._pending = {}  # canonical url -> fetched_at
+        self._dirty = False
+        self.stats = {'bloom_negative': 0, 'fresh': 0, 'stale': 0, 'marked': 0}
+        self.bloom = BloomFilter.load(self.bloom_path)
+        n = len(self)
+        if self.bloom is None or self.bloom.count < n or n > BLOOM_CAPACITY:
+            self._rebuild_bloom(n)
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def _rebuild_bloom(self, n):
+        # Grow past the configured capacity instead of letting the error rate climb
+        self.bloom = BloomFilter(max(BLOOM_CAPACITY, n * 2))
+        for (url,) in self.conn.execute('SELECT url FROM seen'):
+            self.bloom.add(url)
+        self._dirty = True
+
+    def last_fetch(self, url):
+        """Epoch seconds of the last detail fetch of url, or 0."""
+        key = canonical_url(url)
+        if key in self._pending:
+            return self._pending[key]
+        if key not in self.bloom:
+            self.stats['bloom_negative'] += 1
+            return 0
+        row = self.conn.execute('SELECT fetched_at FROM seen WHERE url = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def fresh(self, url):
+        """True if url's detail page was fetched within the freshness window."""
+        if self.freshness <= 0:
+            return False
+        fetched_at = self.last_fetch(url)
+        if fetched_at and time.time() - fetched_at < self.freshness:
+            self.stats['fresh'] += 1
+            return True
+        if fetched_at:
+            self.stats['stale'] += 1
+        return False
+
+    def mark(self, url, fetched_at=None):
+        """Record a successful detail fetch of url (buffered)."""
+        key = canonical_url(url)
+        if not key:
+            return
+        self._pending[key] = fetched_at or time.time()
+        self.stats['marked'] += 1
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with self.conn:
+                self.conn.executemany('''
+                    INSERT INTO seen (url, fetched_at) VALUES (?, ?)
+                    ON CONFLICT (url) DO UPDATE SET fetched_at = excluded.fetched_at
+                ''', self._pending.items())
+            for key in self._pending:
+                if key not in self.bloom:
+                    self.bloom.add(key)
+            self._pending = {}
+            self._dirty = True
+        if self.bloom.count > self.bloom.capacity:
+            self._rebuild_bloom(len(self))
+        if self._dirty:
+            self.bloom.save(self.bloom_path)
+            self._dirty = False
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    s = SeenSet()
+    cutoff = time.time() - s.freshness
+    n_fresh = s.conn.execute('SELECT COUNT(*) FROM seen WHERE fetched_at >= ?', (cutoff,)).fetchone()[0]
+    print(f'📊 {SEEN_DB}: {len(s)} URLs, {n_fresh} fresh (< {SEEN_FRESHNESS_HOURS:g}h)')
+    print(f'🌸 Bloom: {s.bloom.n_bits // 8 // 1024} KiB, {s.bloom.n_hashes} hashes, {s.bloom.count} keys')
+    s.close()
@@ -0,0 +1,224 @@
+"""
+Per-host pool of warmed cloudscraper sessions (requests.Session fallback).
+
+Creating a cloudscraper session per URL repeats the Cloudflare challenge and
+the TLS handshake every time. Sessions here are kept per site (grouped like
+rate_limiter.host_key) and reused, so cookies, clearance tokens and
+keep-alive connections survive between requests:
+
+  - warm-up: a new session first loads the site's home page once, so the
+    challenge is solved before the real request (SESSION_WARMUP=0 disables)
+  - health check: every response is inspected; 403/429/503 and challenge
+    pages count as blocked, any other answer resets the count
+  - rotation: a session blocked SESSION_MAX_BLOCKED times in a row, or older
+    than SESSION_MAX_AGE, is closed and replaced by a fresh one
+  - size: at most SESSION_POOL_SIZE sessions per host (default: the rate
+    limiter's HOST_MAX_CONCURRENCY, the most requests a host gets at once).
+    Healthy sessions are always kept for reuse; a lease beyond the cap waits
+    for one to come back instead of warming a throwaway session
+
+Usage:
+    with session_pool.lease(url, headers=HEADERS) as lease:
+        r = lease.session.get(url, timeout=30)
+        lease.check(r)
+
+    r = session_pool.get(url, headers=HEADERS, timeout=30)   # lease + rate limit + check
+"""
+import os
+import time
+import logging
+import threading
+import urllib.parse
+
+import requests
+
+import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.environ.get('SESSION_POOL_SIZE', str(rate_limiter.MAX_CONCURRENCY)))  # sessions per host
+SESSION_MAX_AGE = float(os.environ.get('SESSION_MAX_AGE', '1800'))  # seconds before rotation
+SESSION_MAX_BLOCKED = int(os.environ.get('SESSION_MAX_BLOCKED', '2'))  # blocked answers in a row
+SESSION_WARMUP = os.environ.get('SESSION_WARMUP', '1') == '1'
+WARMUP_TIMEOUT = 15
+
+_BLOCKED_STATUS = (403, 429, 503)
+_CHALLENGE_MARKERS = ('cf-chl', 'challenge-platform', 'Just a moment...', 'Attention Required!')
+
+
+def _new_session(headers=None):
+    try:
+        import cloudscraper
+        session = cloudscraper.create_scraper(browser={'browser': 'chrome', 'platform': 'windows', 'mobile': False})
+    except Exception:
+        session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def is_blocked(response):
+    """True for an answer that means this session is throttled or challenged."""
+    if response.status_code in _BLOCKED_STATUS:
+        return True
+    if response.status_code == 200 and 'text/html' in response.headers.get('Content-Type', ''):
+        head = response.text[:4000]
+        return any(m in head for m in _CHALLENGE_MARKERS)
+    return False
+
+
+class _Entry:
+    __slots__ = ('session', 'created', 'blocked', 'requests')
+
+    def __init__(self, session):
+        self.session = session
+        self.created = time.monotonic()
+        self.blocked = 0
+        self.requests = 0
+
+    def healthy(self):
+        return self.blocked < SESSION_MAX_BLOCKED and time.monotonic() - self.created < SESSION_MAX_AGE
+
+    def close(self):
+        try:
+            self.session.close()
+        except Exception:
+            pass
+
+
+class Lease:
+    """One checked-out session. Call check(response) for every answer it gets."""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self.session = entry.session
+
+    def check(self, response):
+        self._entry.requests += 1
+        if is_blocked(response):
+            self._entry.blocked += 1
+            self._pool.stats['blocked'] += 1
+        else:
+            self._entry.blocked = 0
+        return response
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if isinstance(exc, requests.RequestException) and not isinstance(exc, requests.HTTPError):
+            self._entry.blocked += 1  # connection reset / timeout: treat like a block
+        self._pool.release(self._entry)
+        return False
+
+
+class HostPool:
+    def __init__(self, host):
+        self.host = host
+        self._idle = []
+        self._live = 0  # sessions created and not closed, idle or leased
+        self._cond = threading.Condition()
+        self.stats = {'created': 0, 'reused': 0, 'rotated': 0, 'blocked': 0, 'warmup_failed': 0, 'waited': 0}
+
+    def _warm(self, session, url):
+        parts = urllib.parse.urlsplit(url)
+        home = f'{parts.scheme}://{parts.netloc}/'
+        try:
+            with rate_limiter.slot(home) as slot:
+                r = session.get(home, timeout=WARMUP_TIMEOUT)
+                slot.report(r.status_code, r.headers.get('Retry-After'))
+        except Exception as e:  # RequestException or a cloudscraper challenge error
+            self.stats['warmup_failed'] += 1
+            logger.debug(f'session_pool warm-up failed {home}: {e}')
+
+    def acquire(self, url, headers=None):
+        with self._cond:
+            waited = False
+            while True:
+                while self._idle:
+                    entry = self._idle.pop()
+                    if entry.healthy():
+                        self.stats['reused'] += 1
+                        return entry
+                    self.stats['rotated'] += 1
+                    self._live -= 1
+                    entry.close()
+                if self._live < max(1, POOL_SIZE):
+                    break
+                if not waited:
+                    waited = True
+                    self.stats['waited'] += 1
+                self._cond.wait()
+            self._live += 1
+            self.stats['created'] += 1
+        entry = _Entry(_new_session(headers))
+        if SESSION_WARMUP:
+            self._warm(entry.session, url)
+        return entry
+
+    def release(self, entry):
+        if entry.healthy():
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+            return
+        logger.debug(f'session_pool: rotating session for {self.host} '
+                     f'(blocked={entry.blocked}, requests={entry.requests})')
+        entry.close()
+        with self._cond:
+            self.stats['rotated'] += 1
+            self._live -= 1
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._live -= len(idle)
+        for entry in idle:
+            entry.close()
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, host=self.host, idle=len(self._idle), live=self._live)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(url):
+    key = rate_limiter.host_key(url)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, HostPool(key))
+    return pool
+
+
+def lease(url, headers=None):
+    """Context manager lending a warmed session for url's host."""
+    pool = get_pool(url)
+    return Lease(pool, pool.acquire(url, headers))
+
+
+def get(url, headers=None, **kwargs):
+    """GET through a pooled session under the host's rate limit slot."""
+    with lease(url, headers) as ls:
+        with rate_limiter.slot(url) as slot:
+            r = ls.session.get(url, headers=headers, **kwargs)
+            slot.report(r.status_code, r.headers.get('Retry-After'))
+        return ls.check(r)
+
+
+def snapshot():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [p.snapshot() for p in pools]
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for p in pools:
+        p.close()
@@ -0,0 +1,159 @@
+"""
+Streaming XML sitemap reader (sitemap index + urlset, plain or gzipped).
+
+Each sitemap file is first downloaded into a spooled temp file (memory up
+to SPOOL_MAX_BYTES, then disk) under the host's rate-limiter slot, with its
+own read timeout instead of the session's total one. Entries are yielded
+only after the slot is released: a caller that stops on a full queue then
+neither holds a slot its own workers need nor lets a timeout cut the file.
+The file is parsed incrementally with XMLPullParser and processed <url>
+elements are dropped right away, so a 50k-entry sitemap never sits in
+memory as one tree. Gzipped files (*.xml.gz, not to be confused with
+Content-Encoding: gzip, which aiohttp already undoes) are inflated chunk by
+chunk with zlib.
+
+    async for loc, lastmod in iter_sitemap(session, 'https://site/sitemap.xml'):
+        ...
+"""
+import os
+import re
+import zlib
+import asyncio
+import tempfile
+from datetime import datetime, timezone
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+import aiohttp
+
+import rate_limiter
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_BYTES = 4 * 1024 * 1024  # sitemap bytes kept in memory before spilling to disk
+SITEMAP_READ_TIMEOUT = float(os.environ.get('SITEMAP_READ_TIMEOUT', '30'))  # seconds between chunks
+MAX_SITEMAPS = 500  # safety cap on child sitemaps followed from indexes
+
+_SITEMAP_LINE_RE = re.compile(r'^\s*sitemap\s*:\s*(\S+)', re.I | re.M)
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def lastmod_ts(value):
+    """W3C datetime ('2024-05-01', '2024-05-01T10:00:00Z', ...) -> epoch seconds, or None."""
+    if not value:
+        return None
+    value = value.strip().replace('Z', '+00:00')
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            dt = datetime.strptime(value[:10], '%Y-%m-%d')
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+async def robots_sitemaps(session, base_url):
+    """Sitemap: URLs listed in base_url/robots.txt (empty list if none)."""
+    url = base_url.rstrip('/') + '/robots.txt'
+    try:
+        async with rate_limiter.async_slot(url) as slot:
+            async with session.get(url) as resp:
+                slot.report(resp.status, resp.headers.get('Retry-After'))
+                if resp.status != 200:
+                    return []
+                text = await resp.text()
+    except Exception:
+        return []
+    return _SITEMAP_LINE_RE.findall(text)
+
+
+async def _stream_entries(session, url):
+    """Yield ('sitemap'|'url', loc, lastmod) from one sitemap file."""
+    parser = XMLPullParser(events=('start', 'end'))
+    inflate = None
+    first = True
+    root = None
+    loc = lastmod = None
+
+    def drain():
+        nonlocal root, loc, lastmod
+        out = []
+        for event, elem in parser.read_events():
+            name = _local(elem.tag)
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            if name == 'loc':
+                loc = (elem.text or '').strip()
+            elif name == 'lastmod':
+                lastmod = (elem.text or '').strip()
+            elif name in ('url', 'sitemap'):
+                if loc:
+                    out.append(('url' if name == 'url' else 'sitemap', loc, lastmod))
+                loc = lastmod = None
+                root.clear()  # processed entries are not kept
+        return out
+
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=SITEMAP_READ_TIMEOUT)
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buf:
+        async with rate_limiter.async_slot(url) as slot:
+            async with session.get(url, timeout=timeout) as resp:
+                slot.report(resp.status, resp.headers.get('Retry-After'))
+                if resp.status != 200:
+                    print(f'⚠️ Sitemap HTTP {resp.status}: {url[:80]}')
+                    return
+                async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                    buf.write(chunk)
+        buf.seek(0)
+        while True:
+            chunk = buf.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if first:
+                first = False
+                if chunk[:2] == b'\x1f\x8b':
+                    inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if inflate is not None:
+                chunk = inflate.decompress(chunk)
+            parser.feed(chunk)
+            for entry in drain():
+                yield entry
+    if inflate is not None:
+        parser.feed(inflate.flush())
+    try:
+        parser.close()
+    except ParseError as e:
+        print(f'⚠️ Sitemap parse error {url[:80]}: {e}')
+    for entry in drain():
+        yield entry
+
+
+async def iter_sitemap(session, url, follow=None):
+    """Yield (loc, lastmod) for every page URL reachable from `url`.
+
+    Sitemap indexes are followed breadth-first; `follow(child_url)` may
+    return False to skip a child sitemap.
+    """
+    queue = [url]
+    seen = set()
+    while queue and len(seen) < MAX_SITEMAPS:
+        current = queue.pop(0)
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            async for kind, loc, lastmod in _stream_entries(session, current):
+                if kind == 'sitemap':
+                    if loc not in seen and (follow is None or follow(loc)):
+                        queue.append(loc)
+                else:
+                    yield loc, lastmod
+        except (asyncio.TimeoutError, zlib.error, ParseError) as e:
+            print(f'⚠️ Sitemap error {current[:80]}: {e}')
+        except Exception as e:
+            print(f'❌ Sitemap fetch failed {current[:80]}: {e}')
@@ -0,0 +1,39 @@
+"""
+SQLite helpers shared by the on-disk stores (versions, crawl state, caches).
+
+Every store opens short-lived connections through connect(), so the same
+database file can be used from several threads and processes (bots + web
+workers) at once. WAL mode lets readers run while a writer holds the lock.
+"""
+import os
+import sqlite3
+import threading
+
+BUSY_TIMEOUT = 30  # seconds to wait for another process's write lock
+
+_schema_done = set()
+_schema_lock = threading.Lock()
+
+
+def connect(path, schema=None):
+    """Open a connection to `path`, creating the file and schema on first use.
+
+    `schema` is an SQL script of CREATE ... IF NOT EXISTS statements. It runs
+    once per (process, path, schema).
+    """
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    key = (path, schema)
+    if key not in _schema_done:
+        with _schema_lock:
+            if key not in _schema_done:
+                conn.execute('PRAGMA journal_mode=WAL')
+                if schema:
+                    conn.executescript(schema)
+                    conn.commit()
+                _schema_done.add(key)
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
@@ -13,6 +13,8 @@ import tempfile
 from datetime import datetime
 from dotenv import load_dotenv
 
+from json_store import APPS_FILE, read_json_file, write_json_file
+
 # Load .env
 load_dotenv('/root/VesTool/.env')
 
@@ -252,11 +254,9 @@ def sync_telegram_to_local():
         local_apps = {}
         if os.path.exists(APPS_FILE):
             try:
-                with open(APPS_FILE, 'r', encoding='utf-8') as f:
-                    local_list = json.load(f)
-                    for app in local_list:
-                        if app.get('app_id'):
-                            local_apps[app['app_id']] = app
+                for app in read_json_file(APPS_FILE, default=[]):
+                    if app.get('app_id'):
+                        local_apps[app['app_id']] = app
             except Exception as e:
                 print(f'⚠️ Error reading local apps: {e}')
         
@@ -280,9 +280,7 @@ def sync_telegram_to_local():
             reverse=True
         )
         
-        os.makedirs(DATA_DIR, exist_ok=True)
-        with open(APPS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(apps_list, f, ensure_ascii=False, indent=2)
+        write_json_file(APPS_FILE, apps_list)
         
         print(f'✅ Synced {len(apps_list)} apps to {APPS_FILE}')
         return len(apps_list)
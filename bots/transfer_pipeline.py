@@ -0,0 +1,130 @@
+"""
+Two-stage download -> upload pipeline with a temp-disk budget.
+
+dl_and_upload() downloads one APK, uploads it, deletes it, and only then
+starts the next one, so the source link idles during every upload and the
+Telegram uplink idles during every download. Here the stages run in their
+own thread pools: version N+1 downloads while version N uploads.
+
+  - PIPE_DOWNLOADS / PIPE_UPLOADS cap each stage's concurrency
+  - TMP_BUDGET_MB caps the bytes of downloaded-but-not-yet-uploaded files;
+    a download waits for room before it starts (the reservation is the
+    expected size, corrected to the real size once the file is on disk)
+
+    with TransferPipeline(download_fn, upload_fn) as pipe:
+        fut = pipe.submit(job, expected_mb=42)
+        link, mb = fut.result()
+
+download_fn(job) -> (path or None, size_mb); upload_fn(path, job) -> (link or None, size_mb).
+The pipeline deletes the file after upload_fn returns.
+"""
+import os
+import logging
+import threading
+import contextlib
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PIPE_DOWNLOADS = int(os.environ.get('PIPE_DOWNLOADS', '2'))
+PIPE_UPLOADS = int(os.environ.get('PIPE_UPLOADS', '1'))
+TMP_BUDGET_MB = float(os.environ.get('TMP_BUDGET_MB', '4096'))
+DEFAULT_EXPECTED_MB = 100  # reservation when a version's size is unknown
+
+_MB = 1024 * 1024
+
+
+class DiskBudget:
+    """Counting semaphore over bytes. One reservation larger than the budget
+    is still let through when nothing else is on disk."""
+
+    def __init__(self, max_mb=TMP_BUDGET_MB):
+        self.max_bytes = int(max_mb * _MB)
+        self.used = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes):
+        with self._cond:
+            while self.used and self.used + nbytes > self.max_bytes:
+                self._cond.wait()
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+
+    def adjust(self, delta):
+        """Correct a reservation to the real file size (may overshoot the budget)."""
+        with self._cond:
+            self.used = max(0, self.used + delta)
+            self.peak = max(self.peak, self.used)
+            if delta < 0:
+                self._cond.notify_all()
+
+    def release(self, nbytes):
+        self.adjust(-nbytes)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class TransferPipeline:
+    def __init__(self, download_fn, upload_fn, download_workers=PIPE_DOWNLOADS,
+                 upload_workers=PIPE_UPLOADS, budget_mb=TMP_BUDGET_MB, download_slot=None):
+        """download_slot(job): optional context manager held around each download
+        (e.g. a per-source semaphore)."""
+        self.download_fn = download_fn
+        self.upload_fn = upload_fn
+        self.download_slot = download_slot
+        self.budget = DiskBudget(budget_mb)
+        self._dl_pool = ThreadPoolExecutor(max_workers=max(1, download_workers), thread_name_prefix='pipe-dl')
+        self._up_pool = ThreadPoolExecutor(max_workers=max(1, upload_workers), thread_name_prefix='pipe-up')
+
+    def submit(self, job, expected_mb=0):
+        """Queue one download+upload. Returns a Future of (link or None, size_mb)."""
+        result = Future()
+        self._dl_pool.submit(self._download, job, int((expected_mb or DEFAULT_EXPECTED_MB) * _MB), result)
+        return result
+
+    def _download(self, job, reserved, result):
+        self.budget.acquire(reserved)
+        path = None
+        try:
+            slot = self.download_slot(job) if self.download_slot else contextlib.nullcontext()
+            with slot:
+                path, mb = self.download_fn(job)
+        except Exception as e:
+            logger.warning(f'pipeline download error: {e}')
+            mb = 0
+        if not path:
+            self.budget.release(reserved)
+            result.set_result((None, mb))
+            return
+        actual = os.path.getsize(path) if os.path.exists(path) else 0
+        self.budget.adjust(actual - reserved)
+        self._up_pool.submit(self._upload, job, path, actual, result)
+
+    def _upload(self, job, path, actual, result):
+        try:
+            out = self.upload_fn(path, job)
+        except Exception as e:
+            logger.warning(f'pipeline upload error: {e}')
+            out = (None, 0)
+        finally:
+            _remove(path)
+            self.budget.release(actual)
+        result.set_result(out)
+
+    def close(self):
+        # Downloads first: they are what feeds the upload pool
+        self._dl_pool.shutdown(wait=True)
+        self._up_pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -4,7 +4,6 @@ Update descriptions for existing apps without re-crawling everything
 """
 
 import asyncio
-import json
 import os
 import sys
 from datetime import datetime
@@ -12,6 +11,7 @@ from datetime import datetime
 # Import crawler
 sys.path.insert(0, '/root/VesTool/bots')
 from uptodown_crawler import UptodownCrawler
+from json_store import read_json_file, write_json_file
 
 DATA_DIR = '/root/VesTool/data'
 APPS_FILE = os.path.join(DATA_DIR, 'apps.json')
@@ -21,8 +21,7 @@ async def update_descriptions():
     """Update descriptions for apps with short/generic descriptions."""
     
     # Load existing apps
-    with open(APPS_FILE, 'r', encoding='utf-8') as f:
-        apps = json.load(f)
+    apps = read_json_file(APPS_FILE, default=[])
     
     print(f'📋 Loaded {len(apps)} apps')
     
@@ -79,8 +78,7 @@ async def update_descriptions():
     
     # Save updated apps
     if updated_count > 0:
-        with open(APPS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(apps, f, ensure_ascii=False, indent=2)
+        write_json_file(APPS_FILE, apps)
         print(f'💾 Updated {updated_count} descriptions in {APPS_FILE}')
     else:
         print('📝 No descriptions were updated')
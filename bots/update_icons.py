@@ -4,7 +4,6 @@ Update icons for existing apps - Fix invalid icon URLs
 """
 
 import asyncio
-import json
 import os
 import sys
 import re
@@ -12,6 +11,7 @@ import time
 
 sys.path.insert(0, '/root/VesTool/bots')
 from uptodown_crawler import UptodownCrawler, normalize_icon_url
+from json_store import read_json_file, write_json_file
 
 DATA_DIR = '/root/VesTool/data'
 APPS_FILE = os.path.join(DATA_DIR, 'apps.json')
@@ -31,8 +31,7 @@ async def update_icons():
     """Update icons for apps with invalid icon URLs."""
     
     # Load existing apps
-    with open(APPS_FILE, 'r', encoding='utf-8') as f:
-        apps = json.load(f)
+    apps = read_json_file(APPS_FILE, default=[])
     
     print(f'📋 Total apps: {len(apps)}')
     
@@ -102,16 +101,14 @@ async def update_icons():
                 print(f'\\n📊 Progress: {i}/{limit} | ✅ {updated_count} | ❌ {failed_count} | ⏱️ ETA: {eta:.0f}s\\n')
                 
                 # Save progress
-                with open(APPS_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(apps, f, ensure_ascii=False, indent=2)
+                write_json_file(APPS_FILE, apps)
                 print('💾 Saved progress')
     
     finally:
         await crawler.close_session()
     
     # Final save
-    with open(APPS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(apps, f, ensure_ascii=False, indent=2)
+    write_json_file(APPS_FILE, apps)
     
     # Report
     elapsed = time.time() - start_time
@@ -13,14 +13,23 @@ Tối ưu tốc độ với:
 
 import asyncio
 import aiohttp
-import json
 import os
 import re
 import time
-from datetime import datetime
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, quote
-import hashlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import json_store
+from json_store import read_json_file, write_json_file, write_json_array
+from catalog_snapshot import open_snapshot
+from records import apps_from_dicts
+from uptodown_parse import HTML_PARSER, normalize_icon_url, parse_category, parse_detail, parse_versions
+import http_cache
+import rate_limiter
+import sitemap_stream
+from crawl_frontier import CrawlFrontier, content_hash, REFRESH_MAX_AGE_HOURS
+from seen_set import SeenSet, canonical_url
 
 # Import Telegram metadata uploader
 try:
@@ -32,14 +41,19 @@ except ImportError:
 
 # ============ CONFIG ============
 MAX_APPS = 30000  # Số app tối đa cào
-CONCURRENT_WORKERS = 50  # Số worker đồng thời
-BATCH_SIZE = 100  # Số app mỗi batch
-REQUEST_DELAY = 0.05  # Delay giữa các request (50ms)
+CONCURRENT_WORKERS = 50  # Kích thước connection pool (tốc độ thực do rate_limiter quyết định)
+DETAIL_WORKERS = 40  # Worker cào trang chi tiết
+VERSION_WORKERS = 20  # Worker cào trang /versions
+QUEUE_SIZE = 500  # Giới hạn mỗi hàng đợi giữa các stage
+PROGRESS_EVERY = 100  # In tiến độ sau mỗi N app
 TIMEOUT = 30  # Timeout cho mỗi request
 MAX_RETRIES = 3  # Số lần retry khi fail
 MAX_VERSIONS = 30  # Số phiên bản tối đa mỗi app
 CRAWL_VERSIONS = True  # Có cào phiên bản hay không
 AUTO_UPLOAD_TELEGRAM = True  # Tự động upload lên Telegram không cần confirm
+STREAMING = os.environ.get('CRAWL_STREAMING', '0') == '1'  # Kết quả ghi thẳng vào spool SQLite, RAM không tăng theo MAX_APPS
+UPLOAD_CHUNK = 500  # Streaming: upload Telegram theo từng lô
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', os.cpu_count() or 1))  # Process parse HTML; 0 = parse trên event loop
 
 DATA_DIR = '/root/VesTool/data'
 APPS_FILE = os.path.join(DATA_DIR, 'apps.json')
@@ -55,6 +69,11 @@ HEADERS = {
 # Base URLs - Fixed structure for Uptodown 2024
 UPTODOWN_BASE = 'https://en.uptodown.com'
 
+# Discovery: 'categories' (page through CATEGORIES) or 'sitemap' (stream XML sitemaps)
+DISCOVERY = 'categories'
+SITEMAP_URL = f'{UPTODOWN_BASE}/sitemap.xml'  # used when robots.txt lists no sitemaps
+APP_URL_RE = re.compile(r'^https://[a-z0-9-]+\.en\.uptodown\.com/android/?$')
+
 # Category URLs to scrape (each has pagination)
 CATEGORIES = [
     '/android/games',
@@ -100,17 +119,6 @@ def extract_app_id_from_url(url):
     return None
 
 
-def normalize_icon_url(icon_url):
-    """Ensure icon URL is valid."""
-    if not icon_url:
-        return ''
-    if icon_url.startswith('//'):
-        return 'https:' + icon_url
-    if not icon_url.startswith('http'):
-        return ''
-    return icon_url
-
-
 def safe_filename(app_id):
     """Convert app_id to safe filename."""
     return app_id.replace('.', '_')
@@ -119,24 +127,36 @@ def safe_filename(app_id):
 # ============ ASYNC SCRAPER ============
 
 class UptodownCrawler:
-    def __init__(self):
+    def __init__(self, mode='full', max_age_hours=REFRESH_MAX_AGE_HOURS, discovery=DISCOVERY, stream=STREAMING):
+        self.mode = mode  # full | resume | refresh (see crawl_frontier.py)
+        self.max_age_hours = max_age_hours
+        self.discovery = discovery  # categories | sitemap
+        self.stream = stream  # results -> frontier spool, existing apps -> mmap snapshot
+        self.frontier = None
+        self.seen = None  # SeenSet shared with update_icons/update_descriptions, opened by init_session
+        self.parse_pool = None  # ProcessPoolExecutor, set up by run()
+        self.parse_stats = Counter()  # "field:strategy" hits from uptodown_parse
         self.session = None
-        self.apps = {}  # app_id -> app_data
-        self.existing_apps = {}  # Load existing data
+        self.existing_apps = {}  # app_id -> AppRecord, or a CatalogSnapshot in streaming mode
         self.stats = {
             'pages_scraped': 0,
             'apps_found': 0,
+            'apps_seen_fresh': 0,  # detail fetched < SEEN_FRESHNESS_HOURS ago (any run/tool): reused
+            'apps_unchanged': 0,  # sitemap lastmod <= last fetch: detail/versions skipped
+            'sitemap_requests': 0,
             'apps_detailed': 0,
+            'apps_collected': 0,  # detail records handed to save (incl. sitemap-unchanged)
             'errors': 0,
+            'cache_hits': 0,  # pages served from http_cache (304 or still fresh)
+            'not_modified': 0,  # 304 answers
+            'throttled': 0,  # 429/403 answers (rate_limiter backs off per host)
             'start_time': 0,
         }
-        self.semaphore = None
-        self.rate_limiter = None
     
     async def init_session(self):
         """Initialize aiohttp session with connection pooling."""
         connector = aiohttp.TCPConnector(
-            limit=CONCURRENT_WORKERS,
+            limit=max(CONCURRENT_WORKERS, DETAIL_WORKERS + VERSION_WORKERS + 1),
             limit_per_host=20,
             ttl_dns_cache=300,
             enable_cleanup_closed=True,
@@ -147,55 +167,131 @@ class UptodownCrawler:
             timeout=timeout,
             headers=HEADERS,
         )
-        self.semaphore = asyncio.Semaphore(CONCURRENT_WORKERS)
-        self.rate_limiter = asyncio.Semaphore(100)  # Max 100 concurrent requests
+        if self.seen is None:
+            self.seen = SeenSet()
     
     async def close_session(self):
         if self.session:
             await self.session.close()
+        if self.seen is not None:
+            self.seen.close()
+            self.seen = None
     
     def load_existing_data(self):
         """Load existing apps.json to preserve Telegram links."""
+        if self.stream:
+            # Index lookups on a shared mmap instead of a 30k-record dict
+            try:
+                snapshot = open_snapshot(APPS_FILE)
+                # `is None`: an empty snapshot is falsy but still open and must be kept (closed in run)
+                self.existing_apps = {} if snapshot is None else snapshot
+                print(f'📂 Indexed {len(self.existing_apps)} existing apps (snapshot)')
+            except Exception as e:
+                print(f'⚠️ Error indexing existing data: {e}')
+            return
         if os.path.exists(APPS_FILE):
             try:
-                with open(APPS_FILE, 'r', encoding='utf-8') as f:
-                    apps_list = json.load(f)
-                    for app in apps_list:
-                        app_id = app.get('app_id')
-                        if app_id:
-                            self.existing_apps[app_id] = app
+                apps_list = read_json_file(APPS_FILE, default=[])
+                # Slotted records: ~1/3 the memory of 30k dicts
+                self.existing_apps.update(apps_from_dicts(apps_list))
                 print(f'📂 Loaded {len(self.existing_apps)} existing apps')
             except Exception as e:
                 print(f'⚠️ Error loading existing data: {e}')
     
+    # ---------- frontier helpers (no-ops when running without a frontier) ----------
+
+    def _cached(self, url, kind):
+        return self.frontier.cached(url, kind) if self.frontier else None
+
+    def _unchanged(self, url, html):
+        """(page_hash, previous result or None) — same HTML as last fetch means same parse."""
+        if not self.frontier:
+            return '', None
+        page_hash = content_hash(html)
+        return page_hash, self.frontier.unchanged(url, page_hash)
+
+    def _record(self, url, kind, page_hash, result, app_id=''):
+        if self.frontier:
+            self.frontier.record(url, kind, page_hash, result, app_id)
+
+    def _seen_result(self, url):
+        """Stored detail result if url was fetched within the seen-set freshness window."""
+        if self.seen is None or self.frontier is None or not self.seen.fresh(url):
+            return None
+        _, stored = self.frontier.last_fetch(url)
+        if stored is not None:
+            self.stats['apps_seen_fresh'] += 1
+        return stored
+
+    def _fail(self, url, kind):
+        if self.frontier:
+            self.frontier.fail(url, kind)
+
+    def _with_existing(self, result):
+        """Preserve existing Telegram data if available."""
+        existing = self.existing_apps.get(result.get('app_id'), {})
+        if existing.get('telegram_link'):
+            result['telegram_link'] = existing['telegram_link']
+            result['local_apk_url'] = existing.get('local_apk_url', '')
+        if existing.get('channel2_link'):
+            result['channel2_link'] = existing['channel2_link']
+        return result
+
+    async def _parse(self, fn, *args):
+        """Run a uptodown_parse function in the process pool (inline when there is none)."""
+        if self.parse_pool is None:
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.parse_pool, fn, *args)
+    
     async def fetch(self, url, retries=MAX_RETRIES):
-        """Fetch URL with retry and rate limiting."""
-        async with self.rate_limiter:
-            for attempt in range(retries):
-                try:
-                    await asyncio.sleep(REQUEST_DELAY)
-                    async with self.session.get(url) as resp:
+        """Fetch URL with retry, rate limiting and ETag/Last-Modified revalidation."""
+        # Cache reads/writes are SQLite: run them off the event loop, and
+        # after the host slot is released
+        entry = await asyncio.to_thread(http_cache.lookup, url)
+        if entry is not None and entry.is_fresh():
+            self.stats['cache_hits'] += 1
+            return entry.text
+        cond_headers = http_cache.conditional_headers(entry)
+        for attempt in range(retries):
+            status = None
+            try:
+                # Per-host AIMD slot; a 429 pauses the host inside the limiter
+                # instead of sleeping while holding a slot
+                async with rate_limiter.async_slot(url) as slot:
+                    async with self.session.get(url, headers=cond_headers) as resp:
+                        slot.report(resp.status, resp.headers.get('Retry-After'))
                         if resp.status == 200:
-                            return await resp.text()
-                        elif resp.status == 429:
-                            # Rate limited - wait and retry
-                            wait_time = 5 * (attempt + 1)
-                            print(f'⏳ Rate limited, waiting {wait_time}s...')
-                            await asyncio.sleep(wait_time)
-                        elif resp.status == 404:
-                            return None
-                        else:
-                            print(f'⚠️ HTTP {resp.status} for {url[:60]}')
-                except asyncio.TimeoutError:
-                    print(f'⏱️ Timeout for {url[:60]}')
-                except Exception as e:
-                    print(f'❌ Error fetching {url[:60]}: {e}')
-                
-                if attempt < retries - 1:
-                    await asyncio.sleep(1 * (attempt + 1))
+                            text = await resp.text()
+                            validators = {'ETag': resp.headers.get('ETag'),
+                                          'Last-Modified': resp.headers.get('Last-Modified')}
+                        status = resp.status  # set last: a body read error leaves it None
+            except asyncio.TimeoutError:
+                print(f'⏱️ Timeout for {url[:60]}')
+            except Exception as e:
+                print(f'❌ Error fetching {url[:60]}: {e}')
+
+            if status == 304 and entry is not None:
+                # Unchanged: same body → frontier hash matches → parse is skipped
+                await asyncio.to_thread(http_cache.touch, url)
+                self.stats['not_modified'] += 1
+                self.stats['cache_hits'] += 1
+                return entry.text
+            if status == 200:
+                await asyncio.to_thread(http_cache.store, url, validators, text)
+                return text
+            elif status in (429, 403):
+                self.stats['throttled'] += 1
+            elif status == 404:
+                return None
+            elif status is not None:
+                print(f'⚠️ HTTP {status} for {url[:60]}')
             
-            self.stats['errors'] += 1
-            return None
+            if attempt < retries - 1:
+                await asyncio.sleep(1 * (attempt + 1))
+        
+        self.stats['errors'] += 1
+        return None
     
     async def scrape_category_page(self, category, page=1):
         """Scrape một trang category."""
@@ -204,212 +300,70 @@ class UptodownCrawler:
         else:
             url = f'{UPTODOWN_BASE}{category}/{page}'
         
+        cached = self._cached(url, 'category')
+        if cached is not None:
+            return cached
+        
         html = await self.fetch(url)
         if not html:
+            self._fail(url, 'category')
             return []
         
-        soup = BeautifulSoup(html, 'html.parser')
-        apps = []
-        seen_urls = set()
+        page_hash, prev = self._unchanged(url, html)
+        if prev is not None:
+            self._record(url, 'category', page_hash, prev)
+            return prev
         
-        # Find all app links with format: {app-slug}.en.uptodown.com/android
-        for link_el in soup.select('a[href*=".en.uptodown.com/android"]'):
-            try:
-                app_url = link_el.get('href', '')
-                if not app_url or '.en.uptodown.com/android' not in app_url:
-                    continue
-                
-                # Deduplicate URLs on same page
-                if app_url in seen_urls:
-                    continue
-                seen_urls.add(app_url)
-                
-                # Extract basic info from link text/image
-                title = link_el.get_text(strip=True) or ''
-                icon = ''
-                
-                # Try to get icon from nearby img
-                img = link_el.select_one('img')
-                if img:
-                    icon = img.get('src') or img.get('data-src', '')
-                    icon = normalize_icon_url(icon)
-                
-                apps.append({
-                    'url': app_url,
-                    'title': title,
-                    'icon': icon,
-                })
-            except Exception as e:
-                continue
+        apps = await self._parse(parse_category, html)
         
         self.stats['pages_scraped'] += 1
+        self._record(url, 'category', page_hash, apps)
         return apps
     
     async def scrape_app_detail(self, app_url, basic_info=None):
         """Scrape chi tiết một app từ Uptodown."""
-        async with self.semaphore:
-            html = await self.fetch(app_url)
-            if not html:
-                return None
+        cached = self._cached(app_url, 'detail')
+        if cached is None:
+            cached = self._seen_result(app_url)
+        if cached is not None:
+            return self._with_existing(cached)
+        
+        html = await self.fetch(app_url)
+        if not html:
+            self._fail(app_url, 'detail')
+            return None
+        
+        if self.seen is not None:
+            self.seen.mark(app_url)
+        page_hash, prev = self._unchanged(app_url, html)
+        if prev is not None:
+            self._record(app_url, 'detail', page_hash, prev, prev.get('app_id', ''))
+            return self._with_existing(prev)
+        
+        try:
+            result = await self._parse(parse_detail, html, app_url, basic_info)
+            self.parse_stats.update(f'{k}:{v}' for k, v in result.pop('_strategy', {}).items())
+            app_id = result['app_id']
+            result = self._with_existing(result)
             
-            soup = BeautifulSoup(html, 'html.parser')
+            self.stats['apps_detailed'] += 1
+            self._record(app_url, 'detail', page_hash, result, app_id)
+            return result
             
-            try:
-                # Title
-                title_el = soup.select_one('h1.name, h1.detail-title, h1')
-                title = title_el.get_text(strip=True) if title_el else (basic_info or {}).get('title', '')
-                
-                # Icon - Priority: og:image (always correct), then img.utdstc.com links
-                icon = ''
-                
-                # Priority 1: og:image meta tag (most reliable)
-                og_image = soup.select_one('meta[property="og:image"]')
-                if og_image:
-                    icon = og_image.get('content', '')
-                    if icon and 'img.utdstc.com/icon' in icon:
-                        icon = normalize_icon_url(icon)
-                
-                # Priority 2: Find any img with img.utdstc.com/icon
-                if not icon or 'utdstc.com/icon' not in icon:
-                    for img in soup.select('img[src*="img.utdstc.com/icon"], img[data-src*="img.utdstc.com/icon"]'):
-                        icon_url = img.get('src') or img.get('data-src', '')
-                        if icon_url and 'img.utdstc.com/icon' in icon_url:
-                            icon = normalize_icon_url(icon_url)
-                            break
-                
-                # Priority 3: Search in srcset
-                if not icon or 'utdstc.com/icon' not in icon:
-                    for img in soup.select('img[srcset*="img.utdstc.com/icon"]'):
-                        srcset = img.get('srcset', '')
-                        match = re.search(r'(https://img\.utdstc\.com/icon[^\s,]+)', srcset)
-                        if match:
-                            icon = normalize_icon_url(match.group(1))
-                            break
-                
-                # Priority 4: Regex search in HTML for icon URL
-                if not icon or 'utdstc.com/icon' not in icon:
-                    icon_match = re.search(r'https://img\.utdstc\.com/icon/[a-f0-9]+/[a-f0-9]+/[a-f0-9]+(?::\d+)?', html)
-                    if icon_match:
-                        icon = icon_match.group(0)
-                        # Add :200 size suffix if not present
-                        if ':' not in icon:
-                            icon = icon + ':200'
-                
-                if not icon:
-                    icon = (basic_info or {}).get('icon', '')
-                
-                # Package name - try to find in page
-                pkg_el = soup.select_one('[class*="package"], .technical-data .package')
-                if pkg_el:
-                    app_id = pkg_el.get_text(strip=True)
-                else:
-                    # Try to find in script or meta
-                    pkg_match = re.search(r'"package"\s*:\s*"([^"]+)"', html)
-                    if pkg_match:
-                        app_id = pkg_match.group(1)
-                    else:
-                        # Use URL slug as fallback
-                        slug_match = re.search(r'https://([^.]+)\.en\.uptodown\.com', app_url)
-                        if slug_match:
-                            app_id = f'com.uptodown.{slug_match.group(1).replace("-", "")}'
-                        else:
-                            app_id = hashlib.md5(app_url.encode()).hexdigest()[:16]
-                
-                # Description - try multiple sources
-                description = ''
-                
-                # Priority 1: Meta description (usually most complete)
-                meta_desc = soup.select_one('meta[name="description"]')
-                if meta_desc:
-                    description = meta_desc.get('content', '').strip()
-                
-                # Priority 2: OG description
-                if not description:
-                    og_desc = soup.select_one('meta[property="og:description"]')
-                    if og_desc:
-                        description = og_desc.get('content', '').strip()
-                
-                # Priority 3: Page content description
-                if not description:
-                    for sel in ['.description', '#description', '.detail-description', '.app-description', '.content p']:
-                        desc_el = soup.select_one(sel)
-                        if desc_el:
-                            desc_text = desc_el.get_text(strip=True)
-                            if len(desc_text) > 30:  # Only take meaningful descriptions
-                                description = desc_text
-                                break
-                
-                # Clean and limit description
-                if description:
-                    # Remove download/APK promotional text
-                    description = re.sub(r'Download.*?for free\.?\s*', '', description, flags=re.IGNORECASE)
-                    description = re.sub(r'.*?APK.*?for Android.*?\.\s*', '', description, flags=re.IGNORECASE) 
-                    description = description.strip()
-                    # Limit to reasonable length but allow longer descriptions
-                    description = description[:1000] if len(description) > 1000 else description
-                
-                # Version
-                ver_el = soup.select_one('.version, .detail-version, [itemprop="softwareVersion"]')
-                version = ver_el.get_text(strip=True) if ver_el else ''
-                
-                # Size
-                size_el = soup.select_one('.size, .detail-size, .file-size')
-                size_text = size_el.get_text(strip=True) if size_el else ''
-                size_mb = 0
-                if size_text:
-                    size_match = re.search(r'([\d.]+)\s*(MB|GB|KB)', size_text, re.I)
-                    if size_match:
-                        val = float(size_match.group(1))
-                        unit = size_match.group(2).upper()
-                        if unit == 'GB':
-                            size_mb = val * 1024
-                        elif unit == 'KB':
-                            size_mb = val / 1024
-                        else:
-                            size_mb = val
-                
-                # APK download URL (Uptodown detail page, NOT actual APK)
-                # Actual APK sẽ được resolve khi user request
-                apk_page_url = app_url.rstrip('/') + '/download'
-                
-                # Build result
-                result = {
-                    'app_id': app_id,
-                    'title': title,
-                    'icon': icon,
-                    'description': description,
-                    'version': version,
-                    'apk_size_mb': round(size_mb, 2),
-                    'uptodown_url': app_url,
-                    'uptodown_download': apk_page_url,
-                    'apk_url': '',  # Will be filled on-demand
-                    'telegram_link': '',  # Will be filled when uploaded
-                    'local_apk_url': '',
-                    'channel2_link': '',
-                    'date': datetime.now().isoformat(),
-                    'source': 'uptodown',
-                }
-                
-                # Preserve existing Telegram data if available
-                existing = self.existing_apps.get(app_id, {})
-                if existing.get('telegram_link'):
-                    result['telegram_link'] = existing['telegram_link']
-                    result['local_apk_url'] = existing.get('local_apk_url', '')
-                if existing.get('channel2_link'):
-                    result['channel2_link'] = existing['channel2_link']
-                
-                self.stats['apps_detailed'] += 1
-                return result
-                
-            except Exception as e:
-                print(f'❌ Error parsing {app_url[:50]}: {e}')
-                self.stats['errors'] += 1
-                return None
-    
+        except Exception as e:
+            print(f'❌ Error parsing {app_url[:50]}: {e}')
+            self.stats['errors'] += 1
+            return None
+
     async def scrape_app_versions(self, app_url, app_id):
         """Cào danh sách phiên bản cũ từ /versions page."""
         versions = []
         versions_url = app_url.rstrip('/') + '/versions'
+        state_url = versions_url  # frontier key, even when /old is what answered
+        
+        cached = self._cached(state_url, 'versions')
+        if cached is not None:
+            return cached
         
         html = await self.fetch(versions_url)
         if not html:
@@ -418,102 +372,39 @@ class UptodownCrawler:
             html = await self.fetch(versions_url)
         
         if not html:
+            self._fail(state_url, 'versions')
             return versions
         
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # Find version items - multiple selector strategies
-        ver_items = soup.select('div[data-url][data-version-id]')
-        if not ver_items:
-            ver_items = soup.select('div#versions-items-list div[data-url]')
-        if not ver_items:
-            ver_items = soup.select('div[data-url]')
+        page_hash, prev = self._unchanged(state_url, html)
+        if prev is not None:
+            self._record(state_url, 'versions', page_hash, prev, app_id)
+            return prev
         
-        seen = set()
-        for item in ver_items[:MAX_VERSIONS * 2]:
-            try:
-                # Version name
-                ver_name = ''
-                ver_tag = item.select_one('span.version, .versionName, .name')
-                if ver_tag:
-                    ver_name = ver_tag.get_text(strip=True)
-                if not ver_name:
-                    ver_name = item.get('data-version', '')
-                
-                # Extract version number
-                ver_match = re.search(r'(\d+(?:\.\d+)+)', ver_name)
-                if ver_match:
-                    ver_name = ver_match.group(1)
-                elif not ver_name:
-                    continue
-                
-                if ver_name in seen:
-                    continue
-                seen.add(ver_name)
-                
-                # Download URL
-                data_url = item.get('data-url', '')
-                version_id = item.get('data-version-id', '')
-                apk_url = ''
-                if data_url and version_id:
-                    apk_url = f'{data_url.rstrip("/")}/download/{version_id}'
-                elif data_url:
-                    apk_url = f'{data_url.rstrip("/")}/download'
-                
-                # Size
-                size_str = ''
-                size_tag = item.select_one('.size, .file-size')
-                if size_tag:
-                    size_str = size_tag.get_text(strip=True)
-                
-                # Date
-                date_str = ''
-                date_tag = item.select_one('span.date, .update-date')
-                if date_tag:
-                    date_str = date_tag.get_text(strip=True)
-                
-                versions.append({
-                    'version_name': ver_name,
-                    'apk_url': apk_url,
-                    'size_str': size_str,
-                    'release_date': date_str,
-                    'source': 'uptodown',
-                })
-                
-                if len(versions) >= MAX_VERSIONS:
-                    break
-                    
-            except Exception as e:
-                continue
+        versions = await self._parse(parse_versions, html, MAX_VERSIONS)
         
+        self._record(state_url, 'versions', page_hash, versions, app_id)
         return versions
     
     def save_versions(self, app_id, versions):
-        """Lưu danh sách phiên bản vào file JSON."""
+        """Lưu danh sách phiên bản vào version store (data/versions.db)."""
         if not versions:
             return False
         
-        os.makedirs(VERSIONS_DIR, exist_ok=True)
-        filename = safe_filename(app_id) + '.json'
-        filepath = os.path.join(VERSIONS_DIR, filename)
-        
-        data = {
-            'app_id': app_id,
-            'versions': versions,
-            'updated_at': datetime.now().isoformat(),
-        }
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        json_store.save_versions(app_id, versions)
         
         return True
     
-    async def scrape_all_category_pages(self):
-        """Cào tất cả các trang từ các danh mục để lấy danh sách app."""
+    async def scrape_all_category_pages(self, on_app=None):
+        """Cào tất cả các trang từ các danh mục để lấy danh sách app.
+        
+        on_app: optional coroutine called with each new app as soon as its
+        listing page is parsed (feeds the detail queue).
+        """
         print('🔍 Đang cào danh sách app từ Uptodown categories...')
         
-        all_apps = []
+        all_apps = []  # only kept when nobody consumes apps as they come
         seen_urls = set()
+        found = 0
         
         for category in CATEGORIES:
             page = 1
@@ -522,7 +413,7 @@ class UptodownCrawler:
             
             print(f'📁 Category: {category}')
             
-            while len(all_apps) < MAX_APPS and page <= max_pages_per_category:
+            while found < MAX_APPS and page <= max_pages_per_category:
                 apps = await self.scrape_category_page(category, page)
                 if not apps:
                     print(f'  📄 Trang {page}: không có app, chuyển category.')
@@ -531,102 +422,184 @@ class UptodownCrawler:
                 # Add only new apps
                 new_count = 0
                 for app in apps:
-                    if app['url'] not in seen_urls:
-                        seen_urls.add(app['url'])
-                        all_apps.append(app)
+                    key = canonical_url(app['url'])
+                    if key not in seen_urls:
+                        seen_urls.add(key)
+                        found += 1
+                        if self.frontier:
+                            self.frontier.add(app['url'], 'detail')
+                        if on_app is None:
+                            all_apps.append(app)
+                        elif found <= MAX_APPS:
+                            await on_app(app)
                         new_count += 1
                 
-                print(f'  📄 Trang {page}: +{new_count} apps mới (tổng: {len(all_apps)})')
+                print(f'  📄 Trang {page}: +{new_count} apps mới (tổng: {found})')
                 
                 if new_count == 0:
                     break  # No new apps found, move to next category
                 
                 page += 1
             
-            if len(all_apps) >= MAX_APPS:
+            if found >= MAX_APPS:
                 print(f'✅ Đã đạt {MAX_APPS} apps, dừng cào.')
                 break
         
-        self.stats['apps_found'] = len(all_apps)
-        print(f'✅ Tìm thấy {len(all_apps)} apps unique')
+        self.stats['apps_found'] = min(found, MAX_APPS)
+        print(f'✅ Tìm thấy {found} apps unique')
         return all_apps[:MAX_APPS]
     
-    async def scrape_app_details_batch(self, apps):
-        """Cào chi tiết nhiều apps cùng lúc."""
-        print(f'🔎 Đang cào chi tiết {len(apps)} apps...')
+    async def discover_from_sitemaps(self, on_app, on_unchanged):
+        """Stream app URLs from the XML sitemaps (robots.txt, else SITEMAP_URL).
+        
+        New apps and apps whose <lastmod> is newer than our last fetch go to
+        on_app (coroutine, same dicts as category discovery); unchanged ones
+        go to on_unchanged with their stored detail record. Returns the number
+        of app URLs seen.
+        """
+        roots = await sitemap_stream.robots_sitemaps(self.session, UPTODOWN_BASE) or [SITEMAP_URL]
+        print(f'🗺️ Sitemap discovery: {len(roots)} root sitemap(s)')
+        seen = set()
+        requested = set()
         
-        results = []
-        batch_num = 0
+        def follow(child_url):
+            requested.add(child_url)
+            return True
         
-        for i in range(0, len(apps), BATCH_SIZE):
-            batch = apps[i:i+BATCH_SIZE]
-            batch_num += 1
-            
-            tasks = [
-                self.scrape_app_detail(app['url'], app)
-                for app in batch
-            ]
-            
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for result in batch_results:
-                if result and not isinstance(result, Exception):
-                    results.append(result)
-            
-            # Progress update
-            elapsed = time.time() - self.stats['start_time']
-            rate = self.stats['apps_detailed'] / elapsed if elapsed > 0 else 0
-            print(f'📦 Batch {batch_num}: {len(results)}/{len(apps)} apps ({rate:.1f} apps/s)')
-            
-            # Small delay between batches
-            await asyncio.sleep(0.5)
+        for root in roots:
+            requested.add(root)
+            async for loc, lastmod in sitemap_stream.iter_sitemap(self.session, root, follow=follow):
+                if not APP_URL_RE.match(loc) or loc in seen:
+                    continue
+                seen.add(loc)
+                fetched_at, stored = self.frontier.last_fetch(loc) if self.frontier else (0, None)
+                changed_at = sitemap_stream.lastmod_ts(lastmod)
+                if stored and changed_at is not None and changed_at <= fetched_at:
+                    self.stats['apps_unchanged'] += 1
+                    on_unchanged(stored)
+                else:
+                    if self.frontier:
+                        self.frontier.add(loc, 'detail')
+                    await on_app({'url': loc, 'title': '', 'icon': ''})
+                if len(seen) >= MAX_APPS:
+                    break
+                if len(seen) % 5000 == 0:
+                    print(f'  🗺️ {len(seen)} apps ({self.stats["apps_unchanged"]} unchanged)')
+            if len(seen) >= MAX_APPS:
+                print(f'✅ Đã đạt {MAX_APPS} apps, dừng đọc sitemap.')
+                break
         
-        return results
+        self.stats['sitemap_requests'] = len(requested)
+        self.stats['apps_found'] = len(seen)
+        print(f'✅ Sitemap: {len(seen)} apps ({self.stats["apps_unchanged"]} unchanged) '
+              f'from {len(requested)} sitemap file(s)')
+        return len(seen)
     
-    async def scrape_versions_batch(self, apps):
-        """Cào phiên bản cho nhiều apps cùng lúc."""
-        if not CRAWL_VERSIONS:
-            print('⏭️ Bỏ qua crawl phiên bản (CRAWL_VERSIONS=False)')
-            return 0
-        
-        print(f'📚 Đang cào phiên bản cho {len(apps)} apps...')
+    async def crawl_pipeline(self):
+        """Category pages → detail workers → version workers → store writer.
+        
+        Stages are connected by bounded queues, so an app moves on as soon as
+        its page is parsed and a slow request only holds up its own worker.
+        Returns (detailed_apps, versions_saved); in streaming mode finished
+        records go to the frontier spool instead and the list stays empty.
+        """
+        detail_q = asyncio.Queue(QUEUE_SIZE)
+        version_q = asyncio.Queue(QUEUE_SIZE)
+        store_q = asyncio.Queue(QUEUE_SIZE)
+        detailed = []
+        counts = {'versions_saved': 0}
+        
+        def collect(result):
+            self.stats['apps_collected'] += 1
+            if self.stream:
+                self.frontier.spool_put(result)
+            else:
+                detailed.append(result)
         
-        versions_count = 0
-        batch_num = 0
+        async def detail_worker():
+            while True:
+                app = await detail_q.get()
+                if app is None:
+                    return
+                try:
+                    result = await self.scrape_app_detail(app['url'], app)
+                except Exception as e:
+                    print(f'❌ Detail worker error {app["url"][:50]}: {e}')
+                    self.stats['errors'] += 1
+                    result = None
+                if not result:
+                    continue
+                collect(result)
+                if self.stats['apps_collected'] % PROGRESS_EVERY == 0:
+                    elapsed = time.time() - self.stats['start_time']
+                    rate = self.stats['apps_detailed'] / elapsed if elapsed > 0 else 0
+                    print(f'📦 {self.stats["apps_collected"]} apps chi tiết ({rate:.1f} apps/s, '
+                          f'queue: {detail_q.qsize()} detail / {version_q.qsize()} versions)')
+                if CRAWL_VERSIONS and result.get('uptodown_url') and result.get('app_id'):
+                    await version_q.put(result)
+        
+        async def version_worker():
+            while True:
+                app = await version_q.get()
+                if app is None:
+                    return
+                try:
+                    versions = await self.scrape_app_versions(app['uptodown_url'], app['app_id'])
+                except Exception as e:
+                    print(f'❌ Version worker error {app["app_id"]}: {e}')
+                    self.stats['errors'] += 1
+                    continue
+                if versions:
+                    await store_q.put((app['app_id'], versions))
+        
+        async def store_writer():
+            # Single writer: SQLite work runs off the event loop, one app at a time
+            while True:
+                item = await store_q.get()
+                if item is None:
+                    return
+                app_id, versions = item
+                try:
+                    if await asyncio.to_thread(self.save_versions, app_id, versions):
+                        counts['versions_saved'] += 1
+                except Exception as e:
+                    print(f'❌ Save versions error {app_id}: {e}')
+                    self.stats['errors'] += 1
         
-        for i in range(0, len(apps), BATCH_SIZE):
-            batch = apps[i:i+BATCH_SIZE]
-            batch_num += 1
-            
-            tasks = []
-            for app in batch:
-                app_url = app.get('uptodown_url', '')
-                app_id = app.get('app_id', '')
-                if app_url and app_id:
-                    tasks.append(self.scrape_app_versions(app_url, app_id))
-            
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Save versions
-            for j, result in enumerate(batch_results):
-                if result and not isinstance(result, Exception) and len(result) > 0:
-                    app_id = batch[j].get('app_id', '')
-                    if app_id and self.save_versions(app_id, result):
-                        versions_count += 1
-            
-            # Progress update
-            print(f'📚 Batch {batch_num}: {versions_count} apps có phiên bản')
-            
-            await asyncio.sleep(0.3)
+        detail_tasks = [asyncio.create_task(detail_worker()) for _ in range(DETAIL_WORKERS)]
+        version_tasks = [asyncio.create_task(version_worker()) for _ in range(VERSION_WORKERS)]
+        writer_task = asyncio.create_task(store_writer())
+        try:
+            found = 0
+            if self.discovery == 'sitemap':
+                found = await self.discover_from_sitemaps(
+                    on_app=detail_q.put,
+                    on_unchanged=lambda app: collect(self._with_existing(app)))
+                if not found:
+                    print('⚠️ Sitemap rỗng, chuyển sang cào categories')
+            if not found:
+                await self.scrape_all_category_pages(on_app=detail_q.put)
+            for _ in detail_tasks:
+                await detail_q.put(None)
+            await asyncio.gather(*detail_tasks)
+            for _ in version_tasks:
+                await version_q.put(None)
+            await asyncio.gather(*version_tasks)
+            await store_q.put(None)
+            await writer_task
+        finally:
+            for t in detail_tasks + version_tasks + [writer_task]:
+                if not t.done():
+                    t.cancel()
         
-        return versions_count
+        return detailed, counts['versions_saved']
     
     def save_apps(self, apps, upload_to_telegram=True):
         """Save apps to JSON file."""
         os.makedirs(DATA_DIR, exist_ok=True)
         
         # Merge with existing apps that have Telegram links
-        apps_dict = {app['app_id']: app for app in apps}
+        apps_dict = apps_from_dicts(apps)
         
         # Add existing apps with Telegram links that weren't in this crawl
         for app_id, existing in self.existing_apps.items():
@@ -640,8 +613,7 @@ class UptodownCrawler:
             reverse=True
         )
         
-        with open(APPS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(apps_list, f, ensure_ascii=False, indent=2)
+        write_json_file(APPS_FILE, [a.to_dict() for a in apps_list])
         
         print(f'💾 Đã lưu {len(apps_list)} apps vào {APPS_FILE}')
         
@@ -660,13 +632,47 @@ class UptodownCrawler:
         
         return len(apps_list)
     
+    def save_spooled_apps(self, upload_to_telegram=True):
+        """Streaming mode: write apps.json from the frontier spool, record by record."""
+        existing = self.existing_apps
+        # Existing apps with Telegram links that weren't in this crawl
+        kept = self.frontier.spool_add_missing(
+            app for app in (existing.iter_apps() if existing else ()) if app.get('telegram_link'))
+        total = write_json_array(APPS_FILE, self.frontier.iter_spool())
+        print(f'💾 Đã lưu {total} apps vào {APPS_FILE} ({kept} giữ lại từ lần trước)')
+        
+        if upload_to_telegram and TELEGRAM_UPLOAD_AVAILABLE:
+            print(f'📤 Uploading new apps metadata to Telegram (lô {UPLOAD_CHUNK})...')
+            uploaded = failed = 0
+            chunk = []
+            for app in self.frontier.iter_spool(decode=True):
+                if app.get('app_id') in existing:
+                    continue
+                chunk.append(app)
+                if len(chunk) >= UPLOAD_CHUNK:
+                    ok, bad = batch_upload_apps(chunk)
+                    uploaded, failed, chunk = uploaded + ok, failed + bad, []
+            if chunk:
+                ok, bad = batch_upload_apps(chunk)
+                uploaded, failed = uploaded + ok, failed + bad
+            if uploaded or failed:
+                print(f'📊 Telegram upload: ✅ {uploaded} | ❌ {failed}')
+            else:
+                print('📝 No new apps to upload to Telegram')
+        
+        return total
+    
     async def run(self):
         """Main crawl function."""
         print('=' * 60)
         print('🚀 UPTODOWN TRENDING CRAWLER')
         print(f'📊 Target: {MAX_APPS} apps')
-        print(f'⚡ Workers: {CONCURRENT_WORKERS}')
+        print(f'⚡ Workers: {DETAIL_WORKERS} detail / {VERSION_WORKERS} versions')
         print(f'📚 Crawl versions: {CRAWL_VERSIONS}')
+        print(f'🧩 Parse: {PARSE_WORKERS or "inline"} process(es), {HTML_PARSER}')
+        print(f'🗺️ Discovery: {self.discovery}')
+        print(f'🌊 Streaming: {self.stream}')
+        print(f'🧭 Mode: {self.mode}' + (f' (max age {self.max_age_hours}h)' if self.mode == 'refresh' else ''))
         print('=' * 60)
         
         self.stats['start_time'] = time.time()
@@ -674,30 +680,32 @@ class UptodownCrawler:
         # Load existing data
         self.load_existing_data()
         
+        # Crawl state: checkpoints + resume/refresh
+        self.frontier = CrawlFrontier(mode=self.mode, max_age_hours=self.max_age_hours)
+        self.frontier.begin()
+        
         # Initialize session
         await self.init_session()
+        if PARSE_WORKERS > 0:
+            self.parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
         
         try:
-            # Step 1: Get all apps list from categories
-            apps_list = await self.scrape_all_category_pages()
+            # Steps 1-3: categories → details → versions, streamed through queues
+            detailed_apps, versions_saved = await self.crawl_pipeline()
             
-            if not apps_list:
+            if not self.stats['apps_collected']:
                 print('❌ Không tìm thấy apps nào!')
                 return
             
-            # Step 2: Scrape details for all apps
-            detailed_apps = await self.scrape_app_details_batch(apps_list)
-            
-            # Step 3: Crawl versions for all apps
-            versions_saved = 0
-            if CRAWL_VERSIONS:
-                versions_saved = await self.scrape_versions_batch(detailed_apps)
-            
             # Step 4: Save to file and optionally upload to Telegram
             upload_to_tg = AUTO_UPLOAD_TELEGRAM
             if upload_to_tg:
                 print('📤 Auto-uploading to Telegram (AUTO_UPLOAD_TELEGRAM=True)...')
-            total_saved = self.save_apps(detailed_apps, upload_to_telegram=upload_to_tg)
+            if self.stream:
+                total_saved = self.save_spooled_apps(upload_to_telegram=upload_to_tg)
+            else:
+                total_saved = self.save_apps(detailed_apps, upload_to_telegram=upload_to_tg)
+            self.frontier.finish()
             
             # Final stats
             elapsed = time.time() - self.stats['start_time']
@@ -706,8 +714,24 @@ class UptodownCrawler:
             print(f'📄 Trang đã cào: {self.stats["pages_scraped"]}')
             print(f'🔍 Apps tìm thấy: {self.stats["apps_found"]}')
             print(f'📦 Apps chi tiết: {self.stats["apps_detailed"]}')
+            if self.discovery == 'sitemap':
+                print(f'🗺️ Sitemap: {self.stats["sitemap_requests"]} files, {self.stats["apps_unchanged"]} apps unchanged')
             print(f'📚 Apps có versions: {versions_saved}')
             print(f'💾 Apps đã lưu: {total_saved}')
+            print(f'🗄️ HTTP cache: {self.stats["cache_hits"]} hits, {self.stats["not_modified"]} not modified')
+            if self.seen is not None:
+                print(f'👁️ Seen-set: {self.stats["apps_seen_fresh"]} detail pages reused (< {self.seen.freshness / 3600:g}h)')
+            print(f'♻️ Frontier: {self.frontier.stats["reused"]} reused, {self.frontier.stats["unchanged"]} unchanged, {self.frontier.stats["checkpoints"]} checkpoints')
+            parsed = self.stats['apps_detailed']
+            if parsed:
+                dom = self.parse_stats.get('all:dom', 0)
+                print(f'🧩 Fast-path extraction: {parsed - dom}/{parsed} pages without DOM '
+                      f'({(parsed - dom) / parsed:.0%})')
+                for key, n in sorted(self.parse_stats.items()):
+                    print(f'   {key:<28} {n}')
+            for h in rate_limiter.snapshot():
+                print(f'🚦 {h["host"]}: limit {h["limit"]} (max {h["max_limit"]:.0f}), '
+                      f'{h["requests"]} req, {h["throttled"]} throttled')
             print(f'❌ Lỗi: {self.stats["errors"]}')
             print(f'⏱️ Thời gian: {elapsed:.1f}s')
             print(f'⚡ Tốc độ: {self.stats["apps_detailed"]/elapsed:.1f} apps/s')
@@ -715,14 +739,34 @@ class UptodownCrawler:
             
         finally:
             await self.close_session()
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown(wait=True)
+                self.parse_pool = None
+            self.frontier.close()
+            if hasattr(self.existing_apps, 'close'):
+                self.existing_apps.close()
 
 
-async def main():
-    crawler = UptodownCrawler()
+async def main(mode='full', max_age_hours=REFRESH_MAX_AGE_HOURS, discovery=DISCOVERY, stream=STREAMING):
+    crawler = UptodownCrawler(mode=mode, max_age_hours=max_age_hours, discovery=discovery, stream=stream)
     await crawler.run()
 
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Uptodown trending crawler')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--resume', action='store_true', help='Tiếp tục lần chạy trước bị dừng giữa chừng')
+    group.add_argument('--refresh', action='store_true', help='Chỉ cào lại các trang cũ hơn --max-age')
+    parser.add_argument('--max-age', type=float, default=REFRESH_MAX_AGE_HOURS,
+                        help=f'Số giờ trước khi một trang bị coi là cũ (mặc định {REFRESH_MAX_AGE_HOURS:g})')
+    parser.add_argument('--discovery', choices=('categories', 'sitemap'), default=DISCOVERY,
+                        help='Nguồn danh sách app: phân trang categories hoặc XML sitemap')
+    parser.add_argument('--stream', action='store_true', default=STREAMING,
+                        help='RAM cố định: kết quả ghi dần vào crawl_state.db, apps cũ tra qua snapshot')
+    args = parser.parse_args()
+    mode = 'resume' if args.resume else 'refresh' if args.refresh else 'full'
+    
     # Run with uvloop if available for better performance
     try:
         import uvloop
@@ -731,4 +775,4 @@ if __name__ == '__main__':
     except ImportError:
         pass
     
-    asyncio.run(main())
+    asyncio.run(main(mode, args.max_age, args.discovery, args.stream))
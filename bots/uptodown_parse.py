@@ -0,0 +1,454 @@
+"""
+Pure HTML → dict parsers for Uptodown pages.
+
+Kept free of crawler state so they can run in a ProcessPoolExecutor: the
+crawler ships the HTML string to a worker process and gets back a small
+dict/list, and the event loop never blocks on BeautifulSoup.
+lxml is used as the tree builder when installed (several times faster than
+html.parser).
+
+parse_detail() first scans the raw HTML with precompiled regexes (meta tags,
+JSON-LD, <h1>, itemprop) and only builds a DOM when a required field is
+missing. The result carries a '_strategy' dict (field -> strategy that
+found it) so callers can track hit rates; pop it before storing.
+"""
+import re
+import json
+import hashlib
+import importlib.util
+from datetime import datetime
+from html import unescape
+
+from bs4 import BeautifulSoup
+
+from version_order import version_key
+
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+
+def normalize_icon_url(icon_url):
+    """Ensure icon URL is valid."""
+    if not icon_url:
+        return ''
+    if icon_url.startswith('//'):
+        return 'https:' + icon_url
+    if not icon_url.startswith('http'):
+        return ''
+    return icon_url
+
+
+def parse_category(html):
+    """App links on a category listing page → [{'url', 'title', 'icon'}]."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    apps = []
+    seen_urls = set()
+
+    # Find all app links with format: {app-slug}.en.uptodown.com/android
+    for link_el in soup.select('a[href*=".en.uptodown.com/android"]'):
+        try:
+            app_url = link_el.get('href', '')
+            if not app_url or '.en.uptodown.com/android' not in app_url:
+                continue
+
+            # Deduplicate URLs on same page
+            if app_url in seen_urls:
+                continue
+            seen_urls.add(app_url)
+
+            # Extract basic info from link text/image
+            title = link_el.get_text(strip=True) or ''
+            icon = ''
+
+            # Try to get icon from nearby img
+            img = link_el.select_one('img')
+            if img:
+                icon = img.get('src') or img.get('data-src', '')
+                icon = normalize_icon_url(icon)
+
+            apps.append({
+                'url': app_url,
+                'title': title,
+                'icon': icon,
+            })
+        except Exception:
+            continue
+
+    return apps
+
+
+# ==================== FAST PATH (no DOM) ====================
+
+_META_TAG_RE = re.compile(r'<meta\s[^>]*>', re.I)
+_ATTR_RE = re.compile(r'([a-zA-Z_:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_H1_RE = re.compile(r'<h1\b([^>]*)>(.*?)</h1>', re.I | re.S)
+_TAG_RE = re.compile(r'<[^>]+>')
+_JSONLD_RE = re.compile(r'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.I | re.S)
+_ICON_URL_RE = re.compile(r'https://img\.utdstc\.com/icon/[a-f0-9]+/[a-f0-9]+/[a-f0-9]+(?::\d+)?')
+_PKG_CLASS_RE = re.compile(r'<[a-z0-9]+\s[^>]*class="[^"]*package[^"]*"[^>]*>\s*([^<\s][^<]*?)\s*<', re.I)
+_PKG_JSON_RE = re.compile(r'"package"\s*:\s*"([^"]+)"')
+_VERSION_RE = re.compile(
+    r'<[a-z0-9]+\s[^>]*(?:itemprop="softwareVersion"|class="(?:[^"]*\s)?(?:version|detail-version)(?:\s[^"]*)?")[^>]*>'
+    r'\s*([^<]*?)\s*<', re.I)
+_SIZE_RE = re.compile(
+    r'<[a-z0-9]+\s[^>]*class="(?:[^"]*\s)?(?:size|detail-size|file-size)(?:\s[^"]*)?"[^>]*>(.*?)</', re.I | re.S)
+_SIZE_VALUE_RE = re.compile(r'([\d.]+)\s*(MB|GB|KB)', re.I)
+_SLUG_RE = re.compile(r'https://([^.]+)\.en\.uptodown\.com')
+
+# Strategy hit counts are kept by the caller from each result's '_strategy'
+# (parse_detail runs in pool workers, whose counters the parent never sees)
+
+
+def _text(fragment):
+    """Like BeautifulSoup get_text(strip=True) for a small HTML fragment."""
+    return ''.join(unescape(p).strip() for p in _TAG_RE.split(fragment))
+
+
+def _meta_map(html):
+    """{name-or-property: content} for every <meta> tag (first occurrence wins)."""
+    out = {}
+    for tag in _META_TAG_RE.findall(html):
+        attrs = {k.lower(): (a if a is not None else b) for k, a, b in _ATTR_RE.findall(tag)}
+        key = attrs.get('property') or attrs.get('name') or attrs.get('itemprop')
+        if key and 'content' in attrs and key.lower() not in out:
+            out[key.lower()] = unescape(attrs['content']).strip()
+    return out
+
+
+def _jsonld_app(html):
+    """First SoftwareApplication-like JSON-LD object, or {}."""
+    for block in _JSONLD_RE.findall(html):
+        try:
+            data = json.loads(block.strip())
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get('@graph', [data]) if isinstance(data, dict) else []
+        for it in items:
+            if isinstance(it, dict) and 'Application' in str(it.get('@type', '')):
+                return it
+    return {}
+
+
+def _h1_title(html):
+    first = None
+    for attrs, inner in _H1_RE.findall(html):
+        title = _text(inner)
+        if not title:
+            continue
+        if re.search(r'class="[^"]*\b(?:name|detail-title)\b', attrs):
+            return title
+        if first is None:
+            first = title
+    return first or ''
+
+
+def _clean_description(description):
+    # Remove download/APK promotional text
+    description = re.sub(r'Download.*?for free\.?\s*', '', description, flags=re.IGNORECASE)
+    description = re.sub(r'.*?APK.*?for Android.*?\.\s*', '', description, flags=re.IGNORECASE)
+    description = description.strip()
+    # Limit to reasonable length but allow longer descriptions
+    return description[:1000] if len(description) > 1000 else description
+
+
+def _size_mb(size_text):
+    size_match = _SIZE_VALUE_RE.search(size_text or '')
+    if not size_match:
+        return 0
+    val = float(size_match.group(1))
+    unit = size_match.group(2).upper()
+    if unit == 'GB':
+        return val * 1024
+    if unit == 'KB':
+        return val / 1024
+    return val
+
+
+def _fallback_app_id(app_url):
+    # Use URL slug as fallback
+    slug_match = _SLUG_RE.search(app_url)
+    if slug_match:
+        return f'com.uptodown.{slug_match.group(1).replace("-", "")}'
+    return hashlib.md5(app_url.encode()).hexdigest()[:16]
+
+
+def _fast_detail(html, app_url):
+    """Regex/meta/JSON-LD extraction. Returns (fields, strategy) or None if a required field is missing."""
+    meta = _meta_map(html)
+    ld = None
+    strategy = {}
+
+    title = _h1_title(html)
+    strategy['title'] = 'h1'
+    if not title:
+        ld = _jsonld_app(html)
+        title = (ld.get('name') or '').strip()
+        strategy['title'] = 'jsonld'
+    if not title:
+        return None
+
+    icon = meta.get('og:image', '')
+    strategy['icon'] = 'og:image'
+    if 'img.utdstc.com/icon' not in icon:
+        m = _ICON_URL_RE.search(html)
+        if not m:
+            return None
+        icon = m.group(0)
+        # Add :200 size suffix if not present
+        if ':' not in icon:
+            icon = icon + ':200'
+        strategy['icon'] = 'regex'
+    icon = normalize_icon_url(icon)
+
+    description = meta.get('description', '')
+    strategy['description'] = 'meta'
+    if not description:
+        description = meta.get('og:description', '')
+        strategy['description'] = 'og:description'
+    if not description:
+        return None  # page-body descriptions need the DOM
+
+    m = _VERSION_RE.search(html)
+    version = unescape(m.group(1)).strip() if m else ''
+    strategy['version'] = 'regex'
+    if not version:
+        if ld is None:
+            ld = _jsonld_app(html)
+        version = str(ld.get('softwareVersion') or '').strip()
+        strategy['version'] = 'jsonld'
+    if not version:
+        return None
+
+    m = _PKG_CLASS_RE.search(html)
+    if m:
+        app_id, strategy['app_id'] = unescape(m.group(1)).strip(), 'class'
+    else:
+        m = _PKG_JSON_RE.search(html)
+        if m:
+            app_id, strategy['app_id'] = m.group(1), 'json'
+        else:
+            app_id, strategy['app_id'] = _fallback_app_id(app_url), 'slug'
+
+    m = _SIZE_RE.search(html)
+    size_mb = _size_mb(_text(m.group(1))) if m else 0
+
+    fields = {
+        'app_id': app_id,
+        'title': title,
+        'icon': icon,
+        'description': _clean_description(description),
+        'version': version,
+        'size_mb': size_mb,
+    }
+    return fields, strategy
+
+
+def _build_detail(fields, app_url):
+    # APK download URL (Uptodown detail page, NOT actual APK)
+    # Actual APK sẽ được resolve khi user request
+    apk_page_url = app_url.rstrip('/') + '/download'
+
+    return {
+        'app_id': fields['app_id'],
+        'title': fields['title'],
+        'icon': fields['icon'],
+        'description': fields['description'],
+        'version': fields['version'],
+        'apk_size_mb': round(fields['size_mb'], 2),
+        'uptodown_url': app_url,
+        'uptodown_download': apk_page_url,
+        'apk_url': '',  # Will be filled on-demand
+        'telegram_link': '',  # Will be filled when uploaded
+        'local_apk_url': '',
+        'channel2_link': '',
+        'date': datetime.now().isoformat(),
+        'source': 'uptodown',
+    }
+
+
+def parse_detail(html, app_url, basic_info=None):
+    """App detail page → app record dict (Telegram fields left empty), plus '_strategy'."""
+    fast = _fast_detail(html, app_url)
+    if fast is not None:
+        fields, strategy = fast
+    else:
+        fields, strategy = _dom_detail(html, app_url, basic_info), {'all': 'dom'}
+    result = _build_detail(fields, app_url)
+    result['_strategy'] = strategy
+    return result
+
+
+def _dom_detail(html, app_url, basic_info=None):
+    """Full BeautifulSoup extraction (fallback when the fast path misses a field)."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    # Title
+    title_el = soup.select_one('h1.name, h1.detail-title, h1')
+    title = title_el.get_text(strip=True) if title_el else (basic_info or {}).get('title', '')
+
+    # Icon - Priority: og:image (always correct), then img.utdstc.com links
+    icon = ''
+
+    # Priority 1: og:image meta tag (most reliable)
+    og_image = soup.select_one('meta[property="og:image"]')
+    if og_image:
+        icon = og_image.get('content', '')
+        if icon and 'img.utdstc.com/icon' in icon:
+            icon = normalize_icon_url(icon)
+
+    # Priority 2: Find any img with img.utdstc.com/icon
+    if not icon or 'utdstc.com/icon' not in icon:
+        for img in soup.select('img[src*="img.utdstc.com/icon"], img[data-src*="img.utdstc.com/icon"]'):
+            icon_url = img.get('src') or img.get('data-src', '')
+            if icon_url and 'img.utdstc.com/icon' in icon_url:
+                icon = normalize_icon_url(icon_url)
+                break
+
+    # Priority 3: Search in srcset
+    if not icon or 'utdstc.com/icon' not in icon:
+        for img in soup.select('img[srcset*="img.utdstc.com/icon"]'):
+            srcset = img.get('srcset', '')
+            match = re.search(r'(https://img\.utdstc\.com/icon[^\s,]+)', srcset)
+            if match:
+                icon = normalize_icon_url(match.group(1))
+                break
+
+    # Priority 4: Regex search in HTML for icon URL
+    if not icon or 'utdstc.com/icon' not in icon:
+        icon_match = re.search(r'https://img\.utdstc\.com/icon/[a-f0-9]+/[a-f0-9]+/[a-f0-9]+(?::\d+)?', html)
+        if icon_match:
+            icon = icon_match.group(0)
+            # Add :200 size suffix if not present
+            if ':' not in icon:
+                icon = icon + ':200'
+
+    if not icon:
+        icon = (basic_info or {}).get('icon', '')
+
+    # Package name - try to find in page
+    pkg_el = soup.select_one('[class*="package"], .technical-data .package')
+    if pkg_el:
+        app_id = pkg_el.get_text(strip=True)
+    else:
+        # Try to find in script or meta
+        pkg_match = re.search(r'"package"\s*:\s*"([^"]+)"', html)
+        if pkg_match:
+            app_id = pkg_match.group(1)
+        else:
+            app_id = _fallback_app_id(app_url)
+
+    # Description - try multiple sources
+    description = ''
+
+    # Priority 1: Meta description (usually most complete)
+    meta_desc = soup.select_one('meta[name="description"]')
+    if meta_desc:
+        description = meta_desc.get('content', '').strip()
+
+    # Priority 2: OG description
+    if not description:
+        og_desc = soup.select_one('meta[property="og:description"]')
+        if og_desc:
+            description = og_desc.get('content', '').strip()
+
+    # Priority 3: Page content description
+    if not description:
+        for sel in ['.description', '#description', '.detail-description', '.app-description', '.content p']:
+            desc_el = soup.select_one(sel)
+            if desc_el:
+                desc_text = desc_el.get_text(strip=True)
+                if len(desc_text) > 30:  # Only take meaningful descriptions
+                    description = desc_text
+                    break
+
+    # Clean and limit description
+    if description:
+        description = _clean_description(description)
+
+    # Version
+    ver_el = soup.select_one('.version, .detail-version, [itemprop="softwareVersion"]')
+    version = ver_el.get_text(strip=True) if ver_el else ''
+
+    # Size
+    size_el = soup.select_one('.size, .detail-size, .file-size')
+    size_text = size_el.get_text(strip=True) if size_el else ''
+
+    return {
+        'app_id': app_id,
+        'title': title,
+        'icon': icon,
+        'description': description,
+        'version': version,
+        'size_mb': _size_mb(size_text),
+    }
+
+
+def parse_versions(html, max_versions=30):
+    """/versions (or /old) page → [{'version_name', 'apk_url', 'size_str', 'release_date', 'source'}]."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    versions = []
+
+    # Find version items - multiple selector strategies
+    ver_items = soup.select('div[data-url][data-version-id]')
+    if not ver_items:
+        ver_items = soup.select('div#versions-items-list div[data-url]')
+    if not ver_items:
+        ver_items = soup.select('div[data-url]')
+
+    seen = set()
+    for item in ver_items[:max_versions * 2]:
+        try:
+            # Version name
+            ver_name = ''
+            ver_tag = item.select_one('span.version, .versionName, .name')
+            if ver_tag:
+                ver_name = ver_tag.get_text(strip=True)
+            if not ver_name:
+                ver_name = item.get('data-version', '')
+
+            # Extract version number
+            ver_match = re.search(r'(\d+(?:\.\d+)+)', ver_name)
+            if ver_match:
+                ver_name = ver_match.group(1)
+            elif not ver_name:
+                continue
+
+            if version_key(ver_name) in seen:
+                continue
+            seen.add(version_key(ver_name))
+
+            # Download URL
+            data_url = item.get('data-url', '')
+            version_id = item.get('data-version-id', '')
+            apk_url = ''
+            if data_url and version_id:
+                apk_url = f'{data_url.rstrip("/")}/download/{version_id}'
+            elif data_url:
+                apk_url = f'{data_url.rstrip("/")}/download'
+
+            # Size
+            size_str = ''
+            size_tag = item.select_one('.size, .file-size')
+            if size_tag:
+                size_str = size_tag.get_text(strip=True)
+
+            # Date
+            date_str = ''
+            date_tag = item.select_one('span.date, .update-date')
+            if date_tag:
+                date_str = date_tag.get_text(strip=True)
+
+            versions.append({
+                'version_name': ver_name,
+                'apk_url': apk_url,
+                'size_str': size_str,
+                'release_date': date_str,
+                'source': 'uptodown',
+            })
+
+            if len(versions) >= max_versions:
+                break
+
+        except Exception:
+            continue
+
+    return versions
@@ -0,0 +1,73 @@
+"""
+Uptodown slug candidates for an app, shared by every crawler that probes
+https://{slug}.en.uptodown.com/android.
+
+bot_crawler, bot_crawler_async and version_crawler all cache "not on
+Uptodown" per app_id in resolve_cache, so they must all try the same slugs:
+a miss recorded after one list of candidates would otherwise hide another
+caller's different ones. The list depends on the title, so a miss is only
+definite when the real title was known (has_real_title).
+"""
+import re
+
+# Mapping app_id -> Uptodown slug for popular apps
+SLUG_MAP = {
+    'com.facebook.katana': 'facebook',
+    'com.facebook.lite': 'facebook-lite',
+    'com.facebook.orca': 'facebook-messenger',
+    'com.instagram.android': 'instagram',
+    'com.instagram.lite': 'instagram-lite',
+    'com.ss.android.ugc.trill': 'tiktok',
+    'com.zhiliaoapp.musically': 'tiktok',
+    'com.whatsapp': 'whatsapp-messenger',
+    'org.telegram.messenger': 'telegram',
+    'com.google.android.youtube': 'youtube',
+    'com.google.android.gm': 'gmail',
+    'com.google.android.apps.maps': 'google-maps',
+    'com.google.android.googlequicksearchbox': 'google-search',
+    'com.zing.zalo': 'zalo',
+    'com.shopee.vn': 'shopee',
+    'com.lazada.android': 'lazada',
+    'com.spotify.music': 'spotify-music',
+    'com.twitter.android': 'x-twitter',
+    'com.snapchat.android': 'snapchat',
+    'com.pinterest': 'pinterest',
+    'com.tencent.ig': 'pubg-mobile',
+    'com.garena.game.kgvn': 'garena-lien-quan-mobile',
+    'com.facebook.pages.app': 'facebook-pages-manager',
+    'com.facebook.work': 'workplace-from-facebook',
+    'com.facebook.appmanager': 'facebook-app-manager',
+}
+
+_SKIP_PARTS = ('com', 'org', 'net', 'app', 'android', 'mobile', 'lite', 'pro', 'google', 'facebook', 'ss')
+
+
+def candidate_slugs(app_id, title=None):
+    """Convert app_id and title to the list of possible Uptodown slugs, best first."""
+    slugs = []
+    # Check hardcoded map first
+    if app_id and app_id in SLUG_MAP:
+        slugs.append(SLUG_MAP[app_id])
+    # Try to extract app name from app_id
+    if app_id:
+        for part in app_id.lower().split('.'):
+            if part not in _SKIP_PARTS:
+                slug = part.replace('_', '-')
+                if slug and slug not in slugs:
+                    slugs.append(slug)
+    # Try from title: first word, then the full title
+    if title and title.strip():
+        first_word = re.sub(r'[^a-z0-9]', '', title.lower().split()[0])
+        if first_word and first_word not in slugs:
+            slugs.append(first_word)
+        full_slug = re.sub(r'[^a-z0-9\s-]', '', title.lower().strip())
+        full_slug = re.sub(r'\s+', '-', full_slug)
+        if full_slug and full_slug not in slugs:
+            slugs.append(full_slug)
+    return slugs
+
+
+def has_real_title(app_id, title):
+    """True when title is the app's own name, not missing or the app_id stand-in
+    some callers pass: only then did candidate_slugs() try every slug."""
+    return bool(title and title.strip() and title.strip() != (app_id or '').strip())
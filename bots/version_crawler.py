@@ -7,11 +7,21 @@ Uses cloudscraper to bypass Cloudflare protection.
 import os
 import re
 import time
+import hashlib
 import logging
-import requests
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from bs4 import BeautifulSoup
 
+import crawl_metrics
+import http_cache
+import download_url_cache
+import rate_limiter
+import resolve_cache
+import session_pool
+import uptodown_slugs
+from version_order import sort_versions, version_key
+
 logger = logging.getLogger(__name__)
 
 HEADERS = {
@@ -22,28 +32,19 @@ HEADERS = {
     'Referer': 'https://www.google.com/',
 }
 
-_scraper = None
 
-def _get_scraper():
-    global _scraper
-    if _scraper is None:
-        try:
-            import cloudscraper
-            _scraper = cloudscraper.create_scraper(
-                browser={'browser': 'chrome', 'platform': 'windows', 'mobile': False}
-            )
-        except ImportError:
-            logger.warning('cloudscraper not installed, falling back to requests')
-            _scraper = requests.Session()
-        _scraper.headers.update(HEADERS)
-    return _scraper
+def _parse_html(text):
+    return BeautifulSoup(text, 'html.parser')
 
 
 def _get_soup(url, retries=3):
-    session = _get_scraper()
+    # Sources run in parallel threads: each request leases its own pooled
+    # cloudscraper session (sessions are not thread-safe)
     for i in range(retries):
         try:
-            r = session.get(url, timeout=30)
+            with session_pool.lease(url, HEADERS) as lease:
+                r = http_cache.cached_get(lease.session, url, slot=rate_limiter.slot, timeout=30)
+                lease.check(r)
             if r.status_code == 404:
                 return None
             if r.status_code == 403:
@@ -51,7 +52,7 @@ def _get_soup(url, retries=3):
                 time.sleep(2 * (i + 1))
                 continue
             r.raise_for_status()
-            return BeautifulSoup(r.text, 'html.parser')
+            return http_cache.parsed(r, _parse_html)
         except Exception as e:
             logger.debug(f'_get_soup retry {i+1} for {url}: {e}')
             time.sleep(1.5 * (i + 1))
@@ -115,9 +116,9 @@ def crawl_apkpure_versions(app_id, limit=30):
             else:
                 continue
 
-            if ver_name in seen:
+            if version_key(ver_name) in seen:
                 continue
-            seen.add(ver_name)
+            seen.add(version_key(ver_name))
 
             dl_href = item.get('href') or ''
             if not dl_href:
@@ -153,57 +154,34 @@ def crawl_apkpure_versions(app_id, limit=30):
 
 # ---- Uptodown Old Versions ----
 
-_UPTODOWN_SLUG_MAP = {
-    'com.facebook.katana': 'facebook',
-    'com.facebook.lite': 'facebook-lite',
-    'com.facebook.orca': 'facebook-messenger',
-    'com.instagram.android': 'instagram',
-    'com.instagram.lite': 'instagram-lite',
-    'com.ss.android.ugc.trill': 'tiktok',
-    'com.zhiliaoapp.musically': 'tiktok',
-    'com.whatsapp': 'whatsapp-messenger',
-    'org.telegram.messenger': 'telegram',
-    'com.google.android.youtube': 'youtube',
-    'com.google.android.gm': 'gmail',
-    'com.google.android.apps.maps': 'google-maps',
-    'com.zing.zalo': 'zalo',
-    'com.shopee.vn': 'shopee',
-    'com.lazada.android': 'lazada',
-    'com.spotify.music': 'spotify-music',
-    'com.twitter.android': 'x-twitter',
-    'com.snapchat.android': 'snapchat',
-    'com.pinterest': 'pinterest',
-    'com.tencent.ig': 'pubg-mobile',
-}
-
-
 def _uptodown_find_slug(app_id, title=None):
-    session = _get_scraper()
-    slugs = []
-    if app_id in _UPTODOWN_SLUG_MAP:
-        slugs.append(_UPTODOWN_SLUG_MAP[app_id])
-    parts = app_id.lower().split('.')
-    for part in parts:
-        if part not in ('com', 'org', 'net', 'app', 'android', 'mobile', 'google', 'lite', 'pro'):
-            slug = part.replace('_', '-')
-            if slug and slug not in slugs:
-                slugs.append(slug)
-    if title:
-        first = re.sub(r'[^a-z0-9]', '', title.lower().split()[0]) if title.strip() else ''
-        if first and first not in slugs:
-            slugs.insert(1, first)
-        slug = re.sub(r'[^a-z0-9\s-]', '', title.lower().strip())
-        slug = re.sub(r'\s+', '-', slug)
-        if slug and slug not in slugs:
-            slugs.append(slug)
+    cached = resolve_cache.lookup(app_id, 'uptodown')
+    if cached is not None:
+        crawl_metrics.count('uptodown', 'search', 'cached')
+        return cached[0] or None
+    with crawl_metrics.timer('uptodown', 'search') as t:
+        url = _uptodown_probe_slugs(app_id, title)
+        if not url:
+            t.miss()
+    return url
+
+
+def _uptodown_probe_slugs(app_id, title):
+    slugs = uptodown_slugs.candidate_slugs(app_id, title)
+    errors = 0
     for slug in slugs:
         url = f'https://{slug}.en.uptodown.com/android'
         try:
-            r = session.get(url, timeout=15, allow_redirects=True)
+            r = session_pool.get(url, headers=HEADERS, timeout=15, allow_redirects=True)
             if r.status_code == 200:
+                resolve_cache.store(app_id, 'uptodown', url, slug)
                 return url
+            if r.status_code != 404:
+                errors += 1
         except Exception:
-            pass
+            errors += 1
+    if not errors and uptodown_slugs.has_real_title(app_id, title):
+        resolve_cache.store(app_id, 'uptodown')  # every slug 404: not on Uptodown
     return None
 
 
@@ -222,8 +200,16 @@ def crawl_uptodown_versions(app_id, title=None, limit=30):
         versions_url = base_url.rstrip('/') + '/old'
         soup = _get_soup(versions_url)
     if not soup:
+        resolve_cache.forget(app_id, 'uptodown')  # cached page may be gone; search again next time
         return versions
 
+    versions = _uptodown_versions_from_soup(soup, limit)
+    logger.info(f'Uptodown: found {len(versions)} versions for {app_id}')
+    return versions
+
+
+def _uptodown_versions_from_soup(soup, limit):
+    versions = []
     ver_items = soup.select('div[data-url][data-version-id]')
     if not ver_items:
         ver_items = soup.select('div#versions-items-list div[data-url]')
@@ -246,9 +232,9 @@ def crawl_uptodown_versions(app_id, title=None, limit=30):
             elif not ver_name:
                 continue
 
-            if ver_name in seen:
+            if version_key(ver_name) in seen:
                 continue
-            seen.add(ver_name)
+            seen.add(version_key(ver_name))
 
             data_url = item.get('data-url', '')
             version_id = item.get('data-version-id', '')
@@ -280,10 +266,35 @@ def crawl_uptodown_versions(app_id, title=None, limit=30):
                 break
         except Exception as e:
             logger.debug(f'Uptodown version parse error: {e}')
-    logger.info(f'Uptodown: found {len(versions)} versions for {app_id}')
     return versions
 
 
+def versions_fingerprint(versions, top=5):
+    """Short hash of the newest `top` entries of a version list (names + links)."""
+    h = hashlib.sha1()
+    for v in versions[:top]:
+        h.update(f'{version_key(v.get("version_name", ""))}|{v.get("apk_url", "")}\n'.encode())
+    return h.hexdigest()[:16]
+
+
+def probe_latest_version(app_id, title=None):
+    """Cheap change check: one Uptodown /versions page, no other source.
+
+    Returns (latest version name, fingerprint), or None when the app has no
+    Uptodown page (callers then fall back to a full crawl).
+    """
+    base_url = _uptodown_find_slug(app_id, title)
+    if not base_url:
+        return None
+    with crawl_metrics.timer('uptodown', 'probe') as t:
+        soup = _get_soup(base_url.rstrip('/') + '/versions')
+        versions = _uptodown_versions_from_soup(soup, limit=5) if soup else []
+        if not versions:
+            t.miss()
+            return None
+    return versions[0]['version_name'], versions_fingerprint(versions)
+
+
 # ---- APKCombo Old Versions ----
 
 def crawl_apkcombo_versions(app_id, title=None, limit=30):
@@ -336,9 +347,9 @@ def crawl_apkcombo_versions(app_id, title=None, limit=30):
             if not ver_match:
                 continue
             ver_name = ver_match.group(1)
-            if ver_name in seen:
+            if version_key(ver_name) in seen:
                 continue
-            seen.add(ver_name)
+            seen.add(version_key(ver_name))
 
 
             apk_url = urllib.parse.urljoin(base, href)
@@ -370,9 +381,9 @@ def crawl_apkcombo_versions(app_id, title=None, limit=30):
             if not ver_match:
                 continue
             ver_name = ver_match.group(1)
-            if ver_name in seen:
+            if version_key(ver_name) in seen:
                 continue
-            seen.add(ver_name)
+            seen.add(version_key(ver_name))
             link = li.select_one('a[href]')
             apk_url = urllib.parse.urljoin(base, link.get('href', '')) if link else ''
             date_str = ''
@@ -430,9 +441,9 @@ def crawl_apkmirror_versions(app_id, title=None, limit=30):
             if not ver_match:
                 continue
             ver_name = ver_match.group(1)
-            if ver_name in seen:
+            if version_key(ver_name) in seen:
                 continue
-            seen.add(ver_name)
+            seen.add(version_key(ver_name))
 
             detail_href = ver_tag.get('href', '')
             apk_url = urllib.parse.urljoin(base, detail_href) if detail_href else ''
@@ -457,15 +468,36 @@ def crawl_apkmirror_versions(app_id, title=None, limit=30):
 
 # ---- Main: Crawl All Sources ----
 
+# Sources run in parallel; shared by every crawl_old_versions call
+SOURCE_WORKERS = int(os.environ.get('VERSION_SOURCE_WORKERS', '16'))
+SOURCE_TIMEOUT = float(os.environ.get('VERSION_SOURCE_TIMEOUT', '120'))  # seconds per source, from when it starts
+# Once `limit` versions are in, still wait this long for better-ranked sources
+SOURCE_PRIORITY_GRACE = float(os.environ.get('VERSION_SOURCE_GRACE', '5'))
+_source_pool = ThreadPoolExecutor(max_workers=SOURCE_WORKERS, thread_name_prefix='versions')
+
+
+def _timed_version_list(name, fn):
+    with crawl_metrics.timer(name.lower(), 'version_list') as t:
+        results = fn()
+        if not results:
+            t.miss()
+    return results
+
+
 def crawl_old_versions(app_id, title=None, limit=30):
     """
     Crawl old versions from multiple sources.
-    Merges results, deduplicates by version_name.
+    Sources run concurrently; results are merged as they arrive and
+    deduplicated by version_name. Each source gets SOURCE_TIMEOUT seconds
+    from when it starts running (time queued in the shared pool behind other
+    apps does not count). Once `limit` unique versions are in, better-ranked
+    sources still running get SOURCE_PRIORITY_GRACE seconds more; the rest
+    are abandoned.
     """
-    all_versions = []
-    seen = set()
+    by_key = {}  # version_key -> (source rank, version dict)
 
-    # Uptodown first - it's the most reliable source for actual APK downloads
+    # Uptodown first - it's the most reliable source for actual APK downloads:
+    # on duplicates the better-ranked source's entry is kept
     sources = [
         ('Uptodown', lambda: crawl_uptodown_versions(app_id, title=title, limit=limit)),
         ('APKPure', lambda: crawl_apkpure_versions(app_id, limit=limit)),
@@ -473,29 +505,65 @@ def crawl_old_versions(app_id, title=None, limit=30):
         ('APKMirror', lambda: crawl_apkmirror_versions(app_id, title=title, limit=limit)),
     ]
 
-    for source_name, crawl_fn in sources:
-        try:
-            results = crawl_fn()
-            added = 0
-            for v in results:
-                key = v['version_name']
-                if key not in seen:
-                    seen.add(key)
-                    all_versions.append(v)
-                    added += 1
-            if added > 0:
-                logger.info(f'{source_name}: added {added} unique versions')
-        except Exception as e:
-            logger.error(f'{source_name} version crawl error: {e}')
+    started = {}  # rank -> time the source began running
 
-    def ver_sort_key(v):
-        try:
-            parts = v['version_name'].split('.')
-            return tuple(int(p) for p in parts)
-        except (ValueError, AttributeError):
-            return (0,)
+    def run(rank, name, fn):
+        started[rank] = time.monotonic()
+        return _timed_version_list(name, fn)
 
-    all_versions.sort(key=ver_sort_key, reverse=True)
+    futures = {_source_pool.submit(run, rank, name, fn): (rank, name)
+               for rank, (name, fn) in enumerate(sources)}
+    pending = set(futures)
+    grace_until = None
+    contributed = set()  # ranks of sources that returned versions
+    try:
+        while pending:
+            if len(by_key) >= limit:
+                # Limit reached: only a better-ranked source can still change the result
+                # (it wins duplicates), so wait a short grace period for those alone
+                if not any(futures[f][0] < max(contributed, default=-1) for f in pending):
+                    break
+                if grace_until is None:
+                    grace_until = time.monotonic() + SOURCE_PRIORITY_GRACE
+            now = time.monotonic()
+            if grace_until is not None and now >= grace_until:
+                break
+            deadlines = {f: started[futures[f][0]] + SOURCE_TIMEOUT for f in pending if futures[f][0] in started}
+            expired = {f for f, d in deadlines.items() if d <= now}
+            if expired:
+                logger.warning(f'Version crawl timeout for {app_id}: '
+                               f'{", ".join(futures[f][1] for f in expired)} still running')
+                pending -= expired
+                continue
+            left = min(list(deadlines.values()) + [grace_until or now + SOURCE_TIMEOUT]) - now
+            if len(deadlines) < len(pending):
+                left = min(left, 1.0)  # a queued source has no deadline until it starts: check again soon
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for f in done:
+                rank, source_name = futures[f]
+                try:
+                    results = f.result()
+                except Exception as e:
+                    logger.error(f'{source_name} version crawl error: {e}')
+                    continue
+                if results:
+                    contributed.add(rank)
+                added = 0
+                for v in results:
+                    key = version_key(v['version_name'])
+                    prev = by_key.get(key)
+                    if prev is None:
+                        added += 1
+                    if prev is None or rank < prev[0]:
+                        by_key[key] = (rank, v)
+                crawl_metrics.count(source_name.lower(), 'version_list', 'unique', added)
+                if added > 0:
+                    logger.info(f'{source_name}: added {added} unique versions')
+    finally:
+        for f in pending:
+            f.cancel()  # not started yet: skipped; running ones finish in the background
+
+    all_versions = sort_versions(v for _, v in by_key.values())
     logger.info(f'Total unique versions for {app_id}: {len(all_versions)}')
     return all_versions[:limit]
 
@@ -528,10 +596,9 @@ def _resolve_uptodown_download(page_url):
     """Visit Uptodown version-specific download page and get actual APK URL.
     page_url format: https://{slug}.en.uptodown.com/android/download/{version_id}
     """
-    session = _get_scraper()
     try:
         # The page_url should already be a download page URL
-        r = session.get(page_url, timeout=30)
+        r = session_pool.get(page_url, headers=HEADERS, timeout=30)
         if r.status_code != 200:
             return None
         soup = BeautifulSoup(r.text, 'html.parser')
@@ -570,18 +637,46 @@ def _resolve_apkcombo_download(page_url):
     return None
 
 
-def resolve_version_download(version_dict):
+def resolve_version_download(version_dict, fresh=False):
     """
     Given a version dict from crawling, try to resolve the actual
     downloadable APK URL (not just a page link).
-    Returns (direct_url, session_or_None) or (None, None).
+    A still-valid link resolved earlier is reused (download_url_cache)
+    unless fresh=True. Call report_download_result() after downloading.
+    Returns (direct_url, session_or_None, cached_age) or (None, None, None);
+    cached_age is the link's age in seconds if it came from the cache, else None.
     """
     source = version_dict.get('source', '')
     page_url = version_dict.get('apk_url', '')
 
     if not page_url:
-        return None, None
+        return None, None, None
+
+    if not fresh:
+        cached = download_url_cache.lookup(page_url)
+        if cached:
+            crawl_metrics.count(source, 'resolve', 'cached')
+            return cached[0], None, cached[1]
+    with crawl_metrics.timer(source, 'resolve') as t:
+        url, session = _resolve_version_page(source, page_url)
+        if not url:
+            t.miss()
+    if url:
+        download_url_cache.store(page_url, source, url)
+    return url, session, None
+
+
+def report_download_result(version_dict, direct_url, ok, age=None):
+    """Feed a download outcome back to the link cache.
+
+    age: the link's age when the download started (cached_age from
+    resolve_version_download, 0 for a fresh link). Without it the age is
+    taken now, so the download time would count as link lifetime.
+    """
+    download_url_cache.report(version_dict.get('apk_url', ''), direct_url, ok, age=age)
+
 
+def _resolve_version_page(source, page_url):
     try:
         if source == 'apkpure':
             url = _resolve_apkpure_download(page_url)
@@ -0,0 +1,67 @@
+"""
+Android version ordering shared by every place that sorts or dedups versions.
+
+version_key('v19.04')          -> ((19, 4), 4, 0, 0)
+version_key('1.2.3-beta2')     -> ((1, 2, 3), 2, 2, 0)
+version_key('1.2.3 (build 45)') -> ((1, 2, 3), 4, 0, 45)
+
+Key = (release numbers, stage rank, stage number, build number). Trailing
+zero components are dropped so '1.2' and '1.2.0' are the same version.
+Stage rank: dev/nightly < alpha < beta < rc/preview < release. Names with no
+digits at all ('Varies with device') sort below everything else.
+Keys are cached — each distinct name is parsed once per process.
+"""
+import re
+from functools import lru_cache
+
+_RELEASE_RE = re.compile(r'\d+(?:[._]\d+)*')
+_BUILD_RE = re.compile(r'(?:build|bld)[\s._-]*(\d+)|\((\d+)\)')
+# Single-letter stages ('1.0a2', '1.0-b3') need a digit or separator before
+# and a number after, so ABI suffixes like 'arm64-v8a' are not alpha builds
+_STAGE_RE = re.compile(
+    r'(?<![a-z])(dev|snapshot|nightly|canary|alpha|beta|preview|pre|rc)(?![a-z])[\s._-]*(\d*)'
+    r'|(?:^|(?<=[\d\s._-]))([ab])[._-]?(\d+)')
+_TRAILING_NUM_RE = re.compile(r'[-+_\s](\d+)\b')
+
+_STAGE_RANK = {
+    'dev': 0, 'snapshot': 0, 'nightly': 0, 'canary': 0,
+    'alpha': 1, 'a': 1,
+    'beta': 2, 'b': 2,
+    'preview': 3, 'pre': 3, 'rc': 3,
+}
+RELEASE_RANK = 4
+
+
+@lru_cache(maxsize=65536)
+def version_key(name):
+    """Sortable key for a version name. Higher key = newer version."""
+    s = (name or '').strip().lower()
+    m = _RELEASE_RE.search(s)
+    if not m:
+        return ((), -1, 0, 0)
+    parts = [int(p) for p in re.split(r'[._]', m.group(0))]
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()
+    rest = s[m.end():]
+
+    build = 0
+    b = _BUILD_RE.search(rest)
+    if b:
+        build = int(b.group(1) or b.group(2))
+        rest = rest[:b.start()] + rest[b.end():]
+
+    stage, stage_num = RELEASE_RANK, 0
+    st = _STAGE_RE.search(rest)
+    if st:
+        stage = _STAGE_RANK[st.group(1) or st.group(3)]
+        stage_num = int(st.group(2) or st.group(4) or 0)
+    elif not b:
+        t = _TRAILING_NUM_RE.match(rest)
+        if t:
+            build = int(t.group(1))
+    return (tuple(parts), stage, stage_num, build)
+
+
+def sort_versions(versions, reverse=True):
+    """Sort version dicts by version_name (newest first by default)."""
+    return sorted(versions, key=lambda v: version_key(v.get('version_name') or ''), reverse=reverse)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Version store — all app versions in one SQLite table (data/versions.db).
+
+Replaces one JSON file per app (data/versions/{app_id}.json) so that
+cross-app queries ("latest N versions", "which apps have versions") do not
+have to open thousands of files. json_store.load_versions/save_versions are
+the public entry points; this module is the storage layer underneath.
+
+Legacy per-app files are imported lazily the first time an app is read, or
+all at once with:
+    python3 bots/version_store.py --migrate
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_db import connect
+
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data'))
+VERSIONS_DB = os.environ.get('VERSIONS_DB', os.path.join(DATA_DIR, 'versions.db'))
+
+FIELDS = ('version_name', 'apk_url', 'telegram_link', 'apk_size_mb', 'release_date', 'source')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS versions (
+    app_id        TEXT NOT NULL,
+    version_name  TEXT NOT NULL,
+    rank          INTEGER NOT NULL DEFAULT 0,
+    apk_url       TEXT NOT NULL DEFAULT '',
+    telegram_link TEXT NOT NULL DEFAULT '',
+    apk_size_mb   REAL NOT NULL DEFAULT 0,
+    release_date  TEXT NOT NULL DEFAULT '',
+    source        TEXT NOT NULL DEFAULT '',
+    added_at      REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    PRIMARY KEY (app_id, version_name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_versions_added ON versions (added_at DESC);
+CREATE TABLE IF NOT EXISTS version_apps (
+    app_id     TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+'''
+
+_write_lock = threading.Lock()
+
+
+def _conn():
+    return connect(VERSIONS_DB, _SCHEMA)
+
+
+def _row_to_dict(row):
+    return {k: row[k] for k in FIELDS}
+
+
+def has_app(app_id):
+    """True if the app has ever been written to the store (even with 0 rows)."""
+    conn = _conn()
+    try:
+        row = conn.execute('SELECT 1 FROM version_apps WHERE app_id = ?', (app_id,)).fetchone()
+        return row is not None
+    finally:
+        conn.close()
+
+
+def get_versions(app_id):
+    """All versions of one app, in stored order (newest first)."""
+    conn = _conn()
+    try:
+        rows = conn.execute(
+            f'SELECT {", ".join(FIELDS)} FROM versions WHERE app_id = ? ORDER BY rank',
+            (app_id,)).fetchall()
+        return [_row_to_dict(r) for r in rows]
+    finally:
+        conn.close()
+
+
+def put_versions(app_id, versions):
+    """Upsert the full ordered version list of one app.
+
+    `versions` is already merged and sorted by the caller; its order becomes
+    the stored rank and rows missing from it are dropped. added_at is kept
+    for versions that already exist, so it records when a version was first
+    seen.
+    """
+    now = time.time()
+    rows = [
+        (app_id, v['version_name'], rank,
+         v.get('apk_url') or '', v.get('telegram_link') or '',
+         float(v.get('apk_size_mb') or 0), v.get('release_date') or '',
+         v.get('source') or '', now, now)
+        for rank, v in enumerate(versions)
+    ]
+    with _write_lock:
+        conn = _conn()
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO versions (app_id, version_name, rank, apk_url, telegram_link,
+                                          apk_size_mb, release_date, source, added_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (app_id, version_name) DO UPDATE SET
+                        rank = excluded.rank,
+                        apk_url = excluded.apk_url,
+                        telegram_link = excluded.telegram_link,
+                        apk_size_mb = excluded.apk_size_mb,
+                        release_date = excluded.release_date,
+                        source = excluded.source,
+                        updated_at = excluded.updated_at
+                ''', rows)
+                conn.execute('DELETE FROM versions WHERE app_id = ? AND updated_at < ?', (app_id, now))
+                conn.execute(
+                    'INSERT OR REPLACE INTO version_apps (app_id, updated_at) VALUES (?, ?)',
+                    (app_id, now))
+        finally:
+            conn.close()
+
+
+def latest_versions(limit=50, source=None):
+    """Most recently discovered versions across all apps (for a "recently updated" feed)."""
+    conn = _conn()
+    try:
+        sql = f'SELECT app_id, added_at, {", ".join(FIELDS)} FROM versions'
+        args = []
+        if source:
+            sql += ' WHERE source = ?'
+            args.append(source)
+        sql += ' ORDER BY added_at DESC LIMIT ?'
+        args.append(int(limit))
+        out = []
+        for r in conn.execute(sql, args):
+            d = _row_to_dict(r)
+            d['app_id'] = r['app_id']
+            d['added_at'] = r['added_at']
+            out.append(d)
+        return out
+    finally:
+        conn.close()
+
+
+def version_names_by_app(app_ids=None):
+    """{app_id: set(version_name)} in one query — for skip logic across many apps."""
+    conn = _conn()
+    try:
+        out = {}
+        if app_ids is None:
+            cur = conn.execute('SELECT app_id, version_name FROM versions')
+        else:
+            ids = list(app_ids)
+            if not ids:
+                return out
+            marks = ','.join('?' * len(ids))
+            cur = conn.execute(
+                f'SELECT app_id, version_name FROM versions WHERE app_id IN ({marks})', ids)
+        for app_id, vn in cur:
+            out.setdefault(app_id, set()).add(vn)
+        return out
+    finally:
+        conn.close()
+
+
+def app_ids():
+    """app_ids that have at least one stored version."""
+    conn = _conn()
+    try:
+        return [r[0] for r in conn.execute('SELECT DISTINCT app_id FROM versions')]
+    finally:
+        conn.close()
+
+
+def migrate_legacy_dir(versions_dir=None):
+    """Import every legacy data/versions/*.json file. Returns number of apps imported.
+
+    Filenames turn both '.' and '_' into '_', so the app id is looked up from
+    the catalog (apps.json ids through the same transform), not guessed back.
+    """
+    import json_store
+    versions_dir = versions_dir or json_store.VERSIONS_DIR
+    if not os.path.isdir(versions_dir):
+        return 0
+    by_name = {}
+    for app in json_store.load_apps() or []:
+        aid = app.get('app_id')
+        if aid:
+            name = os.path.basename(json_store._versions_path(aid))
+            by_name[name] = None if name in by_name and by_name[name] != aid else aid  # None: ambiguous
+    count = 0
+    for name in sorted(os.listdir(versions_dir)):
+        if not name.endswith('.json') or name.endswith('.pretty.json'):
+            continue
+        data = json_store.read_json_file(os.path.join(versions_dir, name), default=[])
+        app_id = None
+        if isinstance(data, dict):
+            app_id = data.get('app_id')
+            data = data.get('versions') or []
+        if not app_id:
+            app_id = by_name.get(name)
+            if not app_id:
+                reason = 'matches several catalog apps' if name in by_name else 'no catalog app'
+                print(f'⚠️ Skip {name}: {reason}')
+                continue
+        if data and not has_app(app_id):
+            json_store.save_versions(app_id, data)
+            count += 1
+    return count
+
+if __name__ == '__main__':
+    if '--migrate' in sys.argv:
+        n = migrate_legacy_dir()
+        print(f'✅ Imported {n} apps into {VERSIONS_DB}')
+    else:
+        for v in latest_versions(20):
+            print(f"{v['app_id']:<40} {v['version_name']:<20} {v['source']}")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Per-app change detection for the version crawler (data/version_watch.db).
+
+crawl_versions used to crawl all four version sources for every app every
+cycle. Here each app has a revisit schedule and a fingerprint of its newest
+versions:
+
+  - not due yet:  skipped without any request
+  - due:          one cheap probe (Uptodown /versions, see
+                  version_crawler.probe_latest_version); the full
+                  multi-source crawl runs only if the fingerprint changed,
+                  the app has no probe, or the last full crawl is older
+                  than WATCH_FULL_DAYS
+  - revisit interval adapts to the app's release frequency: after a change
+    it drops to a quarter of the app's average gap between releases, while
+    unchanged it grows by WATCH_BACKOFF, within
+    [WATCH_MIN_HOURS, WATCH_MAX_HOURS]
+  - a full crawl that misses the release the probe saw is not recorded:
+    the old fingerprint stays and the app is retried after WATCH_MIN_HOURS
+
+    python3 bots/version_watch.py          # stats
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_db import connect
+from json_store import DATA_DIR
+
+VERSION_WATCH_DB = os.environ.get('VERSION_WATCH_DB', os.path.join(DATA_DIR, 'version_watch.db'))
+WATCH_ENABLED = os.environ.get('VERSION_WATCH', '1') == '1'
+WATCH_MIN_HOURS = float(os.environ.get('WATCH_MIN_HOURS', '1'))
+WATCH_MAX_HOURS = float(os.environ.get('WATCH_MAX_HOURS', '168'))  # 7 days
+WATCH_BACKOFF = float(os.environ.get('WATCH_BACKOFF', '1.5'))  # interval growth while unchanged
+WATCH_FULL_DAYS = float(os.environ.get('WATCH_FULL_DAYS', '7'))  # full crawl at least this often
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS version_watch (
+    app_id      TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL DEFAULT '',
+    latest      TEXT NOT NULL DEFAULT '',
+    checked_at  REAL NOT NULL DEFAULT 0,
+    changed_at  REAL NOT NULL DEFAULT 0,
+    full_at     REAL NOT NULL DEFAULT 0,
+    release_gap REAL NOT NULL DEFAULT 0,  -- running average seconds between changes, 0 = unknown
+    interval    REAL NOT NULL DEFAULT 0,
+    next_check  REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_watch_next ON version_watch (next_check);
+'''
+
+
+def _conn():
+    return connect(VERSION_WATCH_DB, _SCHEMA)
+
+
+def _clamp(seconds):
+    return min(max(seconds, WATCH_MIN_HOURS * 3600), WATCH_MAX_HOURS * 3600)
+
+
+def due_apps(apps, now=None):
+    """The apps (dicts with app_id) whose next check time has come, in input order."""
+    if not WATCH_ENABLED:
+        return apps
+    now = now or time.time()
+    conn = _conn()
+    try:
+        later = {r[0] for r in conn.execute('SELECT app_id FROM version_watch WHERE next_check > ?', (now,))}
+    finally:
+        conn.close()
+    return [a for a in apps if a.get('app_id') not in later]
+
+
+def get(app_id):
+    conn = _conn()
+    try:
+        row = conn.execute('SELECT * FROM version_watch WHERE app_id = ?', (app_id,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def needs_full_crawl(app_id, probe):
+    """probe: (latest, fingerprint) from the cheap check, or None when there is none."""
+    if not WATCH_ENABLED or probe is None:
+        return True
+    row = get(app_id)
+    if row is None or row['fingerprint'] != probe[1]:
+        return True
+    return time.time() - row['full_at'] > WATCH_FULL_DAYS * 86400
+
+
+def record(app_id, fingerprint, latest='', full=True):
+    """Store a check result and schedule the next one. Returns True if the app changed."""
+    if not WATCH_ENABLED:
+        return True
+    now = time.time()
+    row = get(app_id)
+    changed = row is None or row['fingerprint'] != fingerprint
+    if row is None:
+        release_gap, interval, changed_at = 0.0, _clamp(0), now
+    elif changed:
+        gap = now - row['changed_at']
+        release_gap = gap if not row['release_gap'] else (row['release_gap'] + gap) / 2
+        interval, changed_at = _clamp(release_gap / 4), now
+    else:
+        release_gap, changed_at = row['release_gap'], row['changed_at']
+        interval = row['interval'] * WATCH_BACKOFF
+        if release_gap:
+            interval = min(interval, release_gap / 2)  # apps that release often stay on a short leash
+        interval = _clamp(interval)
+    full_at = now if full else (row['full_at'] if row else 0)
+    conn = _conn()
+    try:
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO version_watch (app_id, fingerprint, latest, checked_at, changed_at, '
+                'full_at, release_gap, interval, next_check) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (app_id, fingerprint, latest or '', now, changed_at, full_at, release_gap,
+                 interval, now + interval))
+    finally:
+        conn.close()
+    return changed
+
+
+def retry_soon(app_id):
+    """A full crawl failed: keep the stored fingerprint (so the next probe still
+    sees a change) and check again after WATCH_MIN_HOURS. No row: stays due."""
+    if not WATCH_ENABLED:
+        return
+    now = time.time()
+    conn = _conn()
+    try:
+        with conn:
+            conn.execute('UPDATE version_watch SET checked_at = ?, next_check = ? WHERE app_id = ?',
+                         (now, now + WATCH_MIN_HOURS * 3600, app_id))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    now = time.time()
+    conn = _conn()
+    total, due, avg_h = conn.execute(
+        'SELECT COUNT(*), SUM(next_check <= ?), AVG(interval) / 3600 FROM version_watch', (now,)).fetchone()
+    changed_day = conn.execute('SELECT COUNT(*) FROM version_watch WHERE changed_at > ?',
+                               (now - 86400,)).fetchone()[0]
+    conn.close()
+    print(f'📊 {VERSION_WATCH_DB}: {total} apps, {due or 0} due now, '
+          f'{changed_day} changed in 24h, avg revisit {avg_h or 0:.1f}h')
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Persistent SQLite work queue (data/work_queue.db) for long sweeps.
+
+Items are leased, not popped: a worker that dies leaves its lease to expire
+and the item is handed out again, so a sweep over the whole catalog
+survives restarts and crashes. Failed items are retried with a growing
+delay until MAX_ATTEMPTS.
+
+    q = WorkQueue('versions')
+    q.put_many(['com.a', 'com.b'])
+    for item_id, payload in q.lease(4):
+        ...
+        q.done(item_id)        # or q.fail(item_id); q.extend(item_id) while still busy
+
+    python3 bots/work_queue.py          # per-queue counts
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from state_db import connect
+from json_store import DATA_DIR, decode_json, encode_json
+
+WORK_QUEUE_DB = os.environ.get('WORK_QUEUE_DB', os.path.join(DATA_DIR, 'work_queue.db'))
+LEASE_SECS = float(os.environ.get('WORK_LEASE_SECS', '1800'))
+MAX_ATTEMPTS = int(os.environ.get('WORK_MAX_ATTEMPTS', '3'))
+RETRY_DELAY = 300.0  # seconds, times the attempt number
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS work (
+    queue        TEXT NOT NULL,
+    item_id      TEXT NOT NULL,
+    payload      BLOB,
+    state        TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    not_before   REAL NOT NULL DEFAULT 0,
+    leased_until REAL NOT NULL DEFAULT 0,
+    updated_at   REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (queue, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_work_ready ON work (queue, state, not_before);
+'''
+
+
+class WorkQueue:
+    """One named queue. Thread-safe: every call uses its own short-lived connection."""
+
+    def __init__(self, name, path=WORK_QUEUE_DB, lease_secs=LEASE_SECS, max_attempts=MAX_ATTEMPTS):
+        self.name = name
+        self.path = path
+        self.lease_secs = lease_secs
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()  # leases are handed out one transaction at a time
+
+    def _conn(self):
+        return connect(self.path, _SCHEMA)
+
+    def put_many(self, items):
+        """Add item ids (or (item_id, payload) pairs) not already queued. Returns count added."""
+        now = time.time()
+        rows = []
+        for it in items:
+            item_id, payload = it if isinstance(it, tuple) else (it, None)
+            rows.append((self.name, item_id, None if payload is None else encode_json(payload), now))
+        conn = self._conn()
+        try:
+            with conn:
+                before = conn.total_changes
+                conn.executemany(
+                    'INSERT OR IGNORE INTO work (queue, item_id, payload, updated_at) VALUES (?, ?, ?, ?)', rows)
+                return conn.total_changes - before
+        finally:
+            conn.close()
+
+    def lease(self, n=1):
+        """Up to n ready items as [(item_id, payload)], leased for lease_secs."""
+        now = time.time()
+        with self._lock:
+            conn = self._conn()
+            try:
+                with conn:
+                    rows = conn.execute('''
+                        SELECT item_id, payload FROM work
+                        WHERE queue = ? AND not_before <= ?
+                          AND (state = 'pending' OR (state = 'leased' AND leased_until < ?))
+                        ORDER BY not_before, item_id LIMIT ?
+                    ''', (self.name, now, now, n)).fetchall()
+                    conn.executemany(
+                        "UPDATE work SET state = 'leased', leased_until = ?, updated_at = ? "
+                        "WHERE queue = ? AND item_id = ?",
+                        [(now + self.lease_secs, now, self.name, r['item_id']) for r in rows])
+            finally:
+                conn.close()
+        return [(r['item_id'], None if r['payload'] is None else decode_json(r['payload'])) for r in rows]
+
+    def _update(self, sql, params):
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def done(self, item_id):
+        self._update("UPDATE work SET state = 'done', updated_at = ? WHERE queue = ? AND item_id = ?",
+                     (time.time(), self.name, item_id))
+
+    def extend(self, item_id):
+        """Renew the lease on an item a worker is still busy with."""
+        now = time.time()
+        self._update("UPDATE work SET leased_until = ?, updated_at = ? "
+                     "WHERE queue = ? AND item_id = ? AND state = 'leased'",
+                     (now + self.lease_secs, now, self.name, item_id))
+
+    def fail(self, item_id):
+        """Retry later with a growing delay; give up after max_attempts."""
+        now = time.time()
+        self._update('''
+            UPDATE work SET attempts = attempts + 1, updated_at = ?,
+                state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                not_before = ? + ? * (attempts + 1)
+            WHERE queue = ? AND item_id = ?
+        ''', (now, self.max_attempts, now, RETRY_DELAY, self.name, item_id))
+
+    def reset(self):
+        """Start a new sweep: every done/failed item becomes pending again."""
+        self._update("UPDATE work SET state = 'pending', attempts = 0, not_before = 0, updated_at = ? "
+                     "WHERE queue = ? AND state IN ('done', 'failed')", (time.time(), self.name))
+
+    def requeue(self, item_ids):
+        """Make these done/failed items pending again (e.g. apps due for another check)."""
+        now = time.time()
+        conn = self._conn()
+        try:
+            with conn:
+                before = conn.total_changes
+                conn.executemany(
+                    "UPDATE work SET state = 'pending', attempts = 0, not_before = 0, updated_at = ? "
+                    "WHERE queue = ? AND item_id = ? AND state IN ('done', 'failed')",
+                    [(now, self.name, i) for i in item_ids])
+                return conn.total_changes - before
+        finally:
+            conn.close()
+
+    def remove_missing(self, keep_ids):
+        """Drop queued items whose id is not in keep_ids (e.g. apps deleted from the catalog)."""
+        keep_ids = set(keep_ids)
+        conn = self._conn()
+        try:
+            ids = [r[0] for r in conn.execute('SELECT item_id FROM work WHERE queue = ?', (self.name,))]
+            gone = [(self.name, i) for i in ids if i not in keep_ids]
+            if gone:
+                with conn:
+                    conn.executemany('DELETE FROM work WHERE queue = ? AND item_id = ?', gone)
+            return len(gone)
+        finally:
+            conn.close()
+
+    def counts(self):
+        """{state: n}; expired leases count as pending."""
+        now = time.time()
+        conn = self._conn()
+        try:
+            rows = conn.execute('''
+                SELECT CASE WHEN state = 'leased' AND leased_until < ? THEN 'pending' ELSE state END, COUNT(*)
+                FROM work WHERE queue = ? GROUP BY 1
+            ''', (now, self.name)).fetchall()
+        finally:
+            conn.close()
+        return {state: n for state, n in rows}
+
+
+if __name__ == '__main__':
+    conn = connect(WORK_QUEUE_DB, _SCHEMA)
+    rows = conn.execute('SELECT queue, state, COUNT(*) FROM work GROUP BY queue, state ORDER BY queue').fetchall()
+    conn.close()
+    print(f'📊 {WORK_QUEUE_DB}')
+    for queue, state, n in rows:
+        print(f'  {queue:<12} {state:<8} {n}')
@@ -27,6 +27,22 @@ except ImportError:
     def fetch_apps_from_telegram(): return []
     def sync_telegram_to_local(): pass
 
+# Shared JSON codec (orjson when installed) + version store
+try:
+    from json_store import read_json_file, load_versions, latest_versions
+    from catalog_snapshot import lookup_app
+    VERSION_STORE_AVAILABLE = True
+except ImportError:
+    VERSION_STORE_AVAILABLE = False
+    lookup_app = None
+
+    def read_json_file(path, default=None):
+        try:
+            with open(path, 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return default
+
 # Track ongoing downloads to prevent duplicates
 _download_in_progress = {}
 _download_lock = threading.Lock()
@@ -239,16 +255,14 @@ def get_apps():
     """Serve apps data - with Telegram fallback and real-time sync"""
     apps_file = os.path.join(DATA_DIR, 'apps.json')
     
-    # Try local file first
+    # Try local file first - it is already compact JSON, send bytes as-is
     if os.path.exists(apps_file):
         try:
-            with open(apps_file, 'r', encoding='utf-8') as f:
-                local_apps = json.load(f)
-                
             # If file is recent (< 1 hour), use it
             file_age = time.time() - os.path.getmtime(apps_file)
             if file_age < 3600:  # 1 hour
-                return jsonify(local_apps)
+                with open(apps_file, 'rb') as f:
+                    return Response(f.read(), mimetype='application/json')
                 
         except Exception as e:
             print(f'Error reading local apps: {e}')
@@ -261,8 +275,8 @@ def get_apps():
             
             # Try reading again after sync
             if os.path.exists(apps_file):
-                with open(apps_file, 'r', encoding='utf-8') as f:
-                    return jsonify(json.load(f))
+                with open(apps_file, 'rb') as f:
+                    return Response(f.read(), mimetype='application/json')
         except Exception as e:
             print(f'Telegram sync error: {e}')
     
@@ -284,19 +298,28 @@ def sync_apps():
 @app.route('/api/versions/<app_id>')
 def get_versions(app_id):
     """Serve version data for an app"""
+    if VERSION_STORE_AVAILABLE:
+        return jsonify(load_versions(app_id))
     safe_id = app_id.replace('.', '_')
     version_file = os.path.join(DATA_DIR, 'versions', f'{safe_id}.json')
     if not os.path.exists(version_file):
         return jsonify([])
-    with open(version_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        # Handle both old format (array) and new format (object with versions key)
-        if isinstance(data, list):
-            return jsonify(data)
-        elif isinstance(data, dict) and 'versions' in data:
-            return jsonify(data['versions'])
-        else:
-            return jsonify([])
+    data = read_json_file(version_file, default=[])
+    # Handle both old format (array) and new format (object with versions key)
+    if isinstance(data, list):
+        return jsonify(data)
+    elif isinstance(data, dict) and 'versions' in data:
+        return jsonify(data['versions'])
+    else:
+        return jsonify([])
+
+@app.route('/api/recent-versions')
+def recent_versions():
+    """Newest versions across all apps (recently updated feed)"""
+    if not VERSION_STORE_AVAILABLE:
+        return jsonify([])
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify(latest_versions(limit=limit, source=request.args.get('source') or None))
 
 @app.route('/api/apk/<filename>')
 def serve_apk(filename):
@@ -424,8 +447,12 @@ def download_status(app_id):
     if not os.path.exists(apps_file):
         return jsonify({'status': 'not_found'})
     
-    with open(apps_file, 'r', encoding='utf-8') as f:
-        apps = json.load(f)
+    if lookup_app:
+        # Shared mmap snapshot: decode only this app's record
+        app = lookup_app(app_id)
+        apps = [app] if app else []
+    else:
+        apps = read_json_file(apps_file, default=[])
     
     for app in apps:
         if app.get('app_id') == app_id: